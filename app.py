@@ -1,58 +1,90 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, Response
 from utils.env_utils import EnvManager
+from utils.metrics import REGISTRY
+from utils.logging_utils import SAMPLED, setup_logging
 from flask_socketio import SocketIO, emit
-from utils.installation_utils import AiderInstallationManager
-from orchestrator import (
-    initialiseCodingAgent, 
-    main_loop, 
-    load_tasks, 
-    save_tasks, 
-    delete_agent,
-    normalize_path,
-    validate_agent_paths,
-    aider_sessions,
-    output_queue,
-    AiderSession
-)
+from service import ServiceError, create_backend, last_output_line
+from utils.ansi import TerminalStreams, convert_output
+from utils.event_codec import EventCodec
 import os
+import time
 import threading
 import queue
-import json
+import gzip
 from pathlib import Path
 import datetime
 import logging
-import logging.handlers
 
 
 # Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.handlers.RotatingFileHandler(
-            'app_debug.log',
-            maxBytes=10485760,
-            backupCount=5
-        ),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('app_debug.log', level=logging.DEBUG, max_bytes=10485760, backup_count=5)
 
 logger = logging.getLogger(__name__)
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', ping_timeout=10)
+# 'msgpack' sends Socket.IO packets as MessagePack and output events in compact form
+SOCKETIO_SERIALIZER = os.environ.get('SOCKETIO_SERIALIZER', 'json').lower()
+if SOCKETIO_SERIALIZER not in ('json', 'msgpack'):
+    logger.warning(f"Unknown SOCKETIO_SERIALIZER '{SOCKETIO_SERIALIZER}', using json")
+    SOCKETIO_SERIALIZER = 'json'
+# Websocket connections negotiate permessage-deflate with eventlet; polling responses are
+# gzip-compressed by engine.io above the threshold
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', ping_timeout=10,
+                    serializer='msgpack' if SOCKETIO_SERIALIZER == 'msgpack' else 'default',
+                    compression_threshold=int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024)))
+EVENT_CODEC = EventCodec() if SOCKETIO_SERIALIZER == 'msgpack' else None
+
+# Runs the orchestrator in-process, or talks to `daemon.py serve` when ORCHESTRATOR_SOCKET is set
+backend = create_backend()
+
+BROADCAST_EMIT_SECONDS = REGISTRY.histogram(
+    'app_broadcast_emit_seconds', 'Time to emit one output update to all dashboard clients'
+)
+BROADCAST_UPDATES = REGISTRY.counter('app_broadcast_updates', 'Output updates broadcast to dashboard clients')
+OUTPUT_REQUESTS = REGISTRY.counter(
+    'app_output_requests', 'Agent output range requests by response status', labelnames=('status',)
+)
+MAX_SUMMARY_PAGE = 500
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+TERMINAL_STREAMS = TerminalStreams()
+
+def socket_event(update):
+    """
+    Event name and payload for an orchestrator update. Appended output goes out as an
+    output_delta of ANSI-converted lines; status updates carry only the output's size and
+    last line, and the dashboard fetches the rest over HTTP when an agent is opened.
+    """
+    if 'delta' in update:
+        event = TERMINAL_STREAMS.convert(update['agent_id'], update['offset'], update['delta'])
+        event['last_line'] = last_output_line(update['delta'])
+        event['timestamp'] = update.get('timestamp')
+        if 'worker_id' in update:
+            event['worker_id'] = update['worker_id']
+        return 'output_delta', event
+    if update.get('type') == 'deletion':
+        TERMINAL_STREAMS.discard(update['agent_id'])
+    return 'output_update', update
 
 def broadcast_output():
     """Background thread to broadcast output updates via WebSocket"""
     logger.info("Starting WebSocket broadcast thread")
     while True:
         try:
-            update = output_queue.get()
-            socketio.emit('output_update', update, namespace='/agents')
-            logger.debug(f"Broadcasted update for agent {update.get('agent_id')}")
+            update = backend.output_queue.get()
+            emit_start = time.perf_counter()
+            event, payload = socket_event(update)
+            if EVENT_CODEC is not None:
+                payload, announce = EVENT_CODEC.encode(payload)
+                if announce:
+                    socketio.emit('agent_handles', announce, namespace='/agents')
+            socketio.emit(event, payload, namespace='/agents')
+            BROADCAST_EMIT_SECONDS.observe(time.perf_counter() - emit_start)
+            BROADCAST_UPDATES.inc()
+            logger.debug("Broadcasted update for agent %s", update.get('agent_id'), extra=SAMPLED)
         except Exception as e:
             logger.error(f"Error broadcasting output: {str(e)}", exc_info=True)
         finally:
@@ -62,10 +94,35 @@ def broadcast_output():
 broadcast_thread = threading.Thread(target=broadcast_output, daemon=True)
 broadcast_thread.start()
 
+backend.start()
+
+@app.context_processor
+def socketio_client():
+    """Lets templates load the Socket.IO client build that matches the serializer"""
+    return {'socketio_msgpack': SOCKETIO_SERIALIZER == 'msgpack'}
+
+def service_error_response(e):
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        **e.details
+    }), e.status
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of orchestrator and web tier metrics"""
+    text = REGISTRY.render()
+    if backend.remote:
+        try:
+            text += backend.call('metrics')['text']
+        except ServiceError as e:
+            logger.warning(f"Could not collect orchestrator metrics: {e}")
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
 @app.route('/settings')
 def settings():
     """Render the settings page"""
@@ -105,117 +162,138 @@ def serve_tasks_json():
 
 @app.route('/agents')
 def agent_view():
+    """Dashboard shell; agent cards are loaded page by page from /api/agents/summary"""
+    return render_template('agent_view.html', page_size=100)
+
+@app.route('/api/agents/summary')
+def agents_summary():
+    """Status, preview line and counts per agent without output, ?status=a,b&offset=&limit="""
     try:
-        tasks_data = load_tasks()
-        agents = tasks_data.get('agents', {})
-        
-        # Basic data needed for initial render
-        for agent_id, agent in agents.items():
-            agent['debug_urls'] = {
-                'info': f'/debug/agent/{agent_id}',
-                'validate': f'/debug/validate_paths/{agent_id}'
-            }
-            
-            # Ensure minimum required fields
-            if 'workspace' not in agent:
-                agent['workspace'] = normalize_path(os.path.join('workspaces', agent_id))
-            else:
-                agent['workspace'] = normalize_path(agent['workspace'])
-                
-            if 'repo_path' in agent:
-                agent['repo_path'] = normalize_path(agent['repo_path'])
-            
-            if 'aider_output' not in agent:
-                agent['aider_output'] = ''
-                
-            if 'status' not in agent:
-                agent['status'] = 'pending'
-        
-        return render_template('agent_view.html', 
-                             agents=agents, 
-                             initial_state=json.dumps({
-                                 'has_agents': bool(agents),
-                                 'agent_count': len(agents)
-                             }))
+        return jsonify(backend.call(
+            'agent_summary',
+            status=request.args.get('status') or None,
+            offset=max(0, request.args.get('offset', 0, type=int)),
+            limit=min(max(0, request.args.get('limit', 50, type=int)), MAX_SUMMARY_PAGE)
+        ))
+    except ServiceError as e:
+        return service_error_response(e)
+    except Exception as e:
+        logger.error(f"Error in agents summary: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/agents/<agent_id>')
+def agent_detail(agent_id):
+    """Full state of one agent including its output unless ?output=0, fetched when a card is opened"""
+    try:
+        agent = backend.call('agent_detail', agent_id=agent_id,
+                             include_output=request.args.get('output', '1') != '0')
+        agent['debug_urls'] = {
+            'info': f'/debug/agent/{agent_id}',
+            'timeline': f'/debug/agent/{agent_id}/timeline',
+            'validate': f'/debug/validate_paths/{agent_id}'
+        }
+        return jsonify(agent)
+    except ServiceError as e:
+        return service_error_response(e)
     except Exception as e:
-        logger.error(f"Error in agent_view: {str(e)}", exc_info=True)
-        return jsonify({'error': str(e)}), 500
+        logger.error(f"Error in agent detail: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def gzip_response(response):
+    """Compress a response body for clients that accept gzip"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')
+            or response.content_length is None or response.content_length < GZIP_MIN_BYTES):
+        return response
+    response.set_data(gzip.compress(response.get_data(), compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/agents/<agent_id>/output')
+def agent_output(agent_id):
+    """
+    Range of an agent's output as text/plain, ?offset=&limit= or ?tail=, or with
+    ?format=segments as JSON lines of ANSI-converted segments for the dashboard terminal.
+    Poll with ?offset=<X-Output-End> and If-None-Match for a 304 when nothing changed.
+    """
+    try:
+        params = {}
+        for name in ('offset', 'limit', 'tail'):
+            value = request.args.get(name)
+            if value is None or value == '':
+                continue
+            if not value.isdigit():
+                return jsonify({
+                    'success': False,
+                    'error': f'{name} must be a non-negative integer'
+                }), 400
+            params[name] = int(value)
+
+        result = backend.call('agent_output', agent_id=agent_id, **params)
+        if request.args.get('format') == 'segments':
+            # Same shape as an output_delta event, a tail starts at the first full line
+            lines, skipped = convert_output(result['data'], skip_partial_line=result['offset'] > 0 and 'tail' in params)
+            response = jsonify({
+                'agent_id': agent_id,
+                'offset': result['offset'] + skipped,
+                'end': result['end'],
+                'total': result['total'],
+                'status': result['status'],
+                'lines': lines,
+                'cleared': False
+            })
+        else:
+            response = Response(result['data'], mimetype='text/plain')
+        response.headers['X-Output-Offset'] = str(result['offset'])
+        response.headers['X-Output-End'] = str(result['end'])
+        response.headers['X-Output-Total'] = str(result['total'])
+        response.headers['X-Agent-Status'] = result['status']
+        response.headers['Cache-Control'] = 'no-cache'
+        # Weak, so the tag holds for both the plain and the gzip representation. The status is
+        # part of it so a poll sees an agent finish even when no output was added
+        response.set_etag(f"{result['generation']}-{result['offset']}-{result['end']}-{result['status']}", weak=True)
+        response.make_conditional(request)
+        OUTPUT_REQUESTS.labels(str(response.status_code)).inc()
+        return gzip_response(response)
+    except ServiceError as e:
+        return service_error_response(e)
+    except Exception as e:
+        logger.error(f"Error in agent output: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 @app.route('/create_agent', methods=['POST'])
 def create_agent():
     try:
-        # Use AiderInstallationManager to check installation
-        aider_manager = AiderInstallationManager()
-        is_installed, error_msg = aider_manager.check_aider_installation()
-        
-        if not is_installed:
-            return jsonify({
-                'success': False,
-                'error': error_msg or 'Aider is not installed. Please run: pip install aider-chat',
-                'needs_installation': True
-            }), 500
-        
         data = request.get_json()
-        repo_url = data.get('repo_url')
-        tasks = data.get('tasks', [])
-        num_agents = data.get('num_agents', 1)
-        
-        if not repo_url or not tasks:
-            return jsonify({'error': 'Repository URL and tasks are required'}), 400
-        
-        if isinstance(tasks, str):
-            tasks = [tasks]
-        
-        tasks_data = load_tasks()
-        created_agents = []
-        
-        for task_description in tasks:
-            os.environ['REPOSITORY_URL'] = repo_url
-            agent_ids = initialiseCodingAgent(
-                repository_url=repo_url, 
-                task_description=task_description, 
-                num_agents=num_agents
-            )
-            
-            if agent_ids:
-                created_agents.extend(agent_ids)
-                if task_description not in tasks_data['tasks']:
-                    tasks_data['tasks'].append(task_description)
-        
-        tasks_data['repo_url'] = repo_url
-        tasks_data['agents'] = tasks_data.get('agents', {})
-        for agent_id in created_agents:
-            tasks_data['agents'][agent_id] = {
-                'task': tasks_data['tasks'][-1],
-                'repo_url': repo_url,
-                'workspace': os.path.join('workspaces', agent_id)
-            }
-        
-        save_tasks(tasks_data)
-        
-        def check_and_start_main_loop():
-            for thread in threading.enumerate():
-                if thread.name == 'OrchestratorMainLoop':
-                    return
-            
-            thread = threading.Thread(target=main_loop, name='OrchestratorMainLoop')
-            thread.daemon = True
-            thread.start()
-        
-        check_and_start_main_loop()
-        
-        if created_agents:
-            return jsonify({
-                'success': True,
-                'agent_ids': created_agents,
-                'message': f'Agents {", ".join(created_agents)} created successfully'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to create any agents'
-            }), 500
-            
+        result = backend.call(
+            'create_agents',
+            repository_url=data.get('repo_url'),
+            tasks=data.get('tasks', []),
+            num_agents=data.get('num_agents', 1),
+            toolchain=data.get('toolchain'),
+            race=data.get('race'),
+            force=bool(data.get('force'))
+        )
+        created_agents = result['agent_ids']
+        return jsonify({
+            'success': True,
+            'agent_ids': created_agents,
+            'dag_id': result.get('dag_id'),
+            'message': (f'Task graph {result["dag_id"]} scheduled' if result.get('dag_id')
+                        else f'Agents {", ".join(created_agents)} created successfully')
+        })
+    except ServiceError as e:
+        return service_error_response(e)
     except Exception as e:
         logger.error(f"Error creating agent: {str(e)}", exc_info=True)
         return jsonify({
@@ -226,36 +304,15 @@ def create_agent():
         
 @socketio.on('retry_agent', namespace='/agents')
 def handle_retry_agent(data):
+    agent_id = data.get('agent_id')
     try:
-        agent_id = data.get('agent_id')
-        if not agent_id:
-            raise ValueError("No agent_id provided")
-            
-        tasks_data = load_tasks()
-        if agent_id not in tasks_data['agents']:
-            raise ValueError(f"Agent {agent_id} not found")
-            
-        aider_session = aider_sessions.get(agent_id)
-        if aider_session:
-            aider_session.cleanup()
-            del aider_sessions[agent_id]
-            
-        # Reinitialize the agent
-        agent_data = tasks_data['agents'][agent_id]
-        new_session = AiderSession(agent_data['repo_path'], agent_data['task'])
-        if new_session.start():
-            aider_sessions[agent_id] = new_session
-            agent_data['status'] = 'in_progress'
-            agent_data['last_updated'] = datetime.datetime.now().isoformat()
-            save_tasks(tasks_data)
-            
-            emit('agent_retry_result', {
-                'success': True,
-                'agent_id': agent_id,
-                'timestamp': datetime.datetime.now().isoformat()
-            })
-        else:
-            raise RuntimeError(f"Failed to restart agent {agent_id}")
+        result = backend.call('retry_agent', agent_id=agent_id, message=data.get('message'))
+        emit('agent_retry_result', {
+            'success': True,
+            'agent_id': agent_id,
+            'reused_session': result['reused_session'],
+            'timestamp': datetime.datetime.now().isoformat()
+        })
             
     except Exception as e:
         logger.error(f"Error retrying agent: {str(e)}", exc_info=True)
@@ -266,19 +323,37 @@ def handle_retry_agent(data):
             'timestamp': datetime.datetime.now().isoformat()
         })
         
+@socketio.on('send_message', namespace='/agents')
+def handle_send_message(data):
+    agent_id = data.get('agent_id')
+    try:
+        result = backend.call('send_message', agent_id=agent_id, message=data.get('message'))
+        emit('message_result', {
+            'success': True,
+            'agent_id': agent_id,
+            'message_count': result['message_count'],
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Error sending message to agent: {str(e)}", exc_info=True)
+        emit('message_result', {
+            'success': False,
+            'agent_id': agent_id,
+            'error': str(e),
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+
 @socketio.on('request_update', namespace='/agents')
-def handle_request_update():
+def handle_request_update(data=None):
+    """Send one page of agent summaries, the dashboard fetches full output per opened card"""
+    data = data or {}
     try:
-        tasks_data = load_tasks()
-        for agent_id, agent_data in tasks_data['agents'].items():
-            emit('output_update', {
-                'agent_id': agent_id,
-                'output': agent_data.get('aider_output', ''),
-                'status': agent_data.get('status', 'pending'),
-                'status_reason': agent_data.get('status_reason'),
-                'error_details': agent_data.get('error_details'),
-                'timestamp': datetime.datetime.now().isoformat()
-            })
+        emit('agents_summary', backend.call(
+            'agent_summary',
+            status=data.get('status') or None,
+            offset=max(0, int(data.get('offset') or 0)),
+            limit=min(max(0, int(data.get('limit') or 50)), MAX_SUMMARY_PAGE)
+        ))
     except Exception as e:
         logger.error(f"Error handling update request: {str(e)}", exc_info=True)
 
@@ -286,51 +361,22 @@ def handle_request_update():
 @app.route('/delete_agent/<agent_id>', methods=['DELETE'])
 def remove_agent(agent_id):
     try:
-        tasks_data = load_tasks()
-        
-        if agent_id not in tasks_data['agents']:
-            logger.error(f"No agent found with ID {agent_id}")
-            return jsonify({
-                'success': False, 
-                'error': f'Agent {agent_id} not found'
-            }), 404
-        
-        # Store agent data before deletion for logging
-        agent_data = tasks_data['agents'][agent_id]
-        logger.info(f"Found agent {agent_id} with workspace: {agent_data.get('workspace')}")
+        backend.call('delete_agent', agent_id=agent_id)
         
-        deletion_result = delete_agent(agent_id)
+        # Emit WebSocket event for real-time UI update
+        socketio.emit('agent_deleted', {
+            'agent_id': agent_id,
+            'timestamp': datetime.datetime.now().isoformat()
+        }, namespace='/agents')
         
-        if deletion_result:
-            # Remove from tasks data after successful deletion
-            del tasks_data['agents'][agent_id]
-            save_tasks(tasks_data)
-            
-            # Emit WebSocket event for real-time UI update
-            socketio.emit('agent_deleted', {
-                'agent_id': agent_id,
-                'timestamp': datetime.datetime.now().isoformat()
-            }, namespace='/agents')
-            
-            logger.info(f"Successfully deleted agent {agent_id}")
-            return jsonify({
-                'success': True,
-                'message': f'Agent {agent_id} deleted successfully'
-            })
-        else:
-            logger.error(f"Failed to delete agent {agent_id}")
-            return jsonify({
-                'success': False,
-                'error': f'Failed to delete agent {agent_id}'
-            }), 500
-    
-    except Exception as e:
-        logger.error(f"Error deleting agent: {str(e)}", exc_info=True)
+        logger.info(f"Successfully deleted agent {agent_id}")
         return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
-    
+            'success': True,
+            'message': f'Agent {agent_id} deleted successfully'
+        })
+    except ServiceError as e:
+        logger.error(f"Failed to delete agent {agent_id}: {e}")
+        return service_error_response(e)
     except Exception as e:
         logger.error(f"Error deleting agent: {str(e)}", exc_info=True)
         return jsonify({
@@ -341,105 +387,51 @@ def remove_agent(agent_id):
 @app.route('/debug/agent/<agent_id>')
 def debug_agent(agent_id):
     try:
-        tasks_data = load_tasks()
-        agent_data = tasks_data['agents'].get(agent_id)
-        
-        if not agent_data:
-            return jsonify({
-                'error': f'Agent {agent_id} not found'
-            }), 404
-            
-        workspace_path = normalize_path(agent_data.get('workspace'))
-        repo_path = normalize_path(agent_data.get('repo_path'))
-        
-        aider_session = aider_sessions.get(agent_id)
-        aider_workspace = normalize_path(aider_session.workspace_path) if aider_session else None
-        
-        debug_info = {
-            'agent_id': agent_id,
-            'paths': {
-                'workspace': {
-                    'raw': agent_data.get('workspace'),
-                    'normalized': workspace_path,
-                    'exists': os.path.exists(workspace_path) if workspace_path else False
-                },
-                'repo_path': {
-                    'raw': agent_data.get('repo_path'),
-                    'normalized': repo_path,
-                    'exists': os.path.exists(repo_path) if repo_path else False
-                },
-                'aider_workspace': {
-                    'raw': aider_session.workspace_path if aider_session else None,
-                    'normalized': aider_workspace,
-                    'exists': os.path.exists(aider_workspace) if aider_workspace else False
-                }
-            },
-            'aider_session': {
-                'exists': aider_session is not None,
-                'output_buffer_length': len(aider_session.get_output()) if aider_session else 0,
-                'session_id': aider_session.session_id if aider_session else None
-            },
-            'agent_data': {
-                'status': agent_data.get('status'),
-                'created_at': agent_data.get('created_at'),
-                'last_updated': agent_data.get('last_updated'),
-                'aider_output_length': len(agent_data.get('aider_output', '')),
-                'task': agent_data.get('task')
-            }
-        }
-        
-        return jsonify(debug_info)
-        
+        return jsonify(backend.call('debug_agent', agent_id=agent_id))
+    except ServiceError as e:
+        return jsonify({
+            'error': str(e)
+        }), e.status
     except Exception as e:
         logger.error(f"Error in debug endpoint: {str(e)}", exc_info=True)
         return jsonify({
             'error': str(e)
         }), 500
 
+@app.route('/debug/agent/<agent_id>/timeline')
+def debug_agent_timeline(agent_id):
+    """Waterfall of an agent's lifecycle spans; ?format=otlp returns OTLP/JSON"""
+    try:
+        return jsonify(backend.call('timeline', agent_id=agent_id, format=request.args.get('format')))
+    except ServiceError as e:
+        return jsonify({
+            'error': str(e)
+        }), e.status
+    except Exception as e:
+        logger.error(f"Error in timeline debug endpoint: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+@app.route('/debug/toolchains')
+def debug_toolchains():
+    """Registered aider toolchains with their cached probe results and timings"""
+    try:
+        return jsonify(backend.call('toolchains'))
+    except Exception as e:
+        logger.error(f"Error in toolchains debug endpoint: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': str(e)
+        }), 500
+
 @app.route('/debug/validate_paths/<agent_id>')
 def debug_validate_paths(agent_id):
     try:
-        tasks_data = load_tasks()
-        agent_data = tasks_data['agents'].get(agent_id)
-        
-        if not agent_data:
-            return jsonify({
-                'error': f'Agent {agent_id} not found'
-            }), 404
-        
-        aider_session = aider_sessions.get(agent_id)
-        
-        validation_results = {
-            'agent_id': agent_id,
-            'paths': {
-                'workspace': {
-                    'raw': agent_data.get('workspace'),
-                    'normalized': normalize_path(agent_data.get('workspace'))
-                },
-                'repo_path': {
-                    'raw': agent_data.get('repo_path'),
-                    'normalized': normalize_path(agent_data.get('repo_path'))
-                },
-                'aider_workspace': {
-                    'raw': aider_session.workspace_path if aider_session else None,
-                    'normalized': normalize_path(aider_session.workspace_path) if aider_session else None
-                }
-            },
-            'validation': {
-                'has_aider_session': aider_session is not None
-            }
-        }
-        
-        if aider_session:
-            validation_results['validation']['path_match'] = validate_agent_paths(
-                agent_id, 
-                aider_session.workspace_path
-            )
-            validation_results['validation']['output_length'] = len(aider_session.get_output())
-            validation_results['validation']['stored_output_length'] = len(agent_data.get('aider_output', ''))
-        
-        return jsonify(validation_results)
-        
+        return jsonify(backend.call('validate_paths', agent_id=agent_id))
+    except ServiceError as e:
+        return jsonify({
+            'error': str(e)
+        }), e.status
     except Exception as e:
         logger.error(f"Error in path validation debug endpoint: {str(e)}", exc_info=True)
         return jsonify({
@@ -450,30 +442,30 @@ def debug_validate_paths(agent_id):
 def handle_connect():
     try:
         logger.info(f"Client connected: {request.sid}")
-        tasks_data = load_tasks()
-        agents = tasks_data.get('agents', {})
+        # Counts only, agents are loaded through /api/agents/summary
+        summary = backend.call('agent_summary', limit=0)
         
+        if EVENT_CODEC is not None:
+            emit('agent_handles', EVENT_CODEC.handles(), namespace='/agents', to=request.sid)
         # Send initial state to newly connected client
         emit('connection_established', {
-            'has_agents': bool(agents),
-            'agent_count': len(agents),
+            'has_agents': bool(summary['total']),
+            'agent_count': summary['total'],
+            'counts': summary['counts'],
+            'compact_events': EVENT_CODEC is not None,
             'status': 'connected'
         }, namespace='/agents', to=request.sid)
-        
-        # Send current state of each agent
-        for agent_id, agent in agents.items():
-            emit('output_update', {
-                'agent_id': agent_id,
-                'output': agent.get('aider_output', ''),
-                'status': agent.get('status', 'pending'),
-                'timestamp': datetime.datetime.now().isoformat()
-            }, namespace='/agents', to=request.sid)
     except Exception as e:
         logger.error(f"Error in handle_connect: {str(e)}", exc_info=True)
         emit('connection_error', {'error': str(e)}, namespace='/agents', to=request.sid)
         
         
 
+@socketio.on('agent_handles', namespace='/agents')
+def handle_agent_handles():
+    """Full handle table, for a client that saw a handle it does not know"""
+    emit('agent_handles', EVENT_CODEC.handles() if EVENT_CODEC is not None else [])
+
 @socketio.on('disconnect', namespace='/agents')
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
@@ -485,4 +477,4 @@ def handle_error(e):
 
 if __name__ == '__main__':
     logger.info("Starting application")
-    socketio.run(app, debug=True)
+    socketio.run(app, debug=True, port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,57 @@
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from utils.golden import GoldenCheckouts
+from utils.workspace_gc import disk_usage
+
+NUM_FILES = 2000
+FILE_BYTES = 4096
+
+
+@pytest.fixture(scope="module")
+def upstream(tmp_path_factory):
+    """A repository of NUM_FILES source files in 20 directories"""
+    repo = tmp_path_factory.mktemp("upstream") / "project"
+    for i in range(NUM_FILES):
+        path = repo / f"pkg{i % 20}" / f"module_{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(FILE_BYTES // 2).hex().encode())
+    git = ['git', '-c', 'user.name=bench', '-c', 'user.email=bench@example.com']
+    subprocess.run(git + ['init', '-q'], cwd=repo, check=True)
+    subprocess.run(git + ['add', '.'], cwd=repo, check=True)
+    subprocess.run(git + ['commit', '-q', '-m', 'initial'], cwd=repo, check=True)
+    return repo
+
+
+@pytest.mark.parametrize("method", ["clone", "hardlink", "reflink", "overlay"])
+def bench_agent_checkout(benchmark, tmp_path, upstream, method):
+    """Time and disk to create one agent's checkout, with the golden checkout already prepared"""
+    if method == 'overlay' and (not sys.platform.startswith('linux') or os.geteuid() != 0):
+        pytest.skip("overlay mounts need root")
+    golden_checkouts = GoldenCheckouts(tmp_path / "golden")
+    golden = golden_checkouts.prepare(str(upstream))
+    workspaces = []
+
+    def create():
+        workspace = tmp_path / f"agent_{uuid.uuid4().hex[:8]}_"
+        (workspace / "repo").mkdir(parents=True)
+        workspaces.append(workspace)
+        if method == 'clone':
+            subprocess.run(['git', 'clone', '-q', str(upstream)], cwd=workspace / "repo", check=True)
+            return method
+        return golden_checkouts.materialize(golden, workspace / "repo" / golden.name, workspace, mode=method)
+
+    try:
+        if create() != method:
+            pytest.skip(f"{method} is not supported here")
+        benchmark.pedantic(create, rounds=5)
+        benchmark.extra_info['agent_disk_kb'] = round(disk_usage(workspaces[-1]) / 1024)
+    finally:
+        for workspace in workspaces:
+            golden_checkouts.release(workspace)
+            shutil.rmtree(workspace, ignore_errors=True)
@@ -0,0 +1,59 @@
+import pytest
+import logging
+import logging.handlers
+
+from conftest import OUTPUT_LINE
+from utils.logging_utils import (SAMPLED, JsonFormatter, TEXT_FORMAT, create_queue_handler, set_log_context,
+                                 clear_log_context)
+
+
+@pytest.fixture
+def bench_logger(tmp_path, request):
+    """A private logger that does not touch the root configuration"""
+    logger = logging.getLogger(f"bench.{request.node.name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger, tmp_path / "bench.log"
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    clear_log_context()
+
+
+def _file_handler(path):
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=50 * 1024 * 1024, backupCount=1)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def bench_log_line_sync_file_handler(benchmark, bench_logger):
+    """Per-line cost on the reader thread with the previous synchronous RotatingFileHandler"""
+    logger, path = bench_logger
+    logger.addHandler(_file_handler(path))
+    benchmark(logger.info, f"[Session abc12345] Read line: {OUTPUT_LINE.strip()}")
+
+
+def bench_log_line_queue_handler(benchmark, bench_logger):
+    """Per-line cost on the reader thread when records are only enqueued"""
+    logger, path = bench_logger
+    file_handler = _file_handler(path)
+    file_handler.setFormatter(JsonFormatter())
+    queue_handler, listener = create_queue_handler([file_handler], sample_rate=0)
+    logger.addHandler(queue_handler)
+    set_log_context(agent_id="agent-00000", session_id="abc12345")
+    try:
+        benchmark(logger.info, f"[Session abc12345] Read line: {OUTPUT_LINE.strip()}")
+    finally:
+        listener.stop()
+
+
+def bench_log_line_sampled_out(benchmark, bench_logger):
+    """Per-line cost of a high-frequency call site once its sampling budget is spent"""
+    logger, path = bench_logger
+    file_handler = _file_handler(path)
+    queue_handler, listener = create_queue_handler([file_handler], sample_rate=1, sample_burst=1)
+    logger.addHandler(queue_handler)
+    try:
+        benchmark(logger.info, "Broadcasted update for agent agent-00000", extra=SAMPLED)
+    finally:
+        listener.stop()
@@ -0,0 +1,106 @@
+import pytest
+import io
+import json
+import time
+import threading
+
+import orchestrator
+from conftest import OUTPUT_LINE, make_tasks_data
+
+
+@pytest.mark.parametrize("num_lines", [200, 1000])
+def bench_read_and_process_output(benchmark, tmp_path, session, config_file, isolated_output_queue, num_lines):
+    """Lines/sec through _read_output and _process_output, including the periodic task persistence"""
+    tasks_data = make_tasks_data(tmp_path, 10)
+    session.agent_id = next(iter(tasks_data['agents']))
+
+    def setup():
+        config_file.write_text(json.dumps(tasks_data))
+        session.output_buffer = io.StringIO()
+        session._stop_event = threading.Event()
+        while not isolated_output_queue.empty():
+            isolated_output_queue.get_nowait()
+        return (io.StringIO(OUTPUT_LINE * num_lines),), {}
+
+    def run(pipe):
+        processor = threading.Thread(target=session._process_output, daemon=True)
+        processor.start()
+        session._read_output(pipe, "stdout")
+        # Every processed line publishes one update for the agent
+        while isolated_output_queue.qsize() < num_lines:
+            time.sleep(0.0005)
+        session._stop_event.set()
+        processor.join()
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+    benchmark.extra_info['lines_per_sec'] = round(num_lines / benchmark.stats.stats.mean)
+
+
+@pytest.mark.parametrize("size_mb", [1, 10])
+def bench_get_output(benchmark, session, size_mb):
+    session.output_buffer.write(OUTPUT_LINE * (size_mb * 1024 * 1024 // len(OUTPUT_LINE)))
+    output = benchmark(session.get_output)
+    assert len(output) > 0
+
+
+@pytest.mark.parametrize("num_clients", [1, 10, 50])
+def bench_broadcast_fan_out(benchmark, config_file, num_clients):
+    """Cost of one broadcast_output emission to N connected dashboard clients"""
+    import app as web
+
+    clients = [web.socketio.test_client(web.app, namespace='/agents') for _ in range(num_clients)]
+    update = {
+        'agent_id': 'agent-00000',
+        'output': OUTPUT_LINE * 200,
+        'status': 'in_progress',
+        'timestamp': '2024-01-01T00:00:00'
+    }
+
+    def drain():
+        for client in clients:
+            client.get_received('/agents')
+
+    benchmark.pedantic(
+        web.socketio.emit,
+        args=('output_update', update),
+        kwargs={'namespace': '/agents'},
+        setup=drain,
+        rounds=50
+    )
+    for client in clients:
+        client.disconnect(namespace='/agents')
+
+
+def bench_output_delta_conversion(benchmark):
+    """ANSI-to-segment conversion of one appended line, done once in the web tier for all clients"""
+    from utils.ansi import TerminalStreams
+
+    streams = TerminalStreams()
+    line = "\x1b[1;32mApplied edit to\x1b[0m " + OUTPUT_LINE
+    position = {'offset': 0}
+
+    def convert():
+        delta = streams.convert('agent-00000', position['offset'], line)
+        position['offset'] = delta['end']
+        return delta
+
+    delta = benchmark(convert)
+    assert delta['lines'][0][0] == ['Applied edit to', 'b f2']
+
+
+@pytest.mark.parametrize("num_files", [1000, 5000])
+def bench_critique_agent_progress(benchmark, tmp_path, config_file, monkeypatch, num_files):
+    repo = tmp_path / "agent_0" / "repo" / "project"
+    for i in range(num_files):
+        package = repo / f"package_{i % 50}" / f"module_{i % 7}"
+        package.mkdir(parents=True, exist_ok=True)
+        (package / f"file_{i}.py").write_text("VALUE = 1\n")
+
+    tasks_data = make_tasks_data(tmp_path, 10)
+    agent_id = next(iter(tasks_data['agents']))
+    tasks_data['agents'][agent_id]['repo_path'] = str(repo)
+    config_file.write_text(json.dumps(tasks_data))
+    monkeypatch.setattr(orchestrator, "aider_sessions", {agent_id: orchestrator.AiderSession(str(repo), "task")})
+
+    critique = benchmark(orchestrator.critique_agent_progress, agent_id)
+    assert critique['files_created'] == num_files
@@ -0,0 +1,35 @@
+import pytest
+import json
+
+import orchestrator
+from conftest import make_tasks_data
+
+
+@pytest.mark.parametrize("num_agents", [10, 100, 1000])
+def bench_save_tasks(benchmark, tmp_path, config_file, num_agents):
+    tasks_data = make_tasks_data(tmp_path, num_agents)
+    benchmark(orchestrator.save_tasks, tasks_data)
+    benchmark.extra_info['bytes'] = config_file.stat().st_size
+
+
+@pytest.mark.parametrize("num_agents", [10, 100, 1000])
+def bench_load_tasks(benchmark, tmp_path, config_file, num_agents):
+    config_file.write_text(json.dumps(make_tasks_data(tmp_path, num_agents)))
+    loaded = benchmark(orchestrator.load_tasks)
+    assert len(loaded['agents']) == num_agents
+    benchmark.extra_info['bytes'] = config_file.stat().st_size
+
+
+@pytest.mark.parametrize("path", ["relative/workspace/repo", "/tmp/agent_workspace/repo/project"])
+def bench_normalize_path(benchmark, path):
+    benchmark(orchestrator.normalize_path, path)
+
+
+@pytest.mark.parametrize("num_agents", [10, 100, 1000])
+def bench_session_association(benchmark, tmp_path, config_file, num_agents):
+    """Constructing a session without an agent_id looks its agent up by path"""
+    tasks_data = make_tasks_data(tmp_path, num_agents)
+    orchestrator.save_tasks(tasks_data)
+    repo_path = tasks_data['agents'][f"agent-{num_agents - 1:05d}"]['repo_path']
+    session = benchmark(orchestrator.AiderSession, repo_path, "Implement the feature")
+    assert session.agent_id == f"agent-{num_agents - 1:05d}"
@@ -0,0 +1,72 @@
+import pytest
+import zlib
+import datetime
+
+from socketio import packet
+
+from conftest import OUTPUT_LINE
+from utils.ansi import TerminalStreams
+from utils.event_codec import EventCodec
+
+UPDATES = 10_000
+NUM_AGENTS = 50
+# permessage-deflate ends every message with a sync flush and strips its 4 byte tail
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+def make_events():
+    """A dashboard event stream: output deltas at line rate, a status update every 10th event"""
+    streams = TerminalStreams()
+    offsets = {}
+    start = datetime.datetime(2024, 1, 1)
+    line = "\x1b[1;32mApplied edit to\x1b[0m " + OUTPUT_LINE
+    events = []
+    for i in range(UPDATES):
+        agent_id = f'agent-{i % NUM_AGENTS:05d}'
+        timestamp = (start + datetime.timedelta(milliseconds=i * 7)).isoformat()
+        if i % 10 == 9:
+            events.append(('output_update', {
+                'agent_id': agent_id, 'status': 'in_progress', 'status_reason': None, 'error_details': None,
+                'timestamp': timestamp, 'output_chars': offsets.get(agent_id, 0), 'last_line': OUTPUT_LINE.strip()
+            }))
+            continue
+        delta = streams.convert(agent_id, offsets.get(agent_id, 0), line)
+        offsets[agent_id] = delta['end']
+        delta.update(last_line=OUTPUT_LINE.strip(), timestamp=timestamp)
+        events.append(('output_delta', delta))
+    return events
+
+
+@pytest.mark.parametrize("compress", [False, True], ids=["plain", "deflate"])
+@pytest.mark.parametrize("serializer", ["json", "msgpack"])
+def bench_socketio_encoding(benchmark, serializer, compress):
+    """Server CPU and bytes on the wire to encode 10k /agents events for one websocket client"""
+    if serializer == 'msgpack':
+        from socketio.msgpack_packet import MsgPackPacket as packet_class
+    else:
+        packet_class = packet.Packet
+    events = make_events()
+
+    def encode():
+        codec = EventCodec() if serializer == 'msgpack' else None
+        deflate = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS) if compress else None
+        total = 0
+        for name, payload in events:
+            messages = []
+            if codec is not None:
+                payload, announce = codec.encode(payload)
+                if announce:
+                    messages.append(['agent_handles', announce])
+            messages.append([name, payload])
+            for data in messages:
+                encoded = packet_class(packet.EVENT, data=data, namespace='/agents').encode()
+                if isinstance(encoded, str):
+                    encoded = encoded.encode()
+                if deflate is not None:
+                    encoded = (deflate.compress(encoded) + deflate.flush(zlib.Z_SYNC_FLUSH))[:-len(DEFLATE_TAIL)]
+                total += len(encoded)
+        return total
+
+    total_bytes = benchmark.pedantic(encode, rounds=3)
+    benchmark.extra_info['bytes_per_update'] = round(total_bytes / UPDATES, 1)
+    benchmark.extra_info['total_kb'] = round(total_bytes / 1024)
@@ -0,0 +1,116 @@
+"""
+Compare time-to-first-byte and inter-chunk latency of the pipe and PTY aider backends.
+
+By default a small emitter process imitates aider streaming an LLM response: tokens are
+written without trailing newlines and a newline only ends each sentence. Pass --cmd to
+measure a real command instead.
+
+    python benchmarks/stream_latency.py --tokens 200 --delay 0.005
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.pty_utils import PtyProcess, PTY_SUPPORTED
+
+EMITTER = '''
+import sys, time
+tokens, delay, per_line = int(sys.argv[1]), float(sys.argv[2]), int(sys.argv[3])
+for i in range(tokens):
+    sys.stdout.write(f"token{i} ")
+    if (i + 1) % per_line == 0:
+        sys.stdout.write("\\n")
+    sys.stdout.flush()
+    time.sleep(delay)
+sys.stdout.write("\\n")
+'''
+
+
+def _summarize(mode, start, arrivals, total_bytes):
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    return {
+        'mode': mode,
+        'ttfb_ms': round((arrivals[0] - start) * 1000, 3) if arrivals else None,
+        'chunks': len(arrivals),
+        'bytes': total_bytes,
+        'inter_chunk_mean_ms': round(statistics.mean(gaps) * 1000, 3) if gaps else None,
+        'inter_chunk_p95_ms': round(sorted(gaps)[int(len(gaps) * 0.95)] * 1000, 3) if gaps else None,
+        'inter_chunk_max_ms': round(max(gaps) * 1000, 3) if gaps else None,
+        'total_ms': round((arrivals[-1] - start) * 1000, 3) if arrivals else None
+    }
+
+
+def measure_pipe(cmd, env):
+    """Read the way the pipe backend does: one readline() per update"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, bufsize=1, env=env
+    )
+    arrivals, total_bytes = [], 0
+    for line in iter(process.stdout.readline, ''):
+        arrivals.append(time.perf_counter())
+        total_bytes += len(line)
+    process.wait()
+    return _summarize('pipe', start, arrivals, total_bytes)
+
+
+def measure_pty(cmd, env):
+    """Read the way the PTY backend does: chunked non-blocking reads"""
+    start = time.perf_counter()
+    process = PtyProcess(cmd, env=env)
+    arrivals, total_bytes = [], 0
+    try:
+        while True:
+            chunk = process.read_chunk(timeout=0.1)
+            if chunk is None:
+                break
+            if chunk:
+                arrivals.append(time.perf_counter())
+                total_bytes += len(chunk)
+        process.wait()
+    finally:
+        process.close()
+    return _summarize('pty', start, arrivals, total_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.005, help='Seconds between tokens')
+    parser.add_argument('--tokens-per-line', type=int, default=25)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cmd', nargs=argparse.REMAINDER, help='Command to measure instead of the emitter')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if not PTY_SUPPORTED:
+        print("PTY backend is only available on Linux", file=sys.stderr)
+        return 1
+
+    cmd = args.cmd or [sys.executable, '-c', EMITTER, str(args.tokens), str(args.delay),
+                       str(args.tokens_per_line)]
+    env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONIOENCODING='utf-8')
+
+    results = []
+    for run in range(args.runs):
+        for measure in (measure_pipe, measure_pty):
+            result = measure(cmd, env)
+            result['run'] = run
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
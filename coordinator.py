@@ -0,0 +1,405 @@
+"""
+Coordinator for running agents on several machines.
+
+    export ORCHESTRATOR_TOKEN=<shared secret>
+    python coordinator.py --listen 0.0.0.0:7700
+    python daemon.py serve --listen 0.0.0.0:7701 --coordinator coordinator-host:7700 --slots 8
+    ORCHESTRATOR_SOCKET=coordinator-host:7700 python app.py
+
+Workers are ordinary orchestrator daemons that register with the coordinator and send
+their capacity (slots, running agents, cached repositories) as a heartbeat. The
+coordinator exposes the same operations as a single daemon, so the web tier does not
+know whether it is talking to one machine or a fleet. New agents are placed on the
+worker with the most free capacity, with a bonus for workers that already have the
+repository cloned; calls for an existing agent are routed to the worker that owns it,
+and every worker's output topic is republished on the coordinator's.
+
+Listening on an address other than loopback requires ORCHESTRATOR_TOKEN. The token is sent
+in plaintext, so run the fleet on a trusted network or over TLS or an SSH/VPN tunnel.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from service import OUTPUT_TOPIC, ServiceError, page_agents
+from utils.task_dag import has_dependencies
+from utils.ipc import IpcClient, IpcError, IpcServer, format_address, listen_error
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LISTEN = os.environ.get('COORDINATOR_LISTEN', '127.0.0.1:7700')
+HEARTBEAT_INTERVAL = 5
+WORKER_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+# Free-capacity fraction a worker with the repository already cloned is credited with
+LOCALITY_BONUS = 0.25
+# Same default as orchestrator.DEFAULT_AGENTS_PER_TASK, which is not imported here
+DEFAULT_AGENTS_PER_TASK = 2
+
+PLACEMENTS = REGISTRY.counter('coordinator_placements', 'Agents placed on workers', ['worker_id', 'cache_hit'])
+
+
+class WorkerInfo:
+    """A registered worker daemon and the connections used to reach it"""
+
+    def __init__(self, worker_id, address, token=None):
+        self.worker_id = worker_id
+        self.address = address
+        self.slots = 1
+        self.running = 0
+        self.repos = set()
+        self.agent_ids = set()
+        self.last_seen = 0.0
+        self.client = IpcClient(address, token=token)
+        self.subscriber = IpcClient(address, token=token)
+
+    @property
+    def alive(self):
+        return time.time() - self.last_seen < WORKER_TIMEOUT
+
+    @property
+    def free_slots(self):
+        return max(0, self.slots - self.running)
+
+    def score(self, repository_url, pending=0):
+        """Higher is better: free capacity fraction plus a bonus for a warm repository cache"""
+        free = max(0, self.free_slots - pending)
+        if not free:
+            return None
+        return free / self.slots + (LOCALITY_BONUS if repository_url in self.repos else 0)
+
+    def to_dict(self):
+        return {
+            'worker_id': self.worker_id,
+            'address': self.address,
+            'alive': self.alive,
+            'slots': self.slots,
+            'running': self.running,
+            'agents': len(self.agent_ids),
+            'repos': sorted(self.repos),
+            'last_seen': self.last_seen
+        }
+
+    def close(self):
+        self.client.close()
+        self.subscriber.close()
+
+
+def place_agents(workers, repository_url, count, single=False):
+    """
+    Assign count new agents to workers, returning {worker_id: number of agents}. With single,
+    all agents go to the worker chosen for the first one (racing agents are judged by one worker).
+    """
+    placement = {}
+    for _ in range(count):
+        scored = [
+            (score, worker.worker_id)
+            for worker in workers
+            for score in [worker.score(repository_url, placement.get(worker.worker_id, 0))]
+            if score is not None
+        ]
+        if not scored:
+            break
+        _, worker_id = max(scored)
+        placement[worker_id] = placement.get(worker_id, 0) + 1
+        if single:
+            workers = [worker for worker in workers if worker.worker_id == worker_id]
+    return placement
+
+
+class Coordinator:
+    """Tracks workers, places agents and routes operations to the worker owning an agent"""
+
+    def __init__(self, address=DEFAULT_LISTEN, token=None):
+        self.token = token
+        self.workers = {}
+        self._lock = threading.Lock()
+        self.ipc = IpcServer(address, self.handle, token=token)
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='coordinator')
+        REGISTRY.gauge('coordinator_workers_alive', 'Workers with a recent heartbeat').set_function(
+            lambda: len(self._alive_workers()))
+        REGISTRY.gauge('coordinator_free_slots', 'Free agent slots across live workers').set_function(
+            lambda: sum(worker.free_slots for worker in self._alive_workers()))
+
+    def handle(self, method, params):
+        handler = getattr(self, f'op_{method}', None) if isinstance(method, str) else None
+        if handler is None:
+            raise ServiceError(f'Unknown method: {method}', 404)
+        return handler(**params)
+
+    def _alive_workers(self):
+        with self._lock:
+            return [worker for worker in self.workers.values() if worker.alive]
+
+    def _call(self, worker, method, **params):
+        try:
+            return worker.client.call(method, **params)
+        except IpcError as e:
+            raise ServiceError(f"Worker {worker.worker_id}: {e}", e.status, **e.details)
+
+    def _owner(self, agent_id):
+        with self._lock:
+            worker = next((w for w in self.workers.values() if agent_id in w.agent_ids), None)
+        if worker is None:
+            raise ServiceError(f'Agent {agent_id} not found', 404)
+        if not worker.alive:
+            raise ServiceError(f'Worker {worker.worker_id} owning agent {agent_id} is not responding', 503)
+        return worker
+
+    def _fan_out(self, method, **params):
+        """Call every live worker in parallel, skipping the ones that fail"""
+        workers = self._alive_workers()
+        futures = {worker.worker_id: self._pool.submit(self._call, worker, method, **params) for worker in workers}
+        results = {}
+        for worker_id, future in futures.items():
+            try:
+                results[worker_id] = future.result()
+            except ServiceError as e:
+                logger.warning(f"Skipping worker {worker_id} for {method}: {e}")
+        return results
+
+    def _republish(self, worker_id):
+        def forward(topic, update):
+            update['worker_id'] = worker_id
+            self.ipc.publish(OUTPUT_TOPIC, update)
+        return forward
+
+    def op_register_worker(self, worker_id=None, address=None, slots=1, running=0, repos=(), agent_ids=()):
+        """Heartbeat from a worker daemon; the first one also subscribes to its output"""
+        if not worker_id or not address:
+            raise ServiceError('worker_id and address are required')
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is None or worker.address != address:
+                if worker is not None:
+                    worker.close()
+                worker = self.workers[worker_id] = WorkerInfo(worker_id, address, self.token)
+                worker.subscriber.subscribe([OUTPUT_TOPIC], self._republish(worker_id))
+                logger.info(f"Worker {worker_id} registered from {address} with {slots} slots")
+            worker.slots = max(1, int(slots))
+            worker.running = int(running)
+            worker.repos = set(repos)
+            worker.agent_ids = set(agent_ids)
+            worker.last_seen = time.time()
+        return {'heartbeat_interval': HEARTBEAT_INTERVAL}
+
+    def op_workers(self):
+        with self._lock:
+            return [worker.to_dict() for worker in self.workers.values()]
+
+    def op_ping(self):
+        workers = self._alive_workers()
+        return {
+            'pid': os.getpid(),
+            'workers': len(workers),
+            'sessions': sum(worker.running for worker in workers)
+        }
+
+    def op_create_agents(self, repository_url=None, tasks=None, num_agents=None, toolchain=None, race=None,
+                         force=False):
+        if not repository_url or not tasks:
+            raise ServiceError('Repository URL and tasks are required')
+        if isinstance(tasks, str):
+            tasks = [tasks]
+
+        created_agents = []
+        dag_ids = []
+        errors = []
+        # A task graph runs on one worker: dependent tasks start from the workspaces of earlier ones
+        groups = [tasks] if has_dependencies(tasks) else [[task] for task in tasks]
+        for group in groups:
+            count = num_agents or DEFAULT_AGENTS_PER_TASK
+            with self._lock:
+                workers = [worker for worker in self.workers.values() if worker.alive]
+                placement = place_agents(workers, repository_url, count, single=bool(race) or len(group) > 1)
+                # Reserve the slots until the next heartbeat reports the real load
+                for worker_id, placed in placement.items():
+                    self.workers[worker_id].running += placed
+            if not placement:
+                raise ServiceError('No worker has free capacity', 503)
+            if sum(placement.values()) < count:
+                logger.warning(f"Only {sum(placement.values())} of {count} agents could be placed for task")
+
+            futures = {}
+            for worker_id, placed in placement.items():
+                worker = self.workers[worker_id]
+                PLACEMENTS.labels(worker_id, str(repository_url in worker.repos).lower()).inc(placed)
+                logger.info(f"Placing {placed} agent(s) for task on worker {worker_id}")
+                futures[worker] = self._pool.submit(
+                    self._call, worker, 'create_agents',
+                    repository_url=repository_url, tasks=group,
+                    num_agents=placed, toolchain=toolchain, race=race, force=force
+                )
+            for worker, future in futures.items():
+                try:
+                    result = future.result()
+                    agent_ids = result['agent_ids']
+                    if result.get('dag_id'):
+                        dag_ids.append(result['dag_id'])
+                except ServiceError as e:
+                    errors.append(e)
+                    continue
+                with self._lock:
+                    worker.agent_ids.update(agent_ids)
+                    worker.repos.add(repository_url)
+                created_agents.extend(agent_ids)
+
+        if not created_agents and not dag_ids:
+            if errors:
+                raise errors[0]
+            raise ServiceError('Failed to create any agents', 500)
+        if dag_ids:
+            return {'agent_ids': created_agents, 'dag_id': dag_ids[0]}
+        return {'agent_ids': created_agents}
+
+    def op_get_tasks(self):
+        merged = {'tasks': [], 'agents': {}, 'repository_url': '', 'races': {}, 'dags': {}}
+        for worker_id, tasks_data in self._fan_out('get_tasks').items():
+            for task in tasks_data.get('tasks', []):
+                if task not in merged['tasks']:
+                    merged['tasks'].append(task)
+            for agent_id, agent in tasks_data.get('agents', {}).items():
+                agent['worker_id'] = worker_id
+                merged['agents'][agent_id] = agent
+            merged['races'].update(tasks_data.get('races', {}))
+            merged['dags'].update(tasks_data.get('dags', {}))
+            merged['repository_url'] = tasks_data.get('repository_url') or merged['repository_url']
+        return merged
+
+    def op_list_agents(self):
+        agents = []
+        for worker_id, listed in self._fan_out('list_agents').items():
+            for agent in listed:
+                agent['worker_id'] = worker_id
+                agents.append(agent)
+        return agents
+
+    def op_agent_summary(self, status=None, offset=0, limit=50):
+        # Each worker returns its first offset + limit agents in the shared sort order,
+        # enough to cut the requested page out of the merged list
+        window = max(0, int(offset or 0)) + max(0, int(limit if limit is not None else 50))
+        summaries, counts, total = [], {}, 0
+        for worker_id, page in self._fan_out('agent_summary', status=status, offset=0, limit=window).items():
+            for summary in page['agents']:
+                summary['worker_id'] = worker_id
+                summaries.append(summary)
+            for agent_status, count in page['counts'].items():
+                counts[agent_status] = counts.get(agent_status, 0) + count
+            total += page['total']
+        merged = page_agents({summary['agent_id']: summary for summary in summaries}, None, offset, limit)
+        return dict(merged, agents=[summary for _, summary in merged['agents']], total=total, counts=counts)
+
+    def op_agent_detail(self, agent_id=None, include_output=True):
+        worker = self._owner(agent_id)
+        return {**self._call(worker, 'agent_detail', agent_id=agent_id, include_output=include_output),
+                'worker_id': worker.worker_id}
+
+    def op_agent_output(self, agent_id=None, offset=None, limit=None, tail=None):
+        return self._call(self._owner(agent_id), 'agent_output', agent_id=agent_id,
+                          offset=offset, limit=limit, tail=tail)
+
+    def op_delete_agent(self, agent_id=None):
+        worker = self._owner(agent_id)
+        result = self._call(worker, 'delete_agent', agent_id=agent_id)
+        with self._lock:
+            worker.agent_ids.discard(agent_id)
+        return result
+
+    def op_retry_agent(self, agent_id=None, message=None):
+        return self._call(self._owner(agent_id), 'retry_agent', agent_id=agent_id, message=message)
+
+    def op_send_message(self, agent_id=None, message=None):
+        return self._call(self._owner(agent_id), 'send_message', agent_id=agent_id, message=message)
+
+    def op_debug_agent(self, agent_id=None):
+        worker = self._owner(agent_id)
+        return {**self._call(worker, 'debug_agent', agent_id=agent_id), 'worker_id': worker.worker_id}
+
+    def op_validate_paths(self, agent_id=None):
+        return self._call(self._owner(agent_id), 'validate_paths', agent_id=agent_id)
+
+    def op_timeline(self, agent_id=None, format=None):
+        return self._call(self._owner(agent_id), 'timeline', agent_id=agent_id, format=format)
+
+    def op_toolchains(self):
+        return self._fan_out('toolchains')
+
+    def op_metrics(self):
+        texts = {worker_id: result['text'] for worker_id, result in self._fan_out('metrics').items()}
+        return {'text': REGISTRY.render() + merge_worker_metrics(texts)}
+
+    def start(self):
+        return self.ipc.start()
+
+    def serve_forever(self):
+        self.ipc.serve_forever()
+
+    def shutdown(self):
+        self.ipc.shutdown()
+        with self._lock:
+            for worker in self.workers.values():
+                worker.close()
+        self._pool.shutdown(wait=False)
+
+
+def _add_label(sample, name, value):
+    metric, _, rest = sample.partition(' ')
+    if '{' in metric:
+        metric = metric.replace('{', f'{{{name}="{value}",', 1)
+    else:
+        metric = f'{metric}{{{name}="{value}"}}'
+    return f'{metric} {rest}'
+
+
+def merge_worker_metrics(texts):
+    """
+    Combine the Prometheus text of several workers, adding a worker_id label and keeping
+    each metric family's samples together under a single HELP/TYPE header.
+    """
+    families = {}
+    for worker_id, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                family = families.setdefault(line.split(' ', 3)[2], {'header': [], 'samples': []})
+                if line not in family['header']:
+                    family['header'].append(line)
+            elif line and family is not None:
+                family['samples'].append(_add_label(line, 'worker_id', worker_id))
+    lines = []
+    for family in families.values():
+        lines.extend(family['header'])
+        lines.extend(family['samples'])
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def main(argv=None):
+    from utils.logging_utils import setup_logging
+
+    parser = argparse.ArgumentParser(description='Coordinator for multi-node agent execution')
+    parser.add_argument('--listen', default=DEFAULT_LISTEN, help='host:port (or Unix socket path) to listen on')
+    args = parser.parse_args(argv)
+
+    token = os.environ.get('ORCHESTRATOR_TOKEN')
+    error = listen_error(args.listen, token)
+    if error:
+        logger.error(error)
+        return 2
+    setup_logging('coordinator.log', level=logging.INFO)
+    coordinator = Coordinator(args.listen, token=token)
+    logger.info(f"Starting coordinator on {format_address(coordinator.ipc.address)}")
+    try:
+        coordinator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
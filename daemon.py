@@ -0,0 +1,257 @@
+"""
+Headless orchestrator daemon with a local control API.
+
+    python daemon.py serve [--socket PATH | --listen HOST:PORT] [--coordinator HOST:PORT --slots N]
+    python daemon.py create --repo URL --task TEXT [--agents N] [--toolchain NAME] [--race-test CMD] [--force]
+    python daemon.py list
+    python daemon.py delete AGENT_ID
+    python daemon.py importtime [--module orchestrator] [--top 15]
+
+`serve` runs agents and the orchestration loop without Flask or Socket.IO and exposes
+the orchestrator over an IPC socket (ORCHESTRATOR_SOCKET, default
+~/.cache/100x-orchestrator/orchestrator.sock): request/response for control and an
+"output" pub/sub topic for agent output. Web workers started with ORCHESTRATOR_SOCKET
+set use it instead of running their own orchestrator. The other commands are thin
+clients; only `serve` imports the orchestrator, so they start in milliseconds.
+
+With --coordinator the daemon is a worker of coordinator.py: it listens on TCP and
+reports its capacity to the coordinator every few seconds. --listen on an address other than
+loopback requires ORCHESTRATOR_TOKEN, which is sent in plaintext (use TLS or a tunnel).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import logging
+import socket
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+
+from service import OUTPUT_TOPIC, OrchestratorService
+from utils.ipc import IpcClient, IpcError, IpcServer, format_address, listen_error, parse_address
+
+ROOT = Path(__file__).resolve().parent
+HEARTBEAT_INTERVAL = 5
+DEFAULT_SOCKET = os.environ.get(
+    'ORCHESTRATOR_SOCKET',
+    os.path.join(os.path.expanduser('~'), '.cache', '100x-orchestrator', 'orchestrator.sock')
+)
+
+logger = logging.getLogger(__name__)
+
+
+def measure_import_time(module='orchestrator', top=15):
+    """
+    Import a module in a fresh interpreter under `-X importtime` and return the
+    slowest imports by cumulative and by self time, in microseconds.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=str(ROOT), capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - start
+    entries = parse_import_time(result.stderr)
+    if result.returncode != 0:
+        return {'success': False, 'error': (result.stderr.strip().splitlines() or ['Import failed'])[-1]}
+    total = next((e['cumulative_us'] for e in entries if e['module'] == module), None)
+    return {
+        'success': True,
+        'module': module,
+        'total_us': total,
+        'interpreter_wall_seconds': round(wall_seconds, 3),
+        'by_cumulative': sorted(entries, key=lambda e: e['cumulative_us'], reverse=True)[:top],
+        'by_self': sorted(entries, key=lambda e: e['self_us'], reverse=True)[:top]
+    }
+
+
+def parse_import_time(stderr):
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            entries.append({
+                'module': name.strip(),
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us)
+            })
+        except ValueError:
+            continue
+    return entries
+
+
+class OrchestratorDaemon:
+    """Serves OrchestratorService over IPC and publishes output updates to subscribers"""
+
+    def __init__(self, orchestrator, socket_path=DEFAULT_SOCKET, token=None):
+        self.orchestrator = orchestrator
+        self.socket_path = socket_path
+        self.service = OrchestratorService(orchestrator)
+        self.ipc = IpcServer(socket_path, self.handle, token=token)
+        self._stop_event = threading.Event()
+
+    def handle(self, method, params):
+        if method == 'importtime':
+            return measure_import_time(params.get('module', 'orchestrator'), int(params.get('top', 15)))
+        return self.service.handle(method, params)
+
+    def _publish_output(self):
+        """Sole consumer of the orchestrator's output queue; fans updates out to web workers"""
+        while not self._stop_event.is_set():
+            try:
+                update = self.orchestrator.output_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.ipc.publish(OUTPUT_TOPIC, update)
+
+    def _start_publisher(self):
+        threading.Thread(target=self._publish_output, daemon=True, name='output-publisher').start()
+
+    def _heartbeat(self, coordinator, worker_id, slots, advertise):
+        interval = HEARTBEAT_INTERVAL
+        while not self._stop_event.is_set():
+            try:
+                address = advertise or format_address(self.ipc.address)
+                reply = coordinator.call('register_worker', worker_id=worker_id, address=address, slots=slots,
+                                         **self.service.op_capacity())
+                interval = (reply or {}).get('heartbeat_interval', interval)
+            except IpcError as e:
+                logger.warning(f"Heartbeat to coordinator failed: {e}")
+            except Exception as e:
+                logger.error(f"Error building heartbeat: {e}", exc_info=True)
+            self._stop_event.wait(interval)
+
+    def join_coordinator(self, coordinator_address, worker_id=None, slots=None, advertise=None, token=None):
+        """Register with a coordinator and keep reporting capacity from a background thread"""
+        coordinator = IpcClient(coordinator_address, timeout=10, token=token)
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        slots = slots or os.cpu_count() or 1
+        thread = threading.Thread(target=self._heartbeat, args=(coordinator, worker_id, slots, advertise),
+                                  daemon=True, name='coordinator-heartbeat')
+        thread.start()
+        return thread
+
+    def serve_forever(self):
+        self._start_publisher()
+        self.ipc.serve_forever()
+
+    def start(self):
+        """Serve from background threads, returns once the socket is listening"""
+        self._start_publisher()
+        return self.ipc.start()
+
+    def wait(self):
+        self._stop_event.wait()
+
+    def shutdown(self):
+        self._stop_event.set()
+        self.ipc.shutdown()
+
+
+def serve(args):
+    token = os.environ.get('ORCHESTRATOR_TOKEN')
+    error = listen_error(args.listen or args.socket, token)
+    if error:
+        logger.error(error)
+        return 2
+
+    import orchestrator
+    from utils.logging_utils import setup_logging
+
+    setup_logging('orchestrator.log', level=logging.INFO, max_bytes=5242880, backup_count=3)
+    logger.info("Starting headless orchestrator daemon")
+    orchestrator.initialize_toolchains()
+    orchestrator.reattach_sessions()
+
+    daemon = OrchestratorDaemon(orchestrator, args.listen or args.socket, token=token)
+    daemon.service.ensure_main_loop()
+    if args.coordinator:
+        if not isinstance(parse_address(args.listen or args.socket), tuple):
+            logger.error("--coordinator requires --listen HOST:PORT so the coordinator can reach this worker")
+            return 2
+        # The address is only known once the server is bound, e.g. with port 0
+        daemon.start()
+        daemon.join_coordinator(args.coordinator, args.worker_id, args.slots, args.advertise, token=token)
+
+    def stop(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        threading.Thread(target=daemon.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        if args.coordinator:
+            daemon.wait()
+        else:
+            daemon.serve_forever()
+    finally:
+        orchestrator.shutdown_sessions()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless 100x orchestrator daemon')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket path of the control API')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='run the daemon')
+    serve_parser.add_argument('--listen', help='listen on HOST:PORT over TCP instead of the Unix socket')
+    serve_parser.add_argument('--coordinator', help='HOST:PORT of a coordinator to join as a worker')
+    serve_parser.add_argument('--worker-id', help='name reported to the coordinator (default hostname-pid)')
+    serve_parser.add_argument('--slots', type=int, help='agents this worker runs at once (default CPU count)')
+    serve_parser.add_argument('--advertise', help='HOST:PORT the coordinator should use to reach this worker')
+    create = commands.add_parser('create', help='create agents for a task')
+    create.add_argument('--repo', dest='repository_url')
+    create.add_argument('--task', required=True)
+    create.add_argument('--agents', dest='num_agents', type=int)
+    create.add_argument('--toolchain')
+    create.add_argument('--race-test', help='race the agents: the first whose commit passes this command wins')
+    create.add_argument('--force', action='store_true', help='run the task even if a stored result can be reused')
+    commands.add_parser('list', help='list agents')
+    delete = commands.add_parser('delete', help='delete an agent')
+    delete.add_argument('agent_id')
+    commands.add_parser('ping', help='check that the daemon is running')
+    importtime = commands.add_parser('importtime', help='report import time breakdown')
+    importtime.add_argument('--module', default='orchestrator')
+    importtime.add_argument('--top', type=int, default=15)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'importtime':
+        # Measured locally so it works without a running daemon
+        result = measure_import_time(args.module, args.top)
+        print(json.dumps(result, indent=2))
+        return 0 if result.get('success') else 1
+
+    client = IpcClient(args.socket, token=os.environ.get('ORCHESTRATOR_TOKEN'))
+    try:
+        if args.command == 'create':
+            race = {'test_command': args.race_test} if args.race_test else None
+            result = client.call('create_agents', repository_url=args.repository_url, tasks=[args.task],
+                                 num_agents=args.num_agents, toolchain=args.toolchain, race=race,
+                                 force=args.force)
+        elif args.command == 'list':
+            result = client.call('list_agents')
+        elif args.command == 'delete':
+            result = client.call('delete_agent', agent_id=args.agent_id)
+        else:
+            result = client.call('ping')
+    except IpcError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for aider used for load testing without LLM calls.
+
+Reads chat messages from stdin like interactive aider, answers each one with
+simulated output and a real git commit in the working directory. Behaviour is
+configured through environment variables so it can be launched unchanged by
+start_aider_session():
+
+    FAKE_AIDER_SEED               random seed (default 0)
+    FAKE_AIDER_LINES_PER_MESSAGE  lines of output per message (default 40)
+    FAKE_AIDER_RATE               lines per second, 0 for unthrottled (default 200)
+    FAKE_AIDER_BURST              lines written back-to-back per burst (default 5)
+    FAKE_AIDER_ERROR_RATE         probability of an error line per line (default 0.0)
+    FAKE_AIDER_STALL_AFTER        stall after this many messages, 0 to disable (default 0)
+    FAKE_AIDER_STALL_SECONDS      stall duration in seconds (default 600)
+    FAKE_AIDER_EXIT_AFTER         exit after this many messages, 0 to disable (default 0)
+    FAKE_AIDER_EXIT_CODE          exit code used for FAKE_AIDER_EXIT_AFTER and EOF (default 0)
+    FAKE_AIDER_COMMIT             set to 0 to skip git commits (default 1)
+
+Every message's first output line carries an `@ts=<epoch seconds>` marker so
+harnesses can measure end-to-end output latency.
+"""
+import os
+import sys
+import time
+import random
+import subprocess
+
+VERSION = "aider 0.65.0 (fake)"
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+class FakeAider:
+    def __init__(self):
+        self.rng = random.Random(env_int('FAKE_AIDER_SEED', 0))
+        self.lines_per_message = env_int('FAKE_AIDER_LINES_PER_MESSAGE', 40)
+        self.rate = env_float('FAKE_AIDER_RATE', 200)
+        self.burst = max(1, env_int('FAKE_AIDER_BURST', 5))
+        self.error_rate = env_float('FAKE_AIDER_ERROR_RATE', 0.0)
+        self.stall_after = env_int('FAKE_AIDER_STALL_AFTER', 0)
+        self.stall_seconds = env_float('FAKE_AIDER_STALL_SECONDS', 600)
+        self.exit_after = env_int('FAKE_AIDER_EXIT_AFTER', 0)
+        self.exit_code = env_int('FAKE_AIDER_EXIT_CODE', 0)
+        self.commit = os.environ.get('FAKE_AIDER_COMMIT', '1') != '0'
+        self.message_count = 0
+
+    def emit(self, line):
+        sys.stdout.write(line + "\n")
+
+    def banner(self):
+        self.emit(VERSION)
+        self.emit("Main model: fake/simulated-model with diff edit format")
+        self.emit(f"Git repo: {os.getcwd()}")
+        self.emit("Use /help <question> for help, run \"aider --help\" to see cmd line args")
+        sys.stdout.flush()
+
+    def simulated_line(self, index):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return f"Error: simulated failure while applying edit #{index}"
+        kind = self.rng.randrange(4)
+        if kind == 0:
+            return f"Tokens: {self.rng.randint(1, 20)}k sent, {self.rng.randint(100, 999)} received."
+        if kind == 1:
+            return f"  def function_{index}(value):  # edited by fake aider"
+        if kind == 2:
+            return f"Thinking about step {index} of the requested change..."
+        return f"Applied edit to src/module_{index % 7}.py"
+
+    def write_lines(self, message):
+        preview = message[:80].replace('\n', ' ')
+        lines = [f"@ts={time.time():.6f} Working on: {preview}"]
+        lines += [self.simulated_line(i) for i in range(1, self.lines_per_message)]
+        for start in range(0, len(lines), self.burst):
+            for line in lines[start:start + self.burst]:
+                self.emit(line)
+            sys.stdout.flush()
+            if self.rate > 0:
+                time.sleep(self.burst / self.rate)
+
+    def make_commit(self):
+        filename = f"fake_aider_change_{self.message_count}.py"
+        with open(filename, 'w') as f:
+            f.write(f"# change {self.message_count} written by fake aider\n")
+            f.write(f"VALUE = {self.rng.randint(0, 10 ** 6)}\n")
+        message = f"feat: Apply simulated change {self.message_count}"
+        try:
+            subprocess.check_call(['git', 'add', filename], stdout=subprocess.DEVNULL)
+            subprocess.check_call(
+                ['git', '-c', 'user.name=fake-aider', '-c', 'user.email=fake-aider@localhost',
+                 'commit', '-q', '-m', message],
+                stdout=subprocess.DEVNULL
+            )
+            sha = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+            self.emit(f"Commit {sha} {message}")
+        except (subprocess.CalledProcessError, OSError) as e:
+            self.emit(f"Unable to commit: {e}")
+
+    def read_message(self):
+        line = sys.stdin.readline()
+        if not line:
+            return None
+        if line.strip() != '{':
+            return line.strip()
+        body = []
+        for line in sys.stdin:
+            if line.strip() == '}':
+                break
+            body.append(line.rstrip('\n'))
+        return "\n".join(body)
+
+    def run(self):
+        self.banner()
+        while True:
+            message = self.read_message()
+            if message is None:
+                return self.exit_code
+            if not message or message in ('/exit', '/quit'):
+                if message:
+                    return 0
+                continue
+
+            self.message_count += 1
+            if self.stall_after and self.message_count > self.stall_after:
+                time.sleep(self.stall_seconds)
+
+            self.write_lines(message)
+            if self.commit:
+                self.make_commit()
+            sys.stdout.flush()
+
+            if self.exit_after and self.message_count >= self.exit_after:
+                return self.exit_code
+
+
+def main(argv):
+    if '--version' in argv:
+        print(VERSION)
+        return 0
+    return FakeAider().run()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
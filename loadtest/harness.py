@@ -0,0 +1,370 @@
+"""
+Fleet load test for the orchestrator using the fake aider simulator.
+
+Provisions N agents against a local bare repository through the real
+initialiseCodingAgent / main_loop code (or through app.py with --via-app),
+drives them with fake_aider.py instead of real LLM calls and records
+provisioning latency, end-to-end output latency, CPU, RSS and thread counts.
+
+    python loadtest/harness.py --agents 100 --duration 60
+    python loadtest/harness.py --agents 10 --via-app --baseline loadtest-results/previous.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import shutil
+import argparse
+import datetime
+import tempfile
+import threading
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from utils.ansi import segments_text
+
+FAKE_AIDER = Path(__file__).parent / 'fake_aider.py'
+RESULTS_DIR = ROOT / 'loadtest-results'
+TIMESTAMP_MARKER = re.compile(r'@ts=(\d+\.\d+)')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def create_bare_repository(base_dir):
+    """Create a small local bare repository to clone from"""
+    work = Path(base_dir) / 'seed'
+    bare = Path(base_dir) / 'origin.git'
+    work.mkdir(parents=True)
+    (work / 'README.md').write_text('# Load test repository\n')
+    (work / 'src').mkdir()
+    (work / 'src' / 'app.py').write_text('def main():\n    return 0\n')
+    git = ['git', '-c', 'user.name=loadtest', '-c', 'user.email=loadtest@localhost']
+    subprocess.check_call(['git', 'init', '-q'], cwd=work)
+    subprocess.check_call(['git', 'add', '.'], cwd=work)
+    subprocess.check_call(git + ['commit', '-q', '-m', 'Initial commit'], cwd=work)
+    subprocess.check_call(['git', 'clone', '-q', '--bare', str(work), str(bare)])
+    return str(bare)
+
+
+def summarize(values, scale=1000.0):
+    """Latency summary in milliseconds"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * scale
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * scale, 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p95_ms': round(pick(0.95), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1] * scale, 3)
+    }
+
+
+def read_rss_kb(pid='self'):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def read_cpu_seconds(pid='self'):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class ResourceSampler(threading.Thread):
+    """Samples orchestrator and aider process resource usage at a fixed interval"""
+
+    def __init__(self, sessions, interval=1.0):
+        super().__init__(daemon=True, name='loadtest-sampler')
+        self.sessions = sessions
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def _child_pids(self):
+        return [s.process.pid for s in list(self.sessions.values()) if s.process and s.process.poll() is None]
+
+    def run(self):
+        last_time, last_cpu = time.perf_counter(), None
+        while not self._stop_event.wait(self.interval):
+            pids = self._child_pids()
+            orchestrator_cpu = read_cpu_seconds()
+            children_cpu = sum(read_cpu_seconds(pid) for pid in pids)
+            now = time.perf_counter()
+            sample = {
+                'time': time.time(),
+                'threads': threading.active_count(),
+                'subprocesses': len(pids),
+                'orchestrator_rss_mb': round(read_rss_kb() / 1024, 2),
+                'children_rss_mb': round(sum(read_rss_kb(pid) for pid in pids) / 1024, 2),
+                'orchestrator_cpu_seconds': orchestrator_cpu
+            }
+            if last_cpu is not None:
+                sample['orchestrator_cpu_percent'] = round((orchestrator_cpu - last_cpu) / (now - last_time) * 100, 2)
+            sample['children_cpu_seconds'] = children_cpu
+            self.samples.append(sample)
+            last_time, last_cpu = now, orchestrator_cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=self.interval * 2)
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        cpu = [s['orchestrator_cpu_percent'] for s in self.samples if 'orchestrator_cpu_percent' in s]
+        return {
+            'samples': len(self.samples),
+            'max_threads': max(s['threads'] for s in self.samples),
+            'max_subprocesses': max(s['subprocesses'] for s in self.samples),
+            'max_orchestrator_rss_mb': max(s['orchestrator_rss_mb'] for s in self.samples),
+            'max_children_rss_mb': max(s['children_rss_mb'] for s in self.samples),
+            'mean_orchestrator_cpu_percent': round(statistics.mean(cpu), 2) if cpu else None,
+            'max_orchestrator_cpu_percent': max(cpu) if cpu else None
+        }
+
+
+class OutputLatencyProbe:
+    """Measures the delay between fake aider writing a marked line and the update reaching a consumer"""
+
+    def __init__(self):
+        self.latencies = []
+        self.first_output = {}
+        self.updates = 0
+        self._seen = {}
+
+    def observe(self, update):
+        received = time.time()
+        self.updates += 1
+        agent_id = update.get('agent_id')
+        if not agent_id:
+            return
+        if 'delta' in update or 'lines' in update:
+            # Appended output: raw from the orchestrator queue, converted lines from the web tier
+            text = update['delta'] if 'delta' in update else '\n'.join(segments_text(line) for line in update['lines'])
+            end = update['offset'] + len(update['delta']) if 'delta' in update else update['end']
+            if end <= self._seen.get(agent_id, 0):
+                return
+            for match in TIMESTAMP_MARKER.finditer(text):
+                self.latencies.append(received - float(match.group(1)))
+            self._seen[agent_id] = end
+            self.first_output.setdefault(agent_id, received)
+            return
+        output = update.get('output')
+        if not output:
+            return
+        # Status updates carry the whole output, only scan the part not seen yet
+        seen = self._seen.get(agent_id, 0)
+        for match in TIMESTAMP_MARKER.finditer(output, max(0, seen - 32)):
+            if match.end() > seen:
+                self.latencies.append(received - float(match.group(1)))
+        self._seen[agent_id] = len(output)
+        self.first_output.setdefault(agent_id, received)
+
+
+def configure_fake_aider(args):
+    FAKE_AIDER.chmod(0o755)
+    os.environ.update({
+        'FAKE_AIDER_SEED': str(args.seed),
+        'FAKE_AIDER_LINES_PER_MESSAGE': str(args.lines_per_message),
+        'FAKE_AIDER_RATE': str(args.rate),
+        'FAKE_AIDER_BURST': str(args.burst),
+        'FAKE_AIDER_ERROR_RATE': str(args.error_rate),
+        'FAKE_AIDER_STALL_AFTER': str(args.stall_after),
+        'FAKE_AIDER_EXIT_AFTER': str(args.exit_after),
+        'FAKE_AIDER_EXIT_CODE': str(args.exit_code)
+    })
+
+
+def provision_direct(orchestrator, repo_url, args):
+    latencies, agent_ids = [], []
+    for i in range(args.agents):
+        start = time.perf_counter()
+        created = orchestrator.initialiseCodingAgent(
+            repository_url=repo_url,
+            task_description=f"Load test task {i}: add a helper function",
+            num_agents=1,
+            toolchain='fake'
+        )
+        latencies.append(time.perf_counter() - start)
+        agent_ids.extend(created or [])
+    return latencies, agent_ids
+
+
+def provision_via_app(repo_url, args):
+    import app as web
+
+    client = web.app.test_client()
+    latencies, agent_ids = [], []
+    for i in range(args.agents):
+        start = time.perf_counter()
+        response = client.post('/create_agent', json={
+            'repo_url': repo_url,
+            'tasks': [f"Load test task {i}: add a helper function"],
+            'num_agents': 1,
+            'toolchain': 'fake'
+        })
+        latencies.append(time.perf_counter() - start)
+        agent_ids.extend((response.get_json() or {}).get('agent_ids', []))
+    return latencies, agent_ids
+
+
+def consume_output_queue(orchestrator, probe, stop_event):
+    """Stands in for app.broadcast_output when running without the web tier"""
+    while not stop_event.is_set():
+        try:
+            probe.observe(orchestrator.output_queue.get(timeout=0.1))
+        except queue.Empty:
+            continue
+
+
+def consume_socketio(web, probe, stop_event):
+    client = web.socketio.test_client(web.app, namespace='/agents')
+    while not stop_event.is_set():
+        for packet in client.get_received('/agents'):
+            if packet['name'] in ('output_update', 'output_delta'):
+                for update in packet['args']:
+                    probe.observe(update)
+        time.sleep(0.005)
+    client.disconnect(namespace='/agents')
+
+
+def run(args):
+    work_dir = Path(tempfile.mkdtemp(prefix='orchestrator_loadtest_'))
+    configure_fake_aider(args)
+
+    import orchestrator
+    from utils.logging_utils import setup_logging
+    setup_logging(str(work_dir / 'orchestrator.log'))
+    orchestrator.CONFIG_FILE = work_dir / 'config.json'
+    orchestrator.CHECK_INTERVAL = args.check_interval
+    orchestrator.toolchain_registry.register('fake', str(FAKE_AIDER))
+    orchestrator.toolchain_registry.probe_all()
+
+    repo_url = create_bare_repository(work_dir)
+    probe = OutputLatencyProbe()
+    stop_event = threading.Event()
+    sampler = ResourceSampler(orchestrator.aider_sessions, interval=args.sample_interval)
+    sampler.start()
+
+    if args.via_app:
+        import app as web
+        consumer = threading.Thread(target=consume_socketio, args=(web, probe, stop_event), daemon=True)
+    else:
+        consumer = threading.Thread(target=consume_output_queue, args=(orchestrator, probe, stop_event), daemon=True)
+    consumer.start()
+
+    started = time.perf_counter()
+    if args.via_app:
+        provision_latencies, agent_ids = provision_via_app(repo_url, args)
+    else:
+        provision_latencies, agent_ids = provision_direct(orchestrator, repo_url, args)
+        threading.Thread(target=orchestrator.main_loop, name='OrchestratorMainLoop', daemon=True).start()
+    provisioning_seconds = time.perf_counter() - started
+
+    for round_number in range(args.followups):
+        time.sleep(args.duration / (args.followups + 1))
+        for agent_id in agent_ids:
+            session = orchestrator.aider_sessions.get(agent_id)
+            if session:
+                session.send_message(f"Follow-up {round_number + 1}: also add tests")
+    time.sleep(args.duration / (args.followups + 1))
+
+    stop_event.set()
+    sampler.stop()
+    consumer.join(timeout=2)
+
+    workspaces = [a.get('workspace') for a in orchestrator.load_tasks()['agents'].values()]
+    for agent_id in list(orchestrator.aider_sessions):
+        orchestrator.aider_sessions.pop(agent_id).cleanup()
+    if not args.keep_workspaces:
+        for workspace in filter(None, workspaces):
+            shutil.rmtree(workspace, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'created_at': datetime.datetime.now().isoformat(),
+        'config': vars(args),
+        'agents_requested': args.agents,
+        'agents_created': len(agent_ids),
+        'agents_with_output': len(probe.first_output),
+        'provisioning_seconds': round(provisioning_seconds, 3),
+        'provisioning_latency': summarize(provision_latencies),
+        'output_latency': summarize(probe.latencies),
+        'updates_received': probe.updates,
+        'resources': sampler.summary(),
+        'samples': sampler.samples
+    }
+
+
+def compare(result, baseline_path):
+    """Print the change of headline metrics relative to a previous results file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    rows = [
+        ('provisioning p95 ms', ('provisioning_latency', 'p95_ms')),
+        ('output latency p95 ms', ('output_latency', 'p95_ms')),
+        ('max orchestrator RSS MB', ('resources', 'max_orchestrator_rss_mb')),
+        ('mean orchestrator CPU %', ('resources', 'mean_orchestrator_cpu_percent')),
+        ('max threads', ('resources', 'max_threads'))
+    ]
+    for label, (section, key) in rows:
+        old = baseline.get(section, {}).get(key)
+        new = result.get(section, {}).get(key)
+        if old and new is not None:
+            print(f"{label:>26}: {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orchestrator fleet load test with fake aider")
+    parser.add_argument('--agents', type=int, default=10, help='Number of agents to launch (10-1000)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run after provisioning')
+    parser.add_argument('--followups', type=int, default=1, help='Follow-up messages sent to every agent')
+    parser.add_argument('--via-app', action='store_true', help='Provision and observe through app.py')
+    parser.add_argument('--check-interval', type=float, default=5, help='main_loop interval in seconds')
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lines-per-message', type=int, default=40)
+    parser.add_argument('--rate', type=float, default=200, help='Fake aider lines per second')
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--stall-after', type=int, default=0)
+    parser.add_argument('--exit-after', type=int, default=0)
+    parser.add_argument('--exit-code', type=int, default=0)
+    parser.add_argument('--keep-workspaces', action='store_true')
+    parser.add_argument('--output', help='Results file (default: loadtest-results/<timestamp>.json)')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    args = parser.parse_args()
+
+    result = run(args)
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"loadtest-{args.agents}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+
+    print(json.dumps({k: v for k, v in result.items() if k not in ('samples', 'config')}, indent=2))
+    print(f"Results written to {output}")
+    if args.baseline:
+        compare(result, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
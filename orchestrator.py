@@ -1,4 +1,5 @@
 import os
+import copy
 import json
 import traceback
 import subprocess
@@ -7,35 +8,33 @@ import uuid
 from pathlib import Path
 import shutil
 import tempfile
+import time
 from time import sleep
-from litellm import completion
 import threading
 import datetime
 import queue
 import io
 import errno
+import signal
 import logging
-import logging.handlers
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import emit
-from utils.installation_utils import AiderInstallationManager
-from utils.env_utils import EnvManager
-
-app = Flask(__name__)
-
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.handlers.RotatingFileHandler(
-            'orchestrator.log',
-            maxBytes=5242880,  # 5MB
-            backupCount=3
-        ),
-        logging.StreamHandler()
-    ]
-)
+from concurrent.futures import ThreadPoolExecutor
+from utils.pty_utils import PtyProcess, PTY_SUPPORTED
+from utils.detached import DetachedProcess, DETACHED_SUPPORTED
+from utils.agent_registry import AgentRegistry, CanonicalPathCache
+from utils.toolchain import ToolchainRegistry
+from utils.workspace_gc import WorkspaceCollector
+from utils.golden import GoldenCheckouts, CLONE_MODES
+from utils.dep_cache import DependencyCache, detect_manifests, dependency_env
+from utils.racing import RaceJudge, RacePolicy, head_commit, deprioritize
+from utils.fingerprint import DuplicateDetector
+from utils.result_store import ResultStore
+from utils.task_dag import (new_dag, ready_nodes, block_dependents, critical_path, queue_wait,
+                            is_finished as dag_finished, summary as dag_summary, RUNNING, COMPLETED, FAILED, WAITING)
+from utils.ansi import ANSI_ESCAPE, last_output_line
+from utils.verification import VerificationCache, VerificationRunner, default_cache_file, verification_summary
+from utils.metrics import REGISTRY
+from utils.tracing import TRACER
+from utils.logging_utils import SAMPLED, setup_logging, set_log_context
 
 logger = logging.getLogger(__name__)
 
@@ -52,59 +51,194 @@ class Colors:
 
 DEFAULT_AGENTS_PER_TASK = 2
 MODEL_NAME = os.environ.get('LITELLM_MODEL', 'anthropic/claude-3-5-sonnet-20240620')
+# Arguments of every aider session; --mini selects the model, over any AIDER_MODEL setting
+AIDER_ARGS = '--mini --no-fancy-input --yes-always'
 CONFIG_FILE = Path("config.json")
 CHECK_INTERVAL = 30
+USE_PTY = os.environ.get('AIDER_USE_PTY', '').lower() in ('1', 'true', 'yes')
+DETACHED = os.environ.get('AIDER_DETACHED', '').lower() in ('1', 'true', 'yes')
+SESSION_DIR = Path(os.environ.get('AIDER_SESSION_DIR', Path(tempfile.gettempdir()) / '100x-orchestrator-sessions'))
+# Must be on the filesystem of the workspaces (mkdtemp) for discarding to be a rename
+WORKSPACE_TRASH_DIR = Path(os.environ.get('WORKSPACE_TRASH_DIR', Path(tempfile.gettempdir()) / '100x-orchestrator-trash'))
+WORKSPACE_QUOTA_BYTES = int(os.environ.get('WORKSPACE_QUOTA_BYTES', '0'))
+# Workspaces of agents in these states may be evicted to stay under the quota
+EVICTABLE_STATUSES = ('completed', 'error', 'cancelled')
+# 'clone' clones per agent, the others create checkouts from a golden checkout (utils/golden.py)
+WORKSPACE_CLONE_MODE = os.environ.get('WORKSPACE_CLONE_MODE', 'clone').lower()
+if WORKSPACE_CLONE_MODE not in CLONE_MODES:
+    logger.warning(f"Unknown WORKSPACE_CLONE_MODE '{WORKSPACE_CLONE_MODE}', using clone")
+    WORKSPACE_CLONE_MODE = 'clone'
+# Must be on the filesystem of the workspaces for reflinks and hard links
+GOLDEN_DIR = Path(os.environ.get('WORKSPACE_GOLDEN_DIR', Path(tempfile.gettempdir()) / '100x-orchestrator-golden'))
+# Link shared dependency environments into checkouts (utils/dep_cache.py)
+DEPENDENCY_CACHE = os.environ.get('DEPENDENCY_CACHE', '').lower() in ('1', 'true', 'yes')
+# Test or lint command run on each new agent commit (utils/verification.py), unset to disable
+VERIFY_COMMAND = os.environ.get('VERIFY_COMMAND')
+VERIFY_TIMEOUT = int(os.environ.get('VERIFY_TIMEOUT', '600'))
+# Opt-in: reuse the stored result when a task is resubmitted for the same commit (utils/result_store.py)
+RESULT_STORE = os.environ.get('RESULT_STORE', '0').lower() in ('1', 'true', 'yes')
+# Agents whose diffs are this similar are flagged as duplicates (utils/fingerprint.py)
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', '0.8'))
+# 'flag' only marks duplicates, 'pause' also stops all but one agent of each cluster
+DUPLICATE_ACTION = os.environ.get('DUPLICATE_ACTION', 'flag').lower()
+# Seconds between fingerprinting passes over the agents' HEADs
+DUPLICATE_INTERVAL = int(os.environ.get('DUPLICATE_INTERVAL', '120'))
 
 aider_sessions = {}
 output_queue = queue.Queue()
+PATH_CACHE = CanonicalPathCache()
+# Paths of every agent in the tasks file, kept in sync by save_tasks
+AGENT_INDEX = AgentRegistry()
+toolchain_registry = ToolchainRegistry()
+WORKSPACE_GC = WorkspaceCollector(WORKSPACE_TRASH_DIR, quota_bytes=WORKSPACE_QUOTA_BYTES)
+GOLDEN_CHECKOUTS = GoldenCheckouts(GOLDEN_DIR, discard=WORKSPACE_GC.discard)
+DEPENDENCY_ENVIRONMENTS = DependencyCache()
+VERIFIER = VerificationRunner(
+    max_workers=int(os.environ.get('VERIFY_WORKERS', '2')),
+    timeout=VERIFY_TIMEOUT,
+    cpu_seconds=int(os.environ.get('VERIFY_CPU_SECONDS', '0')) or None,
+    memory_mb=int(os.environ.get('VERIFY_MEMORY_MB', '0')) or None,
+    cache=VerificationCache(default_cache_file(CONFIG_FILE))
+)
+RACE_JUDGE = RaceJudge(verifier=VERIFIER)
+DUPLICATES = DuplicateDetector(threshold=DUPLICATE_THRESHOLD)
+TASK_RESULTS = ResultStore() if RESULT_STORE else None
+# Held to read, change and write back the tasks file where several threads do: the main loop,
+# agent creation and task graph scheduling
+TASKS_LOCK = threading.RLock()
+# Ready tasks of graphs are started here, so a clone does not hold up the main loop
+DAG_STARTER = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dag-start')
+# Starts in flight by (graph id, task id)
+dag_starts = {}
 tools, available_functions = [], {}
 
+SAVE_TASKS_SECONDS = REGISTRY.histogram('orchestrator_save_tasks_seconds', 'Time spent writing the tasks file')
+LOAD_TASKS_SECONDS = REGISTRY.histogram('orchestrator_load_tasks_seconds', 'Time spent reading the tasks file')
+TASKS_FILE_WRITTEN_BYTES = REGISTRY.counter('orchestrator_tasks_file_written_bytes', 'Bytes written to the tasks file')
+TASKS_FILE_READ_BYTES = REGISTRY.counter('orchestrator_tasks_file_read_bytes', 'Bytes read from the tasks file')
+CLONE_SECONDS = REGISTRY.histogram('orchestrator_clone_seconds', 'Time spent cloning agent repositories')
+DEPENDENCY_CACHE_LOOKUPS = REGISTRY.counter(
+    'orchestrator_dependency_cache_lookups', 'Dependency environment lookups by kind and result', ['kind', 'result']
+)
+DEPENDENCY_BUILD_SECONDS = REGISTRY.histogram(
+    'orchestrator_dependency_build_seconds', 'Time to build or find the dependency environments of a checkout'
+)
+RACE_EVALUATIONS = REGISTRY.counter('orchestrator_race_evaluations', 'Racing agent commits evaluated by result',
+                                    ['result'])
+RACES_SETTLED = REGISTRY.counter('orchestrator_races_settled', 'Races won, by what happened to the other agents',
+                                 ['on_win'])
+VERIFICATIONS = REGISTRY.counter('orchestrator_verifications', 'Verified agent commits by outcome', ['status'])
+VERIFY_SECONDS = REGISTRY.histogram('orchestrator_verify_seconds', 'Time to run the verification command on a commit')
+REGISTRY.counter('orchestrator_verification_cache_lookups', 'Verification result cache lookups by result', ['result'],
+                 function=lambda: {('hit',): VERIFIER.cache.hits, ('miss',): VERIFIER.cache.misses})
+TASK_QUEUE_WAIT = REGISTRY.histogram('orchestrator_task_queue_wait_seconds',
+                                     'Time from a dependent task becoming ready to its agents starting')
+DAG_CRITICAL_PATH = REGISTRY.histogram('orchestrator_dag_critical_path_seconds',
+                                       'Time from submitting a task graph to its critical path completing')
+DAG_TASKS_FINISHED = REGISTRY.counter('orchestrator_dag_tasks_finished', 'Tasks of task graphs by final state',
+                                      ['state'])
+TASK_RESULTS_RECORDED = REGISTRY.counter('orchestrator_task_results_recorded', 'Task results stored for reuse',
+                                         ['outcome'])
+REGISTRY.counter('orchestrator_task_result_lookups', 'Stored task result lookups by result', ['result'],
+                 function=lambda: {('hit',): TASK_RESULTS.hits, ('miss',): TASK_RESULTS.misses} if TASK_RESULTS else {})
+DUPLICATE_PAUSES = REGISTRY.counter('orchestrator_duplicate_pauses', 'Agents paused as duplicates of another agent')
+REGISTRY.gauge('orchestrator_duplicate_agents', 'Agents whose diff is a near-duplicate of another agent\'s',
+               function=lambda: DUPLICATES.flagged)
+CHECKOUT_METHODS = REGISTRY.counter(
+    'orchestrator_checkout_methods', 'Agent checkouts by how they were created', ['method']
+)
+PROVISION_SECONDS = REGISTRY.histogram('orchestrator_provision_seconds', 'Time to provision an agent end to end')
+SUBPROCESS_LAUNCHES = REGISTRY.counter('orchestrator_subprocess_launches', 'Subprocesses started by kind', ['kind'])
+STATUS_TRANSITIONS = REGISTRY.counter(
+    'orchestrator_agent_status_transitions', 'Agent status changes', ['from_status', 'to_status']
+)
+REGISTRY.gauge('orchestrator_output_queue_depth', 'Updates waiting to be broadcast',
+               function=lambda: output_queue.qsize())
+REGISTRY.gauge('orchestrator_live_threads', 'Live threads in the orchestrator process',
+               function=threading.active_count)
+REGISTRY.gauge('orchestrator_live_aider_processes', 'Running aider processes',
+               function=lambda: sum(1 for s in list(aider_sessions.values()) if s.is_alive()))
+REGISTRY.counter('orchestrator_path_cache_lookups', 'Canonical path cache lookups by result', ['result'],
+                 function=lambda: {('hit',): PATH_CACHE.hits, ('miss',): PATH_CACHE.misses})
+REGISTRY.counter('orchestrator_workspace_reclaimed_bytes', 'Disk space freed by deleting discarded workspaces',
+                 function=lambda: WORKSPACE_GC.reclaimed_bytes)
+REGISTRY.counter('orchestrator_workspace_evictions', 'Workspaces discarded to stay under the disk quota',
+                 function=lambda: WORKSPACE_GC.evictions)
+REGISTRY.gauge('orchestrator_workspace_bytes', 'Disk space used by agent workspaces, as last measured',
+               function=lambda: WORKSPACE_GC.tracked_bytes())
+REGISTRY.gauge('orchestrator_workspace_trash_pending', 'Discarded workspaces waiting to be deleted',
+               function=lambda: WORKSPACE_GC.pending)
+# Fleet-wide, so the number of series does not grow with agents; the agent detail API has the per-agent numbers
+AIDER_OUTPUT_LINES = REGISTRY.counter('aider_output_lines', 'Output lines read from aider by all agents')
+REGISTRY.gauge('aider_output_bytes_buffered', 'Output bytes buffered in memory by all running agents',
+               function=lambda: sum(s.buffered_bytes for s in list(aider_sessions.values())))
+
 class AiderNotFoundError(Exception):
     """Raised when aider is not installed or not found in PATH"""
     pass
 
-def check_aider_installation():
-    """Check if aider is installed and available"""
-    aider_manager = AiderInstallationManager()
-    is_installed, _ = aider_manager.check_aider_installation()
-    return is_installed
+def initialize_toolchains():
+    """Probe all registered aider toolchains once, before any agent is created"""
+    toolchain_registry.probe_all()
+    return toolchain_registry.to_dict()
 
-def start_aider_session(workspace_path, task, cmd_override=None):
-    """Start aider with appropriate error handling"""
-    aider_manager = AiderInstallationManager()
-    aider_path = aider_manager.get_aider_command()
-    
-    if not check_aider_installation():
-        logger.error("Aider is not installed or not found in PATH")
+def check_aider_installation(toolchain=None):
+    """Check if aider is installed and available, using the cached toolchain probe"""
+    return toolchain_registry.is_available(toolchain)
+
+def start_aider_session(workspace_path, cmd_override=None, use_pty=False, toolchain=None, session_dir=None):
+    """
+    Start an interactive aider process that reads chat messages from stdin.
+    With session_dir the process is detached and survives an orchestrator restart.
+    """
+    if not check_aider_installation(toolchain):
+        logger.error(f"Aider toolchain '{toolchain or 'default'}' is not installed or not found in PATH")
         raise AiderNotFoundError(
             "Aider is not installed. Please install it using:\n"
             "pip install aider-chat"
         )
+    aider_path = toolchain_registry.get(toolchain).executable
     
     try:
         if cmd_override:
             cmd = cmd_override
         else:
-            cmd = f'"{aider_path}" --mini --message "{task}"'
-        
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            cmd = f'"{aider_path}" {AIDER_ARGS}'
         
         env = os.environ.copy()
         env['PYTHONUNBUFFERED'] = '1'
         env['PYTHONIOENCODING'] = 'utf-8'
+        cwd = str(Path(workspace_path).resolve())
+        if DEPENDENCY_CACHE:
+            dependency_env(cwd, env)
+        
+        SUBPROCESS_LAUNCHES.labels('aider').inc()
+        if session_dir:
+            return DetachedProcess.launch(cmd, str(session_dir), cwd=cwd, env=env)
+        if use_pty:
+            return PtyProcess(cmd, cwd=cwd, env=env)
+        
+        popen_kwargs = {}
+        if sys.platform == "win32":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            popen_kwargs['startupinfo'] = startupinfo
+        else:
+            # Its own process group, so pause() stops aider and not just the shell running it
+            popen_kwargs['start_new_session'] = True
         
         process = subprocess.Popen(
             cmd,
             shell=True,
-            cwd=str(Path(workspace_path).resolve()),
+            cwd=cwd,
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            startupinfo=startupinfo,
             text=True,
             bufsize=1,
             universal_newlines=True,
-            env=env
+            env=env,
+            **popen_kwargs
         )
         
         return process
@@ -116,33 +250,25 @@ def normalize_path(path_str):
     if not path_str:
         return None
     try:
-        path = Path(path_str).resolve()
-        normalized = str(path).replace('\\', '/')
-        logger.debug(f"Path normalization: {path_str} -> {normalized}")
-        return normalized
+        return PATH_CACHE.canonical(path_str)
     except Exception as e:
         logger.error(f"Error normalizing path {path_str}: {e}", exc_info=True)
         return None
 
+def agent_index():
+    """The in-memory agent path index, loaded from the tasks file on first use"""
+    if not AGENT_INDEX.loaded:
+        AGENT_INDEX.sync(load_tasks()['agents'])
+    return AGENT_INDEX
+
 def validate_agent_paths(agent_id, workspace_path):
     try:
-        tasks_data = load_tasks()
-        agent_data = tasks_data['agents'].get(agent_id)
-        
-        if not agent_data:
+        index = agent_index()
+        if agent_id not in index:
             logger.error(f"No agent found with ID {agent_id}")
             return False
-            
-        workspace_path = normalize_path(workspace_path)
-        agent_workspace = normalize_path(agent_data.get('workspace'))
-        agent_repo_path = normalize_path(agent_data.get('repo_path'))
         
-        logger.info(f"Validating paths for agent {agent_id}")
-        logger.info(f"  Workspace path: {workspace_path}")
-        logger.info(f"  Agent workspace: {agent_workspace}")
-        logger.info(f"  Agent repo path: {agent_repo_path}")
-        
-        return workspace_path in [agent_workspace, agent_repo_path]
+        return index.matches(agent_id, normalize_path(workspace_path))
         
     except Exception as e:
         logger.error(f"Error validating agent paths: {e}", exc_info=True)
@@ -155,6 +281,8 @@ class AgentStatus:
     ERROR = 'error'
     STALLED = 'stalled'
     COMPLETED = 'completed'
+    CANCELLED = 'cancelled'
+    PAUSED = 'paused'
 
     @classmethod
     def get_display_name(cls, status):
@@ -164,7 +292,9 @@ class AgentStatus:
             cls.IN_PROGRESS: 'In Progress',
             cls.ERROR: 'Error',
             cls.STALLED: 'Stalled',
-            cls.COMPLETED: 'Completed'
+            cls.COMPLETED: 'Completed',
+            cls.CANCELLED: 'Cancelled',
+            cls.PAUSED: 'Paused'
         }.get(status, status)
 
     @classmethod
@@ -172,114 +302,268 @@ class AgentStatus:
         """Check if status represents an error condition"""
         return status in [cls.ERROR, cls.STALLED]
 
+    @classmethod
+    def is_finished(cls, status):
+        """Check if status is final: the orchestrator no longer updates it"""
+        return status in [cls.COMPLETED, cls.CANCELLED]
+
 class AiderSession:
-    def __init__(self, workspace_path, task):
+    def __init__(self, workspace_path, task, use_pty=None, toolchain=None, agent_id=None, detached=None):
         self.error_count = 0
         self.consecutive_empty_reads = 0
         self.max_empty_reads = 10
         self.last_output_time = datetime.datetime.now()
         self.workspace_path = normalize_path(workspace_path)
         self.task = task
+        self.toolchain = toolchain
         self.output_buffer = io.StringIO()
         self.process = None
         self.output_queue = queue.Queue()
         self._stop_event = threading.Event()
         self.session_id = str(uuid.uuid4())[:8]
-        self.agent_id = None
+        self.agent_id = agent_id
+        self.messages = []
+        self._stdin_lock = threading.Lock()
+        # [lines, bytes] per reader, each list is only written by its own reader thread
+        self._read_stats = {'stdout': [0, 0], 'stderr': [0, 0], 'pty': [0, 0], 'detached': [0, 0]}
+        self.buffered_bytes = 0
+        self._first_output_seen = False
+        self._first_commit_seen = False
+        self._threads = []
+        self.paused = False
+        self.use_pty = USE_PTY if use_pty is None else use_pty
+        if self.use_pty and not PTY_SUPPORTED:
+            logger.warning(f"[Session {self.session_id}] PTY backend not supported on {sys.platform}, using pipes")
+            self.use_pty = False
+        self.detached = DETACHED if detached is None else detached
+        if self.detached and not DETACHED_SUPPORTED:
+            logger.warning(f"[Session {self.session_id}] Detached processes not supported on {sys.platform}")
+            self.detached = False
+        if self.detached:
+            # Output goes through a log file, a terminal would not outlive the orchestrator
+            self.use_pty = False
         
         logger.info(f"[Session {self.session_id}] Initialized with workspace: {self.workspace_path}")
         
-        for agent_id in aider_sessions:
-            if validate_agent_paths(agent_id, self.workspace_path):
-                self.agent_id = agent_id
+        if not self.agent_id:
+            self.agent_id = agent_index().find_by_path(self.workspace_path)
+            if self.agent_id:
                 logger.info(f"[Session {self.session_id}] Associated with agent {self.agent_id}")
-                break
 
     def start(self):
+        if not self.agent_id:
+            self.agent_id = agent_index().find_by_path(self.workspace_path)
+
+        with TRACER.span(self.agent_id, 'aider.start', session_id=self.session_id, pty=self.use_pty) as span:
+            started = self._start()
+            if not started:
+                span.set_error('aider session failed to start')
+            return started
+
+    def _start(self):
      try:
         logger.info(f"[Session {self.session_id}] Starting aider session in workspace: {self.workspace_path}")
         
-        tasks_data = load_tasks()
-        for agent_id, agent_data in tasks_data['agents'].items():
-            if normalize_path(agent_data.get('workspace')) == self.workspace_path:
-                self.agent_id = agent_id
-                break
-        
         try:
-            self.process = start_aider_session(self.workspace_path, self.task)
+            with TRACER.span(self.agent_id, 'aider.launch', toolchain=self.toolchain or 'default') as span:
+                self.process = start_aider_session(
+                    self.workspace_path,
+                    use_pty=self.use_pty,
+                    toolchain=self.toolchain,
+                    session_dir=SESSION_DIR / f"{self.agent_id or 'session'}-{self.session_id}" if self.detached else None
+                )
+                span.set_attribute('pid', self.process.pid)
             logger.info(f"[Session {self.session_id}] Process started with PID: {self.process.pid}")
+            with TRACER.span(self.agent_id, 'aider.send_task'):
+                self.send_message(self.task)
         except AiderNotFoundError as e:
             logger.error(f"[Session {self.session_id}] Aider not found: {str(e)}")
             self._update_agent_status('error')
             if self.agent_id:
-                tasks_data = load_tasks()
-                if self.agent_id in tasks_data['agents']:
-                    agent_data = tasks_data['agents'][self.agent_id]
-                    agent_data['status'] = 'error'
-                    agent_data['status_reason'] = str(e)
-                    agent_data['error_details'] = {
-                        'error_count': 1,
-                        'last_output_time': datetime.datetime.now().isoformat(),
-                        'consecutive_empty_reads': 0
-                    }
-                    save_tasks(tasks_data)
+                with TASKS_LOCK:
+                    tasks_data = load_tasks()
+                    if self.agent_id in tasks_data['agents']:
+                        agent_data = tasks_data['agents'][self.agent_id]
+                        agent_data['status'] = 'error'
+                        agent_data['status_reason'] = str(e)
+                        agent_data['error_details'] = {
+                            'error_count': 1,
+                            'last_output_time': datetime.datetime.now().isoformat(),
+                            'consecutive_empty_reads': 0
+                        }
+                        save_tasks(tasks_data)
             return False
         
+        return self._start_threads()
+        
+     except Exception as e:
+        logger.error(f"[Session {self.session_id}] Failed to start aider session: {e}", exc_info=True)
+        if self.agent_id:
+            self._update_agent_status('error')
+        return False
+
+    def _start_threads(self):
         # Start the threads for reading output
-        stdout_thread = threading.Thread(
-            target=self._read_output,
-            args=(self.process.stdout, "stdout"),
-            daemon=True,
-            name=f"stdout-{self.session_id}"
-        )
-        stderr_thread = threading.Thread(
-            target=self._read_output,
-            args=(self.process.stderr, "stderr"),
-            daemon=True,
-            name=f"stderr-{self.session_id}"
-        )
+        if self.use_pty or self.detached:
+            source = 'detached' if self.detached else 'pty'
+            reader_threads = [threading.Thread(
+                target=self._read_pty_output,
+                args=(source,),
+                daemon=True,
+                name=f"{source}-{self.session_id}"
+            )]
+        else:
+            reader_threads = [
+                threading.Thread(
+                    target=self._read_output,
+                    args=(self.process.stdout, "stdout"),
+                    daemon=True,
+                    name=f"stdout-{self.session_id}"
+                ),
+                threading.Thread(
+                    target=self._read_output,
+                    args=(self.process.stderr, "stderr"),
+                    daemon=True,
+                    name=f"stderr-{self.session_id}"
+                )
+            ]
         process_thread = threading.Thread(
             target=self._process_output,
             daemon=True,
             name=f"process-{self.session_id}"
         )
         
-        stdout_thread.start()
-        stderr_thread.start()
-        process_thread.start()
+        self._threads = reader_threads + [process_thread]
+        for thread in self._threads:
+            thread.start()
         
-        for thread in [stdout_thread, stderr_thread, process_thread]:
+        for thread in reader_threads + [process_thread]:
             if not thread.is_alive():
                 logger.error(f"[Session {self.session_id}] Thread {thread.name} failed to start")
                 return False
             logger.info(f"[Session {self.session_id}] Thread {thread.name} is running")
         
         return True
+
+    @classmethod
+    def reattach(cls, agent_id, agent_data):
+        """
+        Resume a detached session whose aider process outlived the previous orchestrator:
+        restore the output buffer up to the persisted offset and keep reading from there.
+        Returns None when the process is gone.
+        """
+        info = agent_data.get('process') or {}
+        process = DetachedProcess.attach(info)
+        if process is None:
+            return None
+        session = cls(agent_data.get('repo_path'), agent_data.get('task'), toolchain=agent_data.get('toolchain'),
+                      agent_id=agent_id, detached=True)
+        session.process = process
+        session.paused = agent_data.get('status') == AgentStatus.PAUSED
+        restored = process.restore_output()
+        session.output_buffer.write(restored)
+        session.buffered_bytes = len(restored)
+        session._first_output_seen = bool(restored)
+        session._first_commit_seen = '\nCommit ' in '\n' + restored
+        TRACER.event(agent_id, 'reattach', session_id=session.session_id, pid=process.pid, offset=process.offset)
+        logger.info(f"[Session {session.session_id}] Reattached to agent {agent_id} process {process.pid} "
+                    f"at output offset {process.offset}")
+        if not session._start_threads():
+            return None
+        return session
+
+    def process_info(self):
+        """Persisted with the agent so a restarted orchestrator can reattach, None unless detached"""
+        if not self.detached or not isinstance(self.process, DetachedProcess):
+            return None
+        return self.process.to_dict()
+
+    @property
+    def lines_read(self):
+        return sum(stats[0] for stats in self._read_stats.values())
+
+    @property
+    def bytes_read(self):
+        return sum(stats[1] for stats in self._read_stats.values())
+
+    def is_alive(self):
+        """Check whether the aider process is still running and accepting input"""
+        return self.process is not None and self.process.poll() is None
+
+    def pause(self):
+        """Stop the aider process and its process group until resume()"""
+        return self._signal_process(signal.SIGSTOP)
+
+    def resume(self):
+        resumed = self._signal_process(signal.SIGCONT)
+        # The time spent stopped does not count towards stall detection
+        self.last_output_time = datetime.datetime.now()
+        return resumed
+
+    def _signal_process(self, signum):
+        if not self.is_alive() or os.name != 'posix':
+            return False
+        try:
+            pid = self.process.pid
+            if os.getpgid(pid) == pid:
+                os.killpg(pid, signum)
+            else:
+                os.kill(pid, signum)
+            self.paused = signum == signal.SIGSTOP
+            return True
+        except (ProcessLookupError, PermissionError) as e:
+            logger.warning(f"[Session {self.session_id}] Could not signal process: {e}")
+            return False
+
+    def send_message(self, message):
+        """Send a chat message to the running aider process, keeping its context warm"""
+        if not message or not message.strip():
+            logger.warning(f"[Session {self.session_id}] Ignoring empty message")
+            return False
+        if not self.is_alive():
+            logger.error(f"[Session {self.session_id}] Cannot send message, aider process is not running")
+            return False
         
-     except Exception as e:
-        logger.error(f"[Session {self.session_id}] Failed to start aider session: {e}", exc_info=True)
-        if self.agent_id:
-            self._update_agent_status('error')
-        return False
+        # aider reads one line per message, multi-line input must be wrapped in braces
+        if '\n' in message.strip():
+            payload = "{\n" + message.strip() + "\n}\n"
+        else:
+            payload = message.strip() + "\n"
+        
+        try:
+            with self._stdin_lock:
+                self.process.stdin.write(payload)
+                self.process.stdin.flush()
+            self.messages.append({
+                'content': message,
+                'timestamp': datetime.datetime.now().isoformat()
+            })
+            self.last_output_time = datetime.datetime.now()
+            self.consecutive_empty_reads = 0
+            logger.info(f"[Session {self.session_id}] Sent message #{len(self.messages)} to aider")
+            return True
+        except (BrokenPipeError, OSError, ValueError) as e:
+            logger.error(f"[Session {self.session_id}] Error sending message: {e}", exc_info=True)
+            return False
 
     def _read_output(self, pipe, pipe_name):
+        set_log_context(agent_id=self.agent_id, session_id=self.session_id)
         try:
             logger.info(f"[Session {self.session_id}] Started reading from {pipe_name}")
+            stats = self._read_stats[pipe_name]
             for line in iter(pipe.readline, ''):
                 if self._stop_event.is_set():
                     break
+                
+                stats[0] += 1
+                stats[1] += len(line)
+                AIDER_OUTPUT_LINES.inc()
                     
                 if line.strip():  # Reset counters on valid output
                     self.consecutive_empty_reads = 0
                     self.last_output_time = datetime.datetime.now()
-                    
-                    # Detect error messages
-                    if any(error_sign in line.lower() for error_sign in [
-                        'error:', 'exception:', 'failed:', 'traceback:',
-                        'could not', 'unable to', 'permission denied'
-                    ]):
-                        self.error_count += 1
-                        logger.warning(f"[Session {self.session_id}] Error detected: {line.strip()}")
+                    self._detect_errors(line)
+                    self._detect_commit(line)
                 else:
                     self.consecutive_empty_reads += 1
                 
@@ -299,41 +583,106 @@ class AiderSession:
             logger.info(f"[Session {self.session_id}] Closed {pipe_name} pipe")
             
             
+    def _read_pty_output(self, source='pty'):
+        """Stream chunks from the pty (or detached log) as soon as they arrive instead of waiting for full lines"""
+        set_log_context(agent_id=self.agent_id, session_id=self.session_id)
+        partial_line = ''
+        stats = self._read_stats[source]
+        try:
+            logger.info(f"[Session {self.session_id}] Started reading from {source}")
+            while not self._stop_event.is_set():
+                chunk = self.process.read_chunk(timeout=0.1)
+                if chunk is None:
+                    break
+                if not chunk:
+                    continue
+                
+                self.consecutive_empty_reads = 0
+                self.last_output_time = datetime.datetime.now()
+                stats[0] += chunk.count('\n')
+                stats[1] += len(chunk)
+                AIDER_OUTPUT_LINES.inc(chunk.count('\n'))
+                
+                lines = (partial_line + chunk).split('\n')
+                partial_line = lines.pop()
+                for line in lines:
+                    self._detect_errors(line)
+                    self._detect_commit(line)
+                
+                self.output_queue.put(chunk)
+        except Exception as e:
+            logger.error(f"[Session {self.session_id}] Error reading from {source}: {e}", exc_info=True)
+            self._update_agent_status(AgentStatus.ERROR)
+        finally:
+            self.process.close()
+            logger.info(f"[Session {self.session_id}] Closed {source}")
+
+    def _detect_errors(self, line):
+        if any(error_sign in line.lower() for error_sign in [
+            'error:', 'exception:', 'failed:', 'traceback:',
+            'could not', 'unable to', 'permission denied'
+        ]):
+            self.error_count += 1
+            logger.warning(f"[Session {self.session_id}] Error detected: {line.strip()}")
+
+    def _detect_commit(self, line):
+        """Record the first 'Commit <hash> <message>' line aider prints, given whole lines"""
+        if self._first_commit_seen:
+            return
+        line = ANSI_ESCAPE.sub('', line).strip()
+        if line.startswith('Commit ') and len(line.split()) > 1:
+            self._first_commit_seen = True
+            TRACER.event(self.agent_id, 'first_commit', session_id=self.session_id, commit=line.split()[1])
+
+    def resize_terminal(self, rows, cols):
+        """Resize the pseudo-terminal of a PTY-backed session"""
+        if not self.use_pty or not self.is_alive():
+            return False
+        try:
+            self.process.resize(rows, cols)
+            return True
+        except OSError as e:
+            logger.error(f"[Session {self.session_id}] Error resizing terminal: {e}", exc_info=True)
+            return False
+
     def _update_agent_status(self, status):
         try:
             if not self.agent_id:
                 return
                 
-            tasks_data = load_tasks()
-            if self.agent_id in tasks_data['agents']:
+            with TASKS_LOCK:
+                tasks_data = load_tasks()
+                if self.agent_id not in tasks_data['agents']:
+                    return
                 agent_data = tasks_data['agents'][self.agent_id]
                 old_status = agent_data.get('status')
+                if old_status == status:
+                    return
+                STATUS_TRANSITIONS.labels(old_status or 'none', status).inc()
+                agent_data['status'] = status
+                agent_data['status_changed_at'] = datetime.datetime.now().isoformat()
+                agent_data['status_reason'] = self._get_status_reason(status)
                 
-                if old_status != status:
-                    agent_data['status'] = status
-                    agent_data['status_changed_at'] = datetime.datetime.now().isoformat()
-                    agent_data['status_reason'] = self._get_status_reason(status)
-                    
-                    if status in [AgentStatus.ERROR, AgentStatus.STALLED]:
-                        agent_data['error_details'] = {
-                            'error_count': self.error_count,
-                            'consecutive_empty_reads': self.consecutive_empty_reads,
-                            'last_output_time': self.last_output_time.isoformat()
-                        }
-                    
-                    save_tasks(tasks_data)
-                    
-                    # Emit status update
-                    update = {
-                        'agent_id': self.agent_id,
-                        'status': status,
-                        'status_reason': agent_data['status_reason'],
-                        'error_details': agent_data.get('error_details'),
-                        'timestamp': datetime.datetime.now().isoformat()
+                if status in [AgentStatus.ERROR, AgentStatus.STALLED]:
+                    agent_data['error_details'] = {
+                        'error_count': self.error_count,
+                        'consecutive_empty_reads': self.consecutive_empty_reads,
+                        'last_output_time': self.last_output_time.isoformat()
                     }
-                    output_queue.put(update)
-                    
-                    logger.info(f"[Session {self.session_id}] Updated agent {self.agent_id} status to {status}")
+                
+                save_tasks(tasks_data)
+            
+            # Emit status update
+            update = {
+                'agent_id': self.agent_id,
+                'status': status,
+                'status_reason': agent_data['status_reason'],
+                'error_details': agent_data.get('error_details'),
+                'timestamp': datetime.datetime.now().isoformat()
+            }
+            output_queue.put(update)
+            
+            logger.info(f"[Session {self.session_id}] Updated agent {self.agent_id} status to {status}")
         except Exception as e:
             logger.error(f"[Session {self.session_id}] Error updating agent status: {e}", exc_info=True)
             
@@ -348,7 +697,7 @@ class AiderSession:
     def check_health(self):
         """Periodically check agent health and update status"""
         try:
-            if not self.process:
+            if not self.process or self.paused:
                 return
                 
             # Check if process is still running
@@ -375,6 +724,7 @@ class AiderSession:
             self._update_agent_status(AgentStatus.ERROR)
 
     def _process_output(self):
+        set_log_context(agent_id=self.agent_id, session_id=self.session_id)
         logger.info(f"[Session {self.session_id}] Started output processing thread")
         buffer_update_count = 0
         
@@ -385,17 +735,23 @@ class AiderSession:
                 except queue.Empty:
                     continue
                 
+                if not self._first_output_seen:
+                    self._first_output_seen = True
+                    TRACER.event(self.agent_id, 'first_byte', session_id=self.session_id)
+
                 with threading.Lock():
                     self.output_buffer.seek(0, 2)
                     self.output_buffer.write(line)
+                    offset = self.buffered_bytes
+                    self.buffered_bytes += len(line)
                     buffer_update_count += 1
                     
-                    current_output = self.get_output()
-                    
                     if self.agent_id:
+                        # Only the appended text, consumers keep the rest or fetch it by offset
                         update = {
                             'agent_id': self.agent_id,
-                            'output': current_output,
+                            'offset': offset,
+                            'delta': line,
                             'timestamp': datetime.datetime.now().isoformat()
                         }
                         output_queue.put(update)
@@ -408,40 +764,31 @@ class AiderSession:
 
     def _update_output_in_tasks(self):
         try:
-            tasks_data = load_tasks()
             updated = False
             current_output = self.get_output()
-            current_workspace = normalize_path(self.workspace_path)
+            current_workspace = self.workspace_path
             
-            if self.agent_id:
-                agent_data = tasks_data['agents'].get(self.agent_id)
-                if agent_data:
-                    if not agent_data.get('repo_path'):
-                        agent_data['repo_path'] = current_workspace
-                    
-                    if current_output != agent_data.get('aider_output', ''):
-                        agent_data['aider_output'] = current_output
-                        agent_data['last_updated'] = datetime.datetime.now().isoformat()
-                        updated = True
-            else:
-                for agent_id, agent_data in tasks_data['agents'].items():
-                    agent_workspace = normalize_path(agent_data.get('workspace'))
-                    agent_repo_path = normalize_path(agent_data.get('repo_path'))
-                    
-                    if current_workspace == agent_workspace and not agent_repo_path:
-                        agent_data['repo_path'] = current_workspace
-                    
-                    if current_workspace in [agent_workspace, agent_repo_path]:
+            if not self.agent_id:
+                self.agent_id = agent_index().find_by_path(current_workspace)
+            
+            with TASKS_LOCK:
+                tasks_data = load_tasks()
+                if self.agent_id:
+                    agent_data = tasks_data['agents'].get(self.agent_id)
+                    if agent_data:
+                        if not agent_data.get('repo_path'):
+                            agent_data['repo_path'] = current_workspace
+                        
                         if current_output != agent_data.get('aider_output', ''):
                             agent_data['aider_output'] = current_output
                             agent_data['last_updated'] = datetime.datetime.now().isoformat()
+                            agent_data['process'] = self.process_info()
                             updated = True
-                            self.agent_id = agent_id
-                        break
-            
+                
+                if updated:
+                    save_tasks(tasks_data)
             if updated:
-                save_tasks(tasks_data)
-                logger.info(f"[Session {self.session_id}] Updated output for agent {self.agent_id}")
+                logger.info(f"[Session {self.session_id}] Updated output for agent {self.agent_id}", extra=SAMPLED)
             
         except Exception as e:
             logger.error(f"[Session {self.session_id}] Error updating output in tasks: {e}", exc_info=True)
@@ -462,23 +809,51 @@ class AiderSession:
             logger.info(f"[Session {self.session_id}] Starting cleanup")
             self._stop_event.set()
             if self.process:
+                if self.process.stdin:
+                    try:
+                        with self._stdin_lock:
+                            self.process.stdin.close()
+                    except (BrokenPipeError, OSError):
+                        pass
                 logger.info(f"[Session {self.session_id}] Terminating process {self.process.pid}")
+                if self.paused:
+                    # A stopped process only acts on SIGTERM once continued
+                    self.resume()
                 self.process.terminate()
                 try:
                     self.process.wait(timeout=5)
                 except subprocess.TimeoutExpired:
                     logger.warning(f"[Session {self.session_id}] Process did not terminate, forcing kill")
                     self.process.kill()
+                if isinstance(self.process, DetachedProcess):
+                    self.process.close()
+                    shutil.rmtree(self.process.session_dir, ignore_errors=True)
             logger.info(f"[Session {self.session_id}] Cleanup completed")
         except Exception as e:
             logger.error(f"[Session {self.session_id}] Error during cleanup: {e}", exc_info=True)
 
+    def detach(self, timeout=2):
+        """Stop following a detached process without terminating it, for an orchestrator shutdown"""
+        self._stop_event.set()
+        # The reader closes its end of the log on exit
+        for thread in self._threads:
+            thread.join(timeout)
+        if isinstance(self.process, DetachedProcess):
+            self.process.stdin.close()
+            logger.info(f"[Session {self.session_id}] Detached from process {self.process.pid} "
+                        f"at output offset {self.process.offset}")
+
 def load_tasks():
+    start = time.perf_counter()
     try:
         with open(CONFIG_FILE, 'r') as f:
-            data = json.load(f)
+            content = f.read()
+            TASKS_FILE_READ_BYTES.inc(len(content))
+            data = json.loads(content)
             if 'repository_url' not in data:
                 data['repository_url'] = ""
+            data.setdefault('races', {})
+            data.setdefault('dags', {})
                 
             for agent_id, agent_data in data.get('agents', {}).items():
                 if 'workspace' in agent_data:
@@ -492,22 +867,31 @@ def load_tasks():
         return {
             "tasks": [],
             "agents": {},
-            "repository_url": ""
+            "repository_url": "",
+            "races": {},
+            "dags": {}
         }
     except Exception as e:
         logger.error(f"Error loading tasks: {e}", exc_info=True)
         return {
             "tasks": [],
             "agents": {},
-            "repository_url": ""
+            "repository_url": "",
+            "races": {},
+            "dags": {}
         }
+    finally:
+        LOAD_TASKS_SECONDS.observe(time.perf_counter() - start)
 
 def save_tasks(tasks_data):
+    start = time.perf_counter()
     try:
         data_to_save = {
             "tasks": tasks_data.get("tasks", []),
             "agents": {},
-            "repository_url": tasks_data.get("repository_url", "")
+            "repository_url": tasks_data.get("repository_url", ""),
+            "races": tasks_data.get("races", {}),
+            "dags": tasks_data.get("dags", {})
         }
         
         for agent_id, agent_data in tasks_data.get("agents", {}).items():
@@ -516,17 +900,48 @@ def save_tasks(tasks_data):
                 'repo_path': normalize_path(agent_data.get('repo_path')),
                 'task': agent_data.get('task'),
                 'status': agent_data.get('status'),
+                'status_reason': agent_data.get('status_reason'),
                 'created_at': agent_data.get('created_at'),
                 'last_updated': agent_data.get('last_updated'),
                 'aider_output': agent_data.get('aider_output', ''),
-                'last_critique': agent_data.get('last_critique')
+                'last_critique': agent_data.get('last_critique'),
+                'toolchain': agent_data.get('toolchain'),
+                'error_details': agent_data.get('error_details'),
+                'process': agent_data.get('process'),
+                'workspace_evicted_at': agent_data.get('workspace_evicted_at'),
+                'branch': agent_data.get('branch'),
+                'base_commit': agent_data.get('base_commit'),
+                'race_id': agent_data.get('race_id'),
+                'evaluation': agent_data.get('evaluation'),
+                'verification': agent_data.get('verification'),
+                'duplicates': agent_data.get('duplicates'),
+                'duplicate_of': agent_data.get('duplicate_of'),
+                'repository_url': agent_data.get('repository_url'),
+                'model': agent_data.get('model'),
+                'result_commit': agent_data.get('result_commit'),
+                'reused_from': agent_data.get('reused_from'),
+                'dag_id': agent_data.get('dag_id'),
+                'dag_task': agent_data.get('dag_task')
             }
             
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(data_to_save, f, indent=4)
+        content = json.dumps(data_to_save, indent=4)
+        # Written aside and renamed into place, so a concurrent load_tasks never reads half a file
+        tmp = Path(f"{CONFIG_FILE}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, CONFIG_FILE)
+        TASKS_FILE_WRITTEN_BYTES.inc(len(content))
+        AGENT_INDEX.sync(data_to_save["agents"])
         logger.info("Successfully saved tasks data")
     except Exception as e:
         logger.error(f"Error saving tasks: {e}", exc_info=True)
+    finally:
+        SAVE_TASKS_SECONDS.observe(time.perf_counter() - start)
+
+def discard_workspace(workspace, eviction=False):
+    """Unmount overlay checkouts in a workspace and hand it to the background collector"""
+    GOLDEN_CHECKOUTS.release(workspace)
+    return WORKSPACE_GC.discard(workspace, eviction=eviction)
 
 def delete_agent(agent_id):
     try:
@@ -544,13 +959,17 @@ def delete_agent(agent_id):
             workspace = agent_data.get('workspace')
             if workspace and os.path.exists(workspace):
                 try:
-                    shutil.rmtree(workspace)
-                    logger.info(f"Removed workspace for agent {agent_id}: {workspace}")
+                    discard_workspace(workspace)
+                    PATH_CACHE.invalidate(workspace)
+                    logger.info(f"Discarded workspace for agent {agent_id}: {workspace}")
                 except Exception as e:
                     logger.error(f"Could not remove workspace: {e}", exc_info=True)
             
-            del tasks_data['agents'][agent_id]
-            save_tasks(tasks_data)
+            with TASKS_LOCK:
+                tasks_data = load_tasks()
+                tasks_data['agents'].pop(agent_id, None)
+                save_tasks(tasks_data)
+            TRACER.finish(agent_id)
             
             update = {
                 'agent_id': agent_id,
@@ -567,11 +986,22 @@ def delete_agent(agent_id):
         logger.error(f"Error deleting agent: {e}", exc_info=True)
         return False
 
-def initialiseCodingAgent(repository_url: str = None, task_description: str = None, num_agents: int = None):
+def initialiseCodingAgent(repository_url: str = None, task_description: str = None, num_agents: int = None,
+                          toolchain: str = None, race: dict = None, force: bool = False, start_from: list = None):
+    """
+    Create num_agents agents for a task. With a race policy (see utils/racing.py) and more than
+    one agent, the agents race: the first to commit a change meeting the policy wins.
+    With RESULT_STORE and a single agent, if a result of the same task on the same commit is
+    stored, the agent is created completed with that result, unless force is set. start_from lists the commits
+    ({'repo_path', 'branch', 'commit'}) of finished tasks the agents' branches begin from.
+    """
     try:
         # First check if aider is installed
-        if not check_aider_installation():
-            logger.error("Aider is not installed. Cannot create agents.")
+        toolchain_check_start = time.time_ns()
+        toolchain_available = check_aider_installation(toolchain)
+        toolchain_check_end = time.time_ns()
+        if not toolchain_available:
+            logger.error(f"Aider toolchain '{toolchain or 'default'}' is not installed. Cannot create agents.")
             return None
             
         num_agents = num_agents or DEFAULT_AGENTS_PER_TASK
@@ -581,11 +1011,13 @@ def initialiseCodingAgent(repository_url: str = None, task_description: str = No
             return None
         
         created_agent_ids = []
+        race_policy = RacePolicy.from_dict(race) if num_agents > 1 else None
+        race_id = str(uuid.uuid4()) if race_policy else None
         
         tasks_data = load_tasks()
         if repository_url:
             tasks_data['repository_url'] = repository_url
-            save_tasks(tasks_data)
+            save_created(tasks_data)
             logger.info(f"Updated repository URL: {repository_url}")
         else:
             repository_url = tasks_data.get('repository_url')
@@ -593,116 +1025,343 @@ def initialiseCodingAgent(repository_url: str = None, task_description: str = No
         
         for i in range(num_agents):
             logger.info(f"Creating agent {i+1} of {num_agents}")
+            provision_start = time.perf_counter()
             
             agent_id = str(uuid.uuid4())
             logger.info(f"Generated agent ID: {agent_id}")
+            TRACER.record_span(agent_id, 'toolchain.check', toolchain_check_start, toolchain_check_end,
+                               toolchain=toolchain or 'default')
             
-            agent_workspace = Path(tempfile.mkdtemp(prefix=f"agent_{agent_id}_")).resolve()
-            logger.info(f"Created workspace at: {agent_workspace}")
+            with TRACER.span(agent_id, 'workspace.create'):
+                agent_workspace = Path(tempfile.mkdtemp(prefix=f"agent_{agent_id}_")).resolve()
+                logger.info(f"Created workspace at: {agent_workspace}")
+                
+                workspace_dirs = {
+                    "src": agent_workspace / "src",
+                    "tests": agent_workspace / "tests", 
+                    "docs": agent_workspace / "docs", 
+                    "config": agent_workspace / "config", 
+                    "repo": agent_workspace / "repo"
+                }
+                
+                for dir_path in workspace_dirs.values():
+                    dir_path.mkdir(parents=True, exist_ok=True)
+                logger.info("Created workspace directory structure")
+                    
+                task_file = agent_workspace / "current_task.txt"
+                task_file.write_text(task_description)
+                logger.info("Created task file")
             
-            workspace_dirs = {
-                "src": agent_workspace / "src",
-                "tests": agent_workspace / "tests", 
-                "docs": agent_workspace / "docs", 
-                "config": agent_workspace / "config", 
-                "repo": agent_workspace / "repo"
-            }
+            # Every command gets its directory as cwd: agents are created on several threads at once
+            if not repository_url:
+                logger.error("No repository URL provided")
+                discard_workspace(agent_workspace)
+                continue
             
-            for dir_path in workspace_dirs.values():
-                dir_path.mkdir(parents=True, exist_ok=True)
-            logger.info("Created workspace directory structure")
-                
-            task_file = agent_workspace / "current_task.txt"
-            task_file.write_text(task_description)
-            logger.info("Created task file")
+            logger.info(f"Cloning repository: {repository_url}")
+            clone_start = time.perf_counter()
+            with TRACER.span(agent_id, 'git.clone', repository_url=repository_url) as span:
+                method = None
+                if WORKSPACE_CLONE_MODE != 'clone':
+                    method = materializeRepository(repository_url, agent_workspace)
+                cloned = bool(method) or cloneRepository(repository_url, cwd=workspace_dirs["repo"])
+                method = method or 'clone'
+                span.set_attribute('method', method)
+                if not cloned:
+                    span.set_error('clone failed')
+                else:
+                    CHECKOUT_METHODS.labels(method).inc()
+            CLONE_SECONDS.observe(time.perf_counter() - clone_start)
+            if not cloned:
+                logger.error("Failed to clone repository")
+                discard_workspace(agent_workspace)
+                continue
+            
+            repo_dirs = [d for d in os.listdir(workspace_dirs["repo"])
+                         if (workspace_dirs["repo"] / d).is_dir() and not d.startswith('.')]
+            if not repo_dirs:
+                logger.error("No repository directory found after cloning")
+                discard_workspace(agent_workspace)
+                continue
             
-            original_dir = Path.cwd()
-            repo_dir = None
-            full_repo_path = None
+            repo_dir = repo_dirs[0]
+            full_repo_path = workspace_dirs["repo"] / repo_dir
+            full_repo_path = full_repo_path.resolve()
+            logger.info(f"Repository cloned to: {full_repo_path}")
             
+            branch_name = f"agent-{agent_id[:8]}"
             try:
-                os.chdir(workspace_dirs["repo"])
-                if not repository_url:
-                    logger.error("No repository URL provided")
-                    shutil.rmtree(agent_workspace)
-                    continue
-                
-                logger.info(f"Cloning repository: {repository_url}")
-                if not cloneRepository(repository_url):
-                    logger.error("Failed to clone repository")
-                    shutil.rmtree(agent_workspace)
-                    continue
-                
-                repo_dirs = [d for d in os.listdir('.') if os.path.isdir(d) and not d.startswith('.')]
-                if not repo_dirs:
-                    logger.error("No repository directory found after cloning")
-                    shutil.rmtree(agent_workspace)
-                    continue
-                
-                repo_dir = repo_dirs[0]
-                full_repo_path = workspace_dirs["repo"] / repo_dir
-                full_repo_path = full_repo_path.resolve()
-                logger.info(f"Repository cloned to: {full_repo_path}")
-                
-                os.chdir(full_repo_path)
-                
-                branch_name = f"agent-{agent_id[:8]}"
-                try:
-                    subprocess.check_call(f"git checkout -b {branch_name}", shell=True)
-                    logger.info(f"Created and checked out branch: {branch_name}")
-                except subprocess.CalledProcessError:
-                    logger.error("Failed to create new branch", exc_info=True)
-                    shutil.rmtree(agent_workspace)
-                    continue
+                SUBPROCESS_LAUNCHES.labels('git_checkout').inc()
+                with TRACER.span(agent_id, 'git.branch', branch=branch_name):
+                    subprocess.check_call(f"git checkout -b {branch_name}", shell=True, cwd=full_repo_path)
+                logger.info(f"Created and checked out branch: {branch_name}")
+            except subprocess.CalledProcessError:
+                logger.error("Failed to create new branch", exc_info=True)
+                discard_workspace(agent_workspace)
+                continue
 
+            if start_from:
+                with TRACER.span(agent_id, 'git.start_from',
+                                 commits=','.join(prerequisite['commit'][:8] for prerequisite in start_from)) as span:
+                    if not startFromCommits(start_from, cwd=full_repo_path):
+                        span.set_error('could not merge prerequisite commits')
+                        discard_workspace(agent_workspace)
+                        continue
+
+            if DEPENDENCY_CACHE:
+                with TRACER.span(agent_id, 'deps.link'):
+                    link_dependencies(full_repo_path)
+
+            base_commit = head_commit(full_repo_path)
+            reused = None
+            # Several agents are asked for to compare their attempts, a stored result would end that
+            if TASK_RESULTS is not None and not force and num_agents == 1:
+                with TRACER.span(agent_id, 'result.reuse'):
+                    reused = reuse_result(repository_url, base_commit, task_description, toolchain,
+                                          full_repo_path)
+
+            aider_session = None
+            if reused is None:
                 logger.info("Initializing aider session")
-                aider_session = AiderSession(str(full_repo_path), task_description)
+                aider_session = AiderSession(str(full_repo_path), task_description, toolchain=toolchain,
+                                             agent_id=agent_id)
                 if not aider_session.start():
                     logger.error("Failed to start aider session")
-                    shutil.rmtree(agent_workspace)
+                    discard_workspace(agent_workspace)
                     continue
 
                 aider_sessions[agent_id] = aider_session
                 logger.info("Aider session started successfully")
-
-            finally:
-                os.chdir(original_dir)
             
             tasks_data['agents'][agent_id] = {
+                'branch': branch_name,
+                'base_commit': base_commit,
+                'race_id': race_id,
                 'workspace': normalize_path(agent_workspace),
                 'repo_path': normalize_path(full_repo_path) if full_repo_path else None,
+                'repository_url': repository_url,
+                'model': result_model(toolchain),
                 'task': task_description,
                 'status': 'pending',
                 'created_at': datetime.datetime.now().isoformat(),
                 'last_updated': datetime.datetime.now().isoformat(),
-                'aider_output': ''
+                'aider_output': '',
+                'toolchain': toolchain,
+                'process': aider_session.process_info() if aider_session else None
             }
-            save_tasks(tasks_data)
+            if reused is not None:
+                tasks_data['agents'][agent_id].update({
+                    'status': AgentStatus.COMPLETED,
+                    'status_reason': f"Reused the {reused['outcome']} result of agent {reused.get('agent_id')} "
+                                     f"at {reused['commit'][:8]}",
+                    'reused_from': reused.get('agent_id'),
+                    'result_commit': reused['commit'],
+                    'aider_output': f"Reused stored result: {reused.get('diffstat') or 'no changes'}\n"
+                })
+                TRACER.finish(agent_id)
+            save_created(tasks_data, agent_ids=[agent_id])
+            PROVISION_SECONDS.observe(time.perf_counter() - provision_start)
             
             logger.info(f"Successfully initialized agent {agent_id}")
             created_agent_ids.append(agent_id)
         
+        if race_id and created_agent_ids:
+            tasks_data.setdefault('races', {})[race_id] = {
+                'task': task_description,
+                'policy': race_policy.to_dict(),
+                'agent_ids': created_agent_ids,
+                'created_at': datetime.datetime.now().isoformat(),
+                'winner': None,
+                'branch': None,
+                'commit': None
+            }
+            save_created(tasks_data, race_id=race_id)
+            logger.info(f"Agents {', '.join(created_agent_ids)} are racing on task (race {race_id})")
+        
         return created_agent_ids if created_agent_ids else None
         
     except Exception as e:
         logger.error(f"Error initializing coding agents: {e}", exc_info=True)
         return None
 
-def cloneRepository(repository_url: str) -> bool:
+def save_created(tasks_data, agent_ids=(), race_id=None):
+    """
+    Write agents (and a race) created from tasks_data into the tasks file as it is now, with the
+    repository URL, instead of saving tasks_data itself: creating agents takes a while, and the
+    main loop and other creations save the file in the meantime.
+    """
+    with TASKS_LOCK:
+        saved = load_tasks()
+        saved['repository_url'] = tasks_data.get('repository_url', saved['repository_url'])
+        for agent_id in agent_ids:
+            saved['agents'][agent_id] = tasks_data['agents'][agent_id]
+        if race_id:
+            saved['races'][race_id] = tasks_data['races'][race_id]
+        save_tasks(saved)
+
+def merge_saved(tasks_data, snapshot=None):
+    """
+    Add the tasks, agents, races and graphs saved to the tasks file since tasks_data was read,
+    and to its snapshot (see save_changes) as they were when added
+    """
+    saved = load_tasks()
+    for key in ('agents', 'races', 'dags'):
+        for entry_id, entry in saved[key].items():
+            if entry_id not in tasks_data.setdefault(key, {}):
+                tasks_data[key][entry_id] = entry
+                if snapshot is not None:
+                    snapshot.setdefault(key, {})[entry_id] = copy.deepcopy(entry)
+    tasks_data.setdefault('tasks', []).extend(task for task in saved['tasks'] if task not in tasks_data['tasks'])
+
+def save_changes(tasks_data, snapshot):
+    """
+    Save what changed in tasks_data since snapshot, a deep copy taken when it was loaded, into
+    the tasks file as it is now: the changed fields of each agent, changed races and graphs and
+    new tasks. Whatever other threads saved meanwhile is kept, and agents deleted meanwhile stay
+    deleted.
+    """
+    with TASKS_LOCK:
+        saved = load_tasks()
+        for agent_id, agent_data in tasks_data['agents'].items():
+            target = saved['agents'].get(agent_id)
+            if target is None:
+                continue
+            before = snapshot['agents'].get(agent_id, {})
+            target.update({key: value for key, value in agent_data.items()
+                           if key not in before or before[key] != value})
+        for key in ('races', 'dags'):
+            for entry_id, entry in tasks_data[key].items():
+                if entry != snapshot[key].get(entry_id):
+                    saved[key][entry_id] = entry
+        saved['tasks'].extend(task for task in tasks_data['tasks'] if task not in saved['tasks'])
+        if tasks_data.get('repository_url') != snapshot.get('repository_url'):
+            saved['repository_url'] = tasks_data['repository_url']
+        save_tasks(saved)
+
+def startFromCommits(start_from, cwd=None) -> bool:
+    """Merge the commits of finished prerequisite tasks into the branch checked out in cwd"""
+    for prerequisite in start_from:
+        try:
+            SUBPROCESS_LAUNCHES.labels('git_fetch').inc()
+            subprocess.run(['git', 'fetch', '--quiet', prerequisite['repo_path'], prerequisite['branch']],
+                           cwd=cwd, check=True, capture_output=True, timeout=300)
+            subprocess.run(['git', '-c', 'user.name=100x-orchestrator', '-c', 'user.email=orchestrator@localhost',
+                            'merge', '--quiet', '--no-edit', prerequisite['commit']],
+                           cwd=cwd, check=True, capture_output=True, timeout=300)
+        except (subprocess.SubprocessError, OSError) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            logger.error(f"Could not start from {prerequisite['branch']} at {prerequisite['commit'][:8]}: {e} "
+                         f"{stderr.decode(errors='replace')}")
+            subprocess.run(['git', 'merge', '--abort'], cwd=cwd, capture_output=True)
+            return False
+    return True
+
+def result_model(toolchain=None):
+    """
+    What besides the task decides an agent's result: the arguments aider is launched with,
+    which select the model, and the toolchain
+    """
+    return f"{AIDER_ARGS}@{toolchain or 'default'}"
+
+def reuse_result(repository_url, base_commit, task_description, toolchain, repo_path):
+    """Check out the stored result of the task on base_commit, if there is one. Returns it, or None."""
+    if not base_commit:
+        return None
+    try:
+        result = TASK_RESULTS.get(repository_url, base_commit, task_description, result_model(toolchain))
+        if result is None:
+            return None
+        if TASK_RESULTS.apply(result, repo_path) != result['commit']:
+            logger.warning(f"Could not reuse the stored result at {result['commit'][:8]}, running the task")
+            return None
+        logger.info(f"Reusing the stored result of agent {result.get('agent_id')} at {result['commit'][:8]}")
+        return result
+    except Exception as e:
+        logger.error(f"Error reusing a stored task result: {e}", exc_info=True)
+        return None
+
+def record_results(tasks_data):
+    """Store the results of agents that won their race or passed verification, for reuse"""
+    if TASK_RESULTS is None:
+        return
+    for agent_id, agent_data in tasks_data['agents'].items():
+        if (agent_data.get('reused_from') or not agent_data.get('repository_url') or not agent_data.get('base_commit')
+                or agent_data.get('workspace_evicted_at') or not agent_data.get('repo_path')):
+            continue
+        evaluation = agent_data.get('evaluation') or {}
+        verification = agent_data.get('verification') or {}
+        if agent_data.get('status') == AgentStatus.COMPLETED and evaluation.get('passed'):
+            outcome, commit = 'completed', evaluation['commit']
+        elif verification.get('passed'):
+            outcome, commit = 'verified', verification['commit']
+        else:
+            continue
+        if commit in (agent_data.get('result_commit'), agent_data['base_commit']):
+            continue
+        result = TASK_RESULTS.record(
+            agent_data['repository_url'], agent_data['base_commit'], agent_data.get('task'),
+            agent_data.get('model') or result_model(agent_data.get('toolchain')), agent_data['repo_path'], commit,
+            agent_id=agent_id, branch=agent_data.get('branch'), outcome=outcome,
+            verification=verification_summary(verification) if verification.get('passed') else None
+        )
+        if result is not None:
+            agent_data['result_commit'] = commit
+            TASK_RESULTS_RECORDED.labels(outcome).inc()
+            logger.info(f"Stored the {outcome} result of agent {agent_id} at {commit[:8]} for reuse")
+
+def cloneRepository(repository_url: str, cwd=None) -> bool:
     try:
         if not repository_url:
             logger.error("No repository URL provided")
             return False
         logger.info(f"Cloning repository: {repository_url}")
-        subprocess.check_call(f"git clone {repository_url}", shell=True)
+        SUBPROCESS_LAUNCHES.labels('git_clone').inc()
+        subprocess.check_call(f"git clone {repository_url}", shell=True, cwd=cwd)
         return True
     except subprocess.CalledProcessError as e:
         logger.error(f"Git clone failed with exit code {e.returncode}", exc_info=True)
         return False
 
+def materializeRepository(repository_url: str, agent_workspace: Path):
+    """
+    Create the agent's checkout under repo/ from the golden checkout of the repository.
+    Returns the method used, or None to fall back to a clone.
+    """
+    try:
+        golden = GOLDEN_CHECKOUTS.prepare(repository_url)
+        if golden is None:
+            return None
+        method = GOLDEN_CHECKOUTS.materialize(golden, agent_workspace / "repo" / golden.name, agent_workspace,
+                                              mode=WORKSPACE_CLONE_MODE)
+        if method is None:
+            logger.warning(f"Could not create a checkout from {golden}, cloning instead")
+            return None
+        logger.info(f"Created checkout from golden checkout {golden} with {method}")
+        return method
+    except Exception as e:
+        logger.error(f"Error creating checkout from golden checkout: {e}", exc_info=True)
+        return None
+
+def link_dependencies(repo_path):
+    """Link the shared dependency environments for a checkout's manifests, building missing ones"""
+    start = time.perf_counter()
+    linked = []
+    for kind, manifests in detect_manifests(repo_path).items():
+        try:
+            env, hit = DEPENDENCY_ENVIRONMENTS.ensure(kind, manifests)
+            DEPENDENCY_CACHE_LOOKUPS.labels(kind, 'error' if env is None else 'hit' if hit else 'miss').inc()
+            if env is not None and DEPENDENCY_ENVIRONMENTS.link(kind, env, repo_path):
+                logger.info(f"Linked {kind} environment {env} into {repo_path}")
+                linked.append(kind)
+        except Exception as e:
+            DEPENDENCY_CACHE_LOOKUPS.labels(kind, 'error').inc()
+            logger.error(f"Error linking {kind} dependencies into {repo_path}: {e}", exc_info=True)
+    DEPENDENCY_BUILD_SECONDS.observe(time.perf_counter() - start)
+    return linked
+
 def critique_agent_progress(agent_id):
     try:
-        logger.info(f"Critiquing progress for agent {agent_id}")
+        logger.info(f"Critiquing progress for agent {agent_id}", extra=SAMPLED)
         tasks_data = load_tasks()
         agent_data = tasks_data['agents'].get(agent_id)
         
@@ -729,7 +1388,7 @@ def critique_agent_progress(agent_id):
             return None
         
         src_files = list(workspace.glob('**/*.py'))
-        logger.info(f"Found {len(src_files)} Python files in workspace")
+        logger.info(f"Found {len(src_files)} Python files in workspace", extra=SAMPLED)
         
         critique = {
             'files_created': len(src_files),
@@ -737,32 +1396,40 @@ def critique_agent_progress(agent_id):
             'potential_improvements': []
         }
         
-        # Update status based on progress and health
-        aider_session = aider_sessions.get(agent_id)
-        if aider_session:
-            if aider_session.error_count > 5:
-                agent_data['status'] = AgentStatus.ERROR
-                agent_data['status_reason'] = f'Error threshold exceeded ({aider_session.error_count} errors)'
-            elif aider_session.consecutive_empty_reads >= aider_session.max_empty_reads:
-                agent_data['status'] = AgentStatus.STALLED
-                agent_data['status_reason'] = 'No output received for extended period'
-            elif len(src_files) > 0:
-                agent_data['status'] = AgentStatus.IN_PROGRESS
-            else:
-                agent_data['status'] = AgentStatus.PENDING
+        # Update status based on progress and health, on the agent as saved now
+        with TASKS_LOCK:
+            tasks_data = load_tasks()
+            agent_data = tasks_data['agents'].get(agent_id)
+            if not agent_data:
+                logger.error(f"No agent found with ID {agent_id}")
+                return None
+            aider_session = aider_sessions.get(agent_id)
+            if AgentStatus.is_finished(agent_data.get('status')) or agent_data.get('status') == AgentStatus.PAUSED:
+                pass
+            elif aider_session:
+                if aider_session.error_count > 5:
+                    agent_data['status'] = AgentStatus.ERROR
+                    agent_data['status_reason'] = f'Error threshold exceeded ({aider_session.error_count} errors)'
+                elif aider_session.consecutive_empty_reads >= aider_session.max_empty_reads:
+                    agent_data['status'] = AgentStatus.STALLED
+                    agent_data['status_reason'] = 'No output received for extended period'
+                elif len(src_files) > 0:
+                    agent_data['status'] = AgentStatus.IN_PROGRESS
+                else:
+                    agent_data['status'] = AgentStatus.PENDING
                 
-            output = aider_session.get_output()
-            agent_data['aider_output'] = output
-            if output:
-                agent_data['last_updated'] = datetime.datetime.now().isoformat()
-        else:
-            agent_data['status'] = AgentStatus.ERROR
-            agent_data['status_reason'] = 'Agent session not found'
+                output = aider_session.get_output()
+                agent_data['aider_output'] = output
+                if output:
+                    agent_data['last_updated'] = datetime.datetime.now().isoformat()
+            else:
+                agent_data['status'] = AgentStatus.ERROR
+                agent_data['status_reason'] = 'Agent session not found'
         
-        agent_data['last_critique'] = critique
+            agent_data['last_critique'] = critique
         
-        save_tasks(tasks_data)
-        logger.info(f"Completed critique for agent {agent_id}")
+            save_tasks(tasks_data)
+        logger.info(f"Completed critique for agent {agent_id}", extra=SAMPLED)
         return critique
     
     except Exception as e:
@@ -774,17 +1441,469 @@ def critique_agent_progress(agent_id):
         return None
 
 
+def reattach_sessions():
+    """Rebuild aider_sessions from detached aider processes that survived a restart"""
+    tasks_data = load_tasks()
+    reattached = []
+    for agent_id, agent_data in tasks_data['agents'].items():
+        info = agent_data.get('process')
+        if agent_id in aider_sessions or not info:
+            continue
+        try:
+            aider_session = AiderSession.reattach(agent_id, agent_data)
+        except Exception as e:
+            logger.error(f"Error reattaching agent {agent_id}: {e}", exc_info=True)
+            continue
+        if aider_session:
+            aider_sessions[agent_id] = aider_session
+            reattached.append(agent_id)
+        else:
+            logger.info(f"Process {info.get('pid')} of agent {agent_id} is no longer running")
+    if reattached:
+        logger.info(f"Reattached {len(reattached)} agent(s) after restart")
+    return reattached
+
+def shutdown_sessions():
+    """Stop all sessions on exit, leaving detached aider processes running for the next start"""
+    detached = {}
+    for agent_id in list(aider_sessions):
+        aider_session = aider_sessions.pop(agent_id)
+        if aider_session.detached:
+            aider_session.detach()
+            detached[agent_id] = aider_session
+        else:
+            aider_session.cleanup()
+    if detached:
+        # Persist the final offsets so the next start resumes exactly where this one stopped
+        with TASKS_LOCK:
+            tasks_data = load_tasks()
+            for agent_id, aider_session in detached.items():
+                agent_data = tasks_data['agents'].get(agent_id)
+                if agent_data:
+                    agent_data['aider_output'] = aider_session.get_output()
+                    agent_data['process'] = aider_session.process_info()
+            save_tasks(tasks_data)
+
+def verify_agents(tasks_data):
+    """Verify new commits of agents outside races with VERIFY_COMMAND and record the results"""
+    if not VERIFY_COMMAND:
+        return
+    agents = tasks_data['agents']
+    for agent_id, result in VERIFIER.results():
+        agent_data = agents.get(agent_id)
+        if agent_data:
+            apply_verification(agent_id, agent_data, result)
+
+    for agent_id, agent_data in agents.items():
+        # Racing agents are verified by judge_races against their race's own policy
+        if (agent_data.get('race_id') or AgentStatus.is_finished(agent_data.get('status'))
+                or agent_data.get('workspace_evicted_at') or not agent_data.get('repo_path')):
+            continue
+        repo_path = agent_data['repo_path']
+        commit = head_commit(repo_path)
+        if (commit and commit != agent_data.get('base_commit')
+                and commit != (agent_data.get('verification') or {}).get('commit')
+                and not VERIFIER.pending(agent_id)):
+            env = dependency_env(repo_path, os.environ.copy()) if DEPENDENCY_CACHE else None
+            VERIFIER.submit(agent_id, repo_path, commit, VERIFY_COMMAND, env)
+
+def apply_verification(agent_id, agent_data, result):
+    """Store a verification result on the agent and describe it in status_reason"""
+    agent_data['verification'] = result
+    VERIFICATIONS.labels(result['status']).inc()
+    if not result.get('cached') and result.get('seconds') is not None:
+        VERIFY_SECONDS.observe(result['seconds'])
+    TRACER.event(agent_id, 'verification', commit=result['commit'], status=result['status'])
+    summary = ', '.join(f"{count} {kind}" for kind, count in (result.get('summary') or {}).items())
+    commit = result['commit'][:8]
+    if result['passed']:
+        agent_data['status_reason'] = f"Verified at {commit}" + (f": {summary}" if summary else '')
+    else:
+        agent_data['status_reason'] = f"Verification {result['status']} at {commit}: {summary or result.get('reason')}"
+    logger.info(f"Verification of agent {agent_id} at {commit}: {result['status']} {summary}")
+    output_queue.put({
+        'agent_id': agent_id,
+        'status': agent_data.get('status'),
+        'status_reason': agent_data['status_reason'],
+        'verification': verification_summary(result),
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+def detect_duplicates(tasks_data):
+    """
+    Every DUPLICATE_INTERVAL seconds fingerprint the diffs of active agents that have new
+    commits, and on every pass flag clusters of agents doing the same work. With
+    DUPLICATE_ACTION=pause the agents of a cluster that are similar enough to the one kept
+    running are paused; they resume if that agent stops without completing.
+    """
+    agents = tasks_data['agents']
+    if DUPLICATES.updated_at is None or time.monotonic() - DUPLICATES.updated_at >= DUPLICATE_INTERVAL:
+        fingerprint_agents(agents)
+    active = [agent_id for agent_id in DUPLICATES.agent_ids()
+              if agent_id in agents and not AgentStatus.is_finished(agents[agent_id].get('status'))
+              and not agents[agent_id].get('workspace_evicted_at')]
+
+    now = datetime.datetime.now().isoformat()
+    changed = set()
+    clustered = set()
+    for cluster in DUPLICATES.clusters(active):
+        clustered.update(cluster)
+        # Keep the agent that is running and furthest along: verified first, then the oldest
+        keeper = min(cluster, key=lambda agent_id: (
+            AgentStatus.is_error_state(agents[agent_id].get('status')),
+            agents[agent_id].get('status') == AgentStatus.PAUSED,
+            not (agents[agent_id].get('verification') or {}).get('passed'),
+            agents[agent_id].get('created_at') or '',
+            agent_id
+        ))
+        for agent_id in cluster:
+            agent_data = agents[agent_id]
+            duplicates = [other for other in cluster if other != agent_id]
+            if agent_data.get('duplicates') != duplicates:
+                agent_data['duplicates'] = duplicates
+                changed.add(agent_id)
+                logger.info(f"Agent {agent_id} duplicates the work of {', '.join(duplicates)}")
+            # Clusters are transitive: only pause agents that themselves duplicate the keeper
+            if (DUPLICATE_ACTION == 'pause' and agent_id != keeper
+                    and agent_data.get('status') == AgentStatus.IN_PROGRESS
+                    and DUPLICATES.similarity(agent_id, keeper) >= DUPLICATES.threshold
+                    and not AgentStatus.is_error_state(agents[keeper].get('status'))):
+                pause_duplicate(agent_id, agent_data, keeper)
+                changed.add(agent_id)
+
+    for agent_id, agent_data in agents.items():
+        if agent_id not in clustered and agent_data.get('duplicates'):
+            agent_data.pop('duplicates')
+            changed.add(agent_id)
+        keeper = agents.get(agent_data.get('duplicate_of'))
+        if agent_data.get('status') == AgentStatus.PAUSED and (
+                keeper is None or keeper.get('status') in (AgentStatus.ERROR, AgentStatus.STALLED, AgentStatus.CANCELLED)):
+            resume_duplicate(agent_id, agent_data)
+            changed.add(agent_id)
+
+    for agent_id in changed:
+        agents[agent_id]['last_updated'] = now
+        output_queue.put({
+            'agent_id': agent_id,
+            'status': agents[agent_id].get('status'),
+            'status_reason': agents[agent_id].get('status_reason'),
+            'duplicates': agents[agent_id].get('duplicates') or [],
+            'timestamp': now
+        })
+
+def fingerprint_agents(agents):
+    """Bring the fingerprints of active agents up to their HEADs and drop the others'"""
+    fingerprinted = []
+    for agent_id, agent_data in agents.items():
+        if (AgentStatus.is_finished(agent_data.get('status')) or agent_data.get('workspace_evicted_at')
+                or not agent_data.get('repo_path') or not agent_data.get('base_commit')):
+            continue
+        commit = head_commit(agent_data['repo_path'])
+        if not commit or commit == agent_data['base_commit']:
+            continue
+        try:
+            DUPLICATES.update(agent_id, agent_data['repo_path'], agent_data['base_commit'], commit)
+            fingerprinted.append(agent_id)
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.warning(f"Could not fingerprint the diff of agent {agent_id}: {e}")
+    DUPLICATES.retain(fingerprinted)
+    DUPLICATES.updated_at = time.monotonic()
+
+def pause_duplicate(agent_id, agent_data, keeper_id):
+    session = aider_sessions.get(agent_id)
+    if not session or not session.pause():
+        agent_data['status_reason'] = f'Duplicates the work of {keeper_id}'
+        return
+    DUPLICATE_PAUSES.inc()
+    STATUS_TRANSITIONS.labels(agent_data.get('status') or 'none', AgentStatus.PAUSED).inc()
+    agent_data.update({'status': AgentStatus.PAUSED, 'status_reason': f'Paused as a duplicate of {keeper_id}',
+                       'duplicate_of': keeper_id})
+    TRACER.event(agent_id, 'duplicate.pause', keeper=keeper_id)
+    logger.info(f"Paused agent {agent_id}, its work duplicates agent {keeper_id}")
+
+def resume_duplicate(agent_id, agent_data):
+    keeper_id = agent_data.pop('duplicate_of', None)
+    session = aider_sessions.get(agent_id)
+    if session:
+        session.resume()
+    STATUS_TRANSITIONS.labels(AgentStatus.PAUSED, AgentStatus.IN_PROGRESS).inc()
+    agent_data.update({'status': AgentStatus.IN_PROGRESS,
+                       'status_reason': f'Resumed, {keeper_id} stopped without completing'})
+    TRACER.event(agent_id, 'duplicate.resume', keeper=keeper_id)
+    logger.info(f"Resumed agent {agent_id}, agent {keeper_id} stopped without completing")
+
+def judge_races(tasks_data):
+    """Evaluate new commits of racing agents and settle the races that have a winner"""
+    races = tasks_data.setdefault('races', {})
+    agents = tasks_data['agents']
+    for agent_id, result in RACE_JUDGE.results():
+        agent_data = agents.get(agent_id)
+        if not agent_data:
+            continue
+        agent_data['evaluation'] = result
+        RACE_EVALUATIONS.labels('passed' if result['passed'] else 'failed').inc()
+        TRACER.event(agent_id, 'race.evaluation', commit=result['commit'], passed=result['passed'])
+        logger.info(f"Commit {result['commit'][:8]} of agent {agent_id} "
+                    f"{'passed' if result['passed'] else 'failed: ' + str(result.get('reason'))}")
+        race = races.get(agent_data.get('race_id'))
+        if race and result['passed'] and not race.get('winner'):
+            settle_race(race, agent_id, result['commit'], agents)
+
+    for race_id, race in races.items():
+        if race.get('winner'):
+            continue
+        policy = RacePolicy.from_dict(race['policy'])
+        for agent_id in race['agent_ids']:
+            agent_data = agents.get(agent_id)
+            if (not agent_data or AgentStatus.is_finished(agent_data.get('status'))
+                    or agent_data.get('workspace_evicted_at') or not agent_data.get('repo_path')):
+                continue
+            repo_path = agent_data['repo_path']
+            commit = head_commit(repo_path)
+            if (commit and commit != agent_data.get('base_commit')
+                    and commit != (agent_data.get('evaluation') or {}).get('commit')
+                    and not RACE_JUDGE.pending(agent_id)):
+                env = dependency_env(repo_path, os.environ.copy()) if DEPENDENCY_CACHE else None
+                RACE_JUDGE.submit(agent_id, repo_path, commit, policy, env)
+
+def settle_race(race, winner_id, commit, agents):
+    """Record the winner of a race on it and cancel or deprioritize the other agents"""
+    now = datetime.datetime.now().isoformat()
+    winner = agents[winner_id]
+    race.update({'winner': winner_id, 'branch': winner.get('branch'), 'commit': commit, 'decided_at': now})
+    on_win = race['policy'].get('on_win', 'cancel')
+    RACES_SETTLED.labels(on_win).inc()
+    logger.info(f"Agent {winner_id} won the race for task '{race['task']}' with {winner.get('branch')} at {commit}")
+
+    changed = [winner_id]
+    STATUS_TRANSITIONS.labels(winner.get('status') or 'none', AgentStatus.COMPLETED).inc()
+    winner.update({'status': AgentStatus.COMPLETED, 'status_reason': f'Won the race at commit {commit[:8]}',
+                   'last_updated': now})
+    for agent_id in race['agent_ids']:
+        loser = agents.get(agent_id)
+        if agent_id == winner_id or not loser or AgentStatus.is_finished(loser.get('status')):
+            continue
+        session = aider_sessions.get(agent_id)
+        if on_win == 'deprioritize':
+            if session and session.process:
+                deprioritize(session.process.pid)
+            loser['status_reason'] = f'Lost the race to {winner_id}, running at low priority'
+        else:
+            if session:
+                session.cleanup()
+                del aider_sessions[agent_id]
+            STATUS_TRANSITIONS.labels(loser.get('status') or 'none', AgentStatus.CANCELLED).inc()
+            loser.update({'status': AgentStatus.CANCELLED, 'status_reason': f'Lost the race to {winner_id}'})
+            TRACER.finish(agent_id)
+        loser['last_updated'] = now
+        changed.append(agent_id)
+
+    for agent_id in changed:
+        output_queue.put({
+            'agent_id': agent_id,
+            'status': agents[agent_id]['status'],
+            'status_reason': agents[agent_id].get('status_reason'),
+            'timestamp': now
+        })
+
+def create_task_dag(repository_url, tasks, num_agents=None, toolchain=None, race=None, force=False):
+    """
+    Schedule tasks with dependencies (see utils/task_dag.py) and hand the ones without any to
+    DAG_STARTER; the main loop records their agents. Returns the graph id; ValueError if the graph
+    is invalid.
+    """
+    dag = new_dag(tasks, repository_url=repository_url, num_agents=num_agents, toolchain=toolchain, race=race,
+                  force=force)
+    dag_id = str(uuid.uuid4())
+    with TASKS_LOCK:
+        tasks_data = load_tasks()
+        tasks_data['dags'][dag_id] = dag
+        queued = schedule_dag(tasks_data, dag_id, dag)
+        start_ready(dag_id, dag, queued)
+        save_tasks(tasks_data)
+    logger.info(f"Scheduled task graph {dag_id} with {len(dag['nodes'])} tasks, queued {', '.join(queued)}")
+    return dag_id
+
+def schedule_dags(tasks_data, snapshot=None):
+    """
+    Advance the task graphs: record finished tasks and started ones, and hand the tasks that
+    became ready to DAG_STARTER
+    """
+    with TASKS_LOCK:
+        # Graphs and agents added since the main loop read the tasks file
+        merge_saved(tasks_data, snapshot)
+        for dag_id, dag in tasks_data['dags'].items():
+            if dag.get('finished_at'):
+                continue
+            start_ready(dag_id, dag, schedule_dag(tasks_data, dag_id, dag))
+
+def start_ready(dag_id, dag, ready):
+    """Hand ready tasks of a graph to DAG_STARTER, to start from the commits of their dependencies"""
+    for node_id in ready:
+        node = dag['nodes'][node_id]
+        start_from = [{key: dag['nodes'][dependency][key] for key in ('repo_path', 'branch', 'commit')}
+                      for dependency in node['depends_on']]
+        dag_starts[(dag_id, node_id)] = DAG_STARTER.submit(start_dag_task, dag['settings'], node['task'],
+                                                           start_from, dag_id, node_id)
+
+def schedule_dag(tasks_data, dag_id, dag):
+    """One scheduling pass over a task graph, returning the ready tasks to start"""
+    agents = tasks_data['agents']
+    progress = True
+    while progress:
+        progress = False
+        now = datetime.datetime.now().isoformat()
+        for node_id, node in dag['nodes'].items():
+            start = dag_starts.get((dag_id, node_id))
+            if node['state'] == WAITING and start is not None and start.done():
+                del dag_starts[(dag_id, node_id)]
+                try:
+                    agent_ids = start.result()
+                except Exception as e:
+                    logger.error(f"Error starting task '{node_id}' of graph {dag_id}: {e}", exc_info=True)
+                    agent_ids = []
+                started_dag_task(tasks_data, dag_id, dag, node_id, agent_ids)
+                progress = True
+            if node['state'] != RUNNING:
+                continue
+            outcome = dag_task_outcome(node, agents)
+            if outcome is None:
+                continue
+            node.update(outcome, finished_at=now)
+            DAG_TASKS_FINISHED.labels(node['state']).inc()
+            logger.info(f"Task '{node_id}' of graph {dag_id} {node['state']}"
+                        + (f" at {node['commit'][:8]}" if node['state'] == COMPLETED else f": {node['reason']}"))
+            progress = True
+        for node_id in block_dependents(dag):
+            DAG_TASKS_FINISHED.labels(dag['nodes'][node_id]['state']).inc()
+            logger.info(f"Task '{node_id}' of graph {dag_id} is blocked: {dag['nodes'][node_id]['reason']}")
+
+    ready = [node_id for node_id in ready_nodes(dag) if (dag_id, node_id) not in dag_starts]
+    now = datetime.datetime.now().isoformat()
+    for node_id in ready:
+        dag['nodes'][node_id]['queued_at'] = dag['nodes'][node_id]['queued_at'] or now
+
+    if dag_finished(dag):
+        path, seconds = critical_path(dag)
+        dag.update(finished_at=datetime.datetime.now().isoformat(), critical_path=path,
+                   critical_path_seconds=seconds)
+        if seconds is not None:
+            DAG_CRITICAL_PATH.observe(seconds)
+        logger.info(f"Task graph {dag_id} finished {dag_summary(dag)}, critical path "
+                    f"{' -> '.join(path) or 'none'} in {seconds}s")
+    return ready
+
+def dag_task_outcome(node, agents):
+    """How a running task of a graph ended, as node fields, or None while it is still running"""
+    failed = True
+    for agent_id in node['agent_ids']:
+        agent_data = agents.get(agent_id)
+        if not agent_data:
+            continue
+        evaluation = agent_data.get('evaluation') or {}
+        verification = agent_data.get('verification') or {}
+        commit = None
+        if agent_data.get('status') == AgentStatus.COMPLETED:
+            commit = ((evaluation.get('passed') and evaluation.get('commit')) or agent_data.get('result_commit')
+                      or head_commit(agent_data['repo_path']))
+        elif verification.get('passed'):
+            commit = verification['commit']
+        if commit:
+            return {'state': COMPLETED, 'agent_id': agent_id, 'repo_path': agent_data['repo_path'],
+                    'branch': agent_data.get('branch'), 'commit': commit}
+        # Paused duplicates resume if the agent they duplicate fails, so they may still finish the task
+        status = agent_data.get('status')
+        if not (AgentStatus.is_finished(status) or AgentStatus.is_error_state(status)):
+            failed = False
+    if failed:
+        return {'state': FAILED, 'reason': 'Every agent of the task stopped without completing it'}
+    return None
+
+def start_dag_task(settings, task, start_from, dag_id, node_id):
+    """
+    Start the agents of a ready task from the commits its dependencies finished with, marked in
+    the tasks file as working on that task of the graph
+    """
+    agent_ids = initialiseCodingAgent(
+        repository_url=settings['repository_url'], task_description=task,
+        num_agents=settings.get('num_agents'), toolchain=settings.get('toolchain'), race=settings.get('race'),
+        force=settings.get('force', False), start_from=start_from
+    ) or []
+    # initialiseCodingAgent saved the agents (and their race) to the tasks file
+    with TASKS_LOCK:
+        tasks_data = load_tasks()
+        for agent_id in agent_ids:
+            if agent_id in tasks_data['agents']:
+                tasks_data['agents'][agent_id].update(dag_id=dag_id, dag_task=node_id)
+        save_tasks(tasks_data)
+    return agent_ids
+
+def started_dag_task(tasks_data, dag_id, dag, node_id, agent_ids):
+    """Record the agents start_dag_task started for a task of a graph"""
+    node = dag['nodes'][node_id]
+    settings = dag['settings']
+    if node['task'] not in tasks_data['tasks']:
+        tasks_data['tasks'].append(node['task'])
+    if tasks_data.get('repository_url') != settings['repository_url']:
+        tasks_data['repository_url'] = settings['repository_url']
+
+    now = datetime.datetime.now().isoformat()
+    if agent_ids:
+        node.update(state=RUNNING, agent_ids=agent_ids, started_at=now)
+        node['queue_wait_seconds'] = queue_wait(node)
+        TASK_QUEUE_WAIT.observe(node['queue_wait_seconds'])
+        logger.info(f"Started task '{node_id}' of graph {dag_id} with agents {', '.join(agent_ids)}"
+                    + (f" from {', '.join(node['depends_on'])}" if node['depends_on'] else ''))
+    else:
+        node.update(state=FAILED, reason='No agent could be started for the task', finished_at=now)
+        DAG_TASKS_FINISHED.labels(FAILED).inc()
+        logger.error(f"Could not start task '{node_id}' of graph {dag_id}")
+    return agent_ids
+
+def _workspace_evictable(agent_id, agent_data):
+    session = aider_sessions.get(agent_id)
+    return (agent_data.get('status') in EVICTABLE_STATUSES and not agent_data.get('workspace_evicted_at')
+            and not (session and session.is_alive()))
+
+def reclaim_workspaces(tasks_data):
+    """Discard workspaces of finished agents, least recently updated first, while over the quota"""
+    agents = tasks_data['agents']
+    # Dependent tasks that have not started yet fetch from these
+    held = {
+        node.get('agent_id')
+        for dag in tasks_data.get('dags', {}).values() if not dag.get('finished_at')
+        for waiting in dag['nodes'].values() if waiting['state'] == WAITING
+        for node in (dag['nodes'][dependency] for dependency in waiting['depends_on'])
+    }
+    evictable = lambda agent_id, agent_data: agent_id not in held and _workspace_evictable(agent_id, agent_data)
+    for agent_id in WORKSPACE_GC.select_evictions(agents, evictable):
+        agent_data = agents[agent_id]
+        workspace = agent_data['workspace']
+        session = aider_sessions.pop(agent_id, None)
+        if session:
+            session.cleanup()
+        discard_workspace(workspace, eviction=True)
+        PATH_CACHE.invalidate(workspace)
+        agent_data['workspace_evicted_at'] = datetime.datetime.now().isoformat()
+        logger.info(f"Evicted workspace of {agent_data.get('status')} agent {agent_id} to stay under the "
+                    f"{WORKSPACE_GC.quota_bytes} byte quota: {workspace}")
+
 def main_loop():
     logger.info("Starting main orchestration loop")
     while True:
         try:
             tasks_data = load_tasks()
+            # What the pass changes is saved against this copy (see save_changes)
+            snapshot = copy.deepcopy(tasks_data)
             current_time = datetime.datetime.now().isoformat()
             
             for agent_id, agent_data in list(tasks_data['agents'].items()):
-                logger.info(f"Processing agent {agent_id}")
+                logger.info(f"Processing agent {agent_id}", extra=SAMPLED)
+                previous_status = agent_data.get('status')
                 
                 aider_session = aider_sessions.get(agent_id)
+                if not aider_session and AgentStatus.is_finished(previous_status):
+                    continue
                 if not aider_session:
                     agent_data.update({
                         'status': AgentStatus.ERROR,
@@ -796,6 +1915,8 @@ def main_loop():
                         },
                         'last_updated': current_time
                     })
+                    if previous_status != AgentStatus.ERROR:
+                        STATUS_TRANSITIONS.labels(previous_status or 'none', AgentStatus.ERROR).inc()
                     continue
                     
                 # Run health check
@@ -805,7 +1926,8 @@ def main_loop():
                 # Update agent data
                 agent_data.update({
                     'aider_output': agent_output,
-                    'last_updated': current_time
+                    'last_updated': current_time,
+                    'process': aider_session.process_info()
                 })
                 
                 # Check agent state and critique
@@ -814,7 +1936,8 @@ def main_loop():
                     agent_data['last_critique'] = critique
                 
                 # Force error status if process has terminated
-                if aider_session.process and aider_session.process.poll() is not None:
+                if (aider_session.process and aider_session.process.poll() is not None
+                        and not AgentStatus.is_finished(agent_data.get('status'))):
                     agent_data.update({
                         'status': AgentStatus.ERROR,
                         'status_reason': 'Agent process has terminated unexpectedly',
@@ -825,21 +1948,31 @@ def main_loop():
                         }
                     })
                 
-                # Emit update via WebSocket
+                # Emit update via WebSocket; output itself goes out as deltas while it is read
                 status_update = {
                     'agent_id': agent_id,
                     'status': agent_data.get('status'),
                     'status_reason': agent_data.get('status_reason'),
                     'error_details': agent_data.get('error_details'),
-                    'output': agent_output,
+                    'output_chars': len(agent_output),
+                    'last_line': last_output_line(agent_output),
                     'timestamp': current_time
                 }
                 output_queue.put(status_update)
                 
+                if agent_data.get('status') != previous_status:
+                    STATUS_TRANSITIONS.labels(previous_status or 'none', agent_data.get('status')).inc()
+                
                 # Update stored data
                 tasks_data['agents'][agent_id] = agent_data
             
-            save_tasks(tasks_data)
+            verify_agents(tasks_data)
+            detect_duplicates(tasks_data)
+            judge_races(tasks_data)
+            schedule_dags(tasks_data, snapshot)
+            record_results(tasks_data)
+            reclaim_workspaces(tasks_data)
+            save_changes(tasks_data, snapshot)
             logger.info(f"Waiting {CHECK_INTERVAL} seconds before next check")
             sleep(CHECK_INTERVAL)
             
@@ -848,5 +1981,8 @@ def main_loop():
             sleep(CHECK_INTERVAL)
 
 if __name__ == "__main__":
+    setup_logging('orchestrator.log', level=logging.INFO, max_bytes=5242880, backup_count=3)
     logger.info("Starting orchestrator")
+    initialize_toolchains()
+    reattach_sessions()
     main_loop()
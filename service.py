@@ -0,0 +1,485 @@
+"""
+Orchestrator operations shared by the web tier and the daemon's control API.
+
+`OrchestratorService` wraps the orchestrator module and is what the daemon exposes over
+IPC. The web tier talks to it through a backend: `LocalBackend` runs the orchestrator in
+the web process, `RemoteBackend` forwards calls to a daemon started with
+`python daemon.py serve` and receives output updates over a pub/sub subscription.
+"""
+import os
+import time
+import queue
+import datetime
+import logging
+import threading
+import zlib
+
+from utils.ansi import last_output_line
+from utils.ipc import IpcClient, IpcError
+from utils.racing import RacePolicy
+from utils.task_dag import has_dependencies, parse_tasks
+from utils.verification import verification_summary
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_TOPIC = 'output'
+
+
+def summarize_agent(agent_id, agent, session=None):
+    """Compact view of an agent for the dashboard list: no output, only a one-line preview"""
+    output = agent.get('aider_output') or ''
+    error_details = agent.get('error_details') or {}
+    return {
+        'agent_id': agent_id,
+        'status': agent.get('status') or 'pending',
+        'status_reason': agent.get('status_reason'),
+        'task': agent.get('task'),
+        'created_at': agent.get('created_at'),
+        'last_updated': agent.get('last_updated'),
+        'output_chars': len(output),
+        'last_line': last_output_line(output),
+        # The live session counts errors as they happen, the saved details only when the status changes
+        'error_count': session.error_count if session is not None else error_details.get('error_count', 0),
+        'session_alive': bool(session is not None and session.is_alive()),
+        'verification': verification_summary(agent.get('verification')),
+        'duplicates': agent.get('duplicates') or []
+    }
+
+
+def page_agents(agents, status=None, offset=0, limit=50):
+    """
+    Filter agents ({agent_id: agent}) by status and return one page of (agent_id, agent) pairs
+    with per-status counts, so only the page needs summarizing
+    """
+    counts = {}
+    selected = []
+    statuses = set(status.split(',')) if status else None
+    for agent_id, agent in agents.items():
+        agent_status = agent.get('status') or 'pending'
+        counts[agent_status] = counts.get(agent_status, 0) + 1
+        if statuses is None or agent_status in statuses:
+            selected.append((agent_id, agent))
+    selected.sort(key=lambda item: (item[1].get('created_at') or '', item[0]))
+    offset = max(0, int(offset or 0))
+    limit = max(0, int(limit if limit is not None else 50))
+    return {
+        'agents': selected[offset:offset + limit],
+        'total': len(selected),
+        'offset': offset,
+        'limit': limit,
+        'counts': counts
+    }
+
+
+class ServiceError(Exception):
+    """An expected failure with the HTTP status the web tier should answer with"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class OrchestratorService:
+    """Dispatches named operations with keyword parameters to the orchestrator"""
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        self.started_at = time.time()
+        # Repositories cloned by this process, reported to a coordinator for cache locality
+        self.provisioned_repos = set()
+
+    def handle(self, method, params):
+        handler = getattr(self, f'op_{method}', None) if isinstance(method, str) else None
+        if handler is None:
+            raise ServiceError(f'Unknown method: {method}', 404)
+        return handler(**params)
+
+    def ensure_main_loop(self):
+        for thread in threading.enumerate():
+            if thread.name == 'OrchestratorMainLoop':
+                return
+        thread = threading.Thread(target=self.orchestrator.main_loop, name='OrchestratorMainLoop')
+        thread.daemon = True
+        thread.start()
+
+    def _agent(self, agent_id):
+        tasks_data = self.orchestrator.load_tasks()
+        agent_data = tasks_data['agents'].get(agent_id)
+        if not agent_id or not agent_data:
+            raise ServiceError(f'Agent {agent_id} not found', 404)
+        return tasks_data, agent_data
+
+    def op_ping(self):
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'sessions': len(self.orchestrator.aider_sessions)
+        }
+
+    def op_capacity(self):
+        """Current load and cached repositories, reported to a coordinator"""
+        tasks_data = self.orchestrator.load_tasks()
+        repos = set(self.provisioned_repos)
+        if tasks_data.get('repository_url'):
+            repos.add(tasks_data['repository_url'])
+        return {
+            'running': sum(1 for session in list(self.orchestrator.aider_sessions.values()) if session.is_alive()),
+            'agent_ids': list(tasks_data.get('agents', {})),
+            'repos': sorted(repos)
+        }
+
+    def op_get_tasks(self):
+        return self.orchestrator.load_tasks()
+
+    def op_list_agents(self):
+        sessions = self.orchestrator.aider_sessions
+        return [
+            {
+                'agent_id': agent_id,
+                'status': agent.get('status'),
+                'task': agent.get('task'),
+                'repo_path': agent.get('repo_path'),
+                'created_at': agent.get('created_at'),
+                'last_updated': agent.get('last_updated'),
+                'session_alive': bool(agent_id in sessions and sessions[agent_id].is_alive())
+            }
+            for agent_id, agent in self.orchestrator.load_tasks().get('agents', {}).items()
+        ]
+
+    def op_agent_summary(self, status=None, offset=0, limit=50):
+        sessions = self.orchestrator.aider_sessions
+        page = page_agents(self.orchestrator.load_tasks().get('agents', {}), status, offset, limit)
+        page['agents'] = [summarize_agent(agent_id, agent, sessions.get(agent_id))
+                          for agent_id, agent in page['agents']]
+        return page
+
+    def op_agent_detail(self, agent_id=None, include_output=True):
+        _, agent_data = self._agent(agent_id)
+        aider_session = self.orchestrator.aider_sessions.get(agent_id)
+        detail = dict(agent_data, agent_id=agent_id, session_alive=False, message_count=0)
+        detail.pop('process', None)
+        if aider_session:
+            # The live buffer is ahead of the periodically persisted copy
+            detail['aider_output'] = aider_session.get_output()
+            detail['session_alive'] = aider_session.is_alive()
+            detail['message_count'] = len(aider_session.messages)
+            detail['output_lines_read'] = aider_session.lines_read
+            detail['output_bytes_buffered'] = aider_session.buffered_bytes
+        output = detail.pop('aider_output', None) or ''
+        detail['output_chars'] = len(output)
+        if include_output:
+            detail['aider_output'] = output
+        return detail
+
+    def op_agent_output(self, agent_id=None, offset=None, limit=None, tail=None):
+        """
+        A range of an agent's output, sliced here so only the range crosses the IPC socket.
+        Offsets count characters. tail returns the last tail characters and ignores offset.
+        """
+        _, agent_data = self._agent(agent_id)
+        aider_session = self.orchestrator.aider_sessions.get(agent_id)
+        if aider_session:
+            # Output of a session only grows, so the session id and a range identify the content
+            output = aider_session.get_output()
+            generation = aider_session.session_id
+        else:
+            output = agent_data.get('aider_output') or ''
+            generation = f"stored-{zlib.crc32(output.encode('utf-8', 'replace')):08x}"
+        total = len(output)
+        if tail is not None:
+            start = max(0, total - int(tail))
+            end = total
+        else:
+            start = min(max(0, int(offset or 0)), total)
+            end = total if limit is None else min(total, start + max(0, int(limit)))
+        return {
+            'agent_id': agent_id,
+            'status': agent_data.get('status') or 'pending',
+            'generation': generation,
+            'offset': start,
+            'end': end,
+            'total': total,
+            'data': output[start:end]
+        }
+
+    def op_create_agents(self, repository_url=None, tasks=None, num_agents=1, toolchain=None, race=None, force=False):
+        try:
+            RacePolicy.from_dict(race)
+        except (TypeError, ValueError) as e:
+            raise ServiceError(f"Invalid race policy: {e}")
+        registry = self.orchestrator.toolchain_registry
+        if toolchain and toolchain not in registry.names():
+            raise ServiceError(f"Unknown toolchain '{toolchain}'. Available: {', '.join(registry.names())}")
+
+        # Uses the cached startup probe, no subprocesses on this path
+        if not self.orchestrator.check_aider_installation(toolchain):
+            registered = registry.get(toolchain)
+            raise ServiceError(
+                (registered.error if registered else None) or 'Aider is not installed. Please run: pip install aider-chat',
+                500,
+                needs_installation=True
+            )
+
+        if not repository_url or not tasks:
+            raise ServiceError('Repository URL and tasks are required')
+        if isinstance(tasks, str):
+            tasks = [tasks]
+        if has_dependencies(tasks):
+            return self._create_task_dag(repository_url, tasks, num_agents, toolchain, race, force)
+
+        created_agents = []
+        for task_description in tasks:
+            os.environ['REPOSITORY_URL'] = repository_url
+            agent_ids = self.orchestrator.initialiseCodingAgent(
+                repository_url=repository_url,
+                task_description=task_description,
+                num_agents=num_agents,
+                toolchain=toolchain,
+                race=race,
+                force=bool(force)
+            )
+            if agent_ids:
+                created_agents.extend(agent_ids)
+                self.provisioned_repos.add(repository_url)
+                # initialiseCodingAgent has persisted the agents, only record the task
+                with self.orchestrator.TASKS_LOCK:
+                    tasks_data = self.orchestrator.load_tasks()
+                    if task_description not in tasks_data['tasks']:
+                        tasks_data['tasks'].append(task_description)
+                        self.orchestrator.save_tasks(tasks_data)
+
+        self.ensure_main_loop()
+        if not created_agents:
+            raise ServiceError('Failed to create any agents', 500)
+        return {'agent_ids': created_agents}
+
+    def _create_task_dag(self, repository_url, tasks, num_agents, toolchain, race, force):
+        try:
+            nodes = parse_tasks(tasks)
+        except ValueError as e:
+            raise ServiceError(f"Invalid task graph: {e}")
+        racing = race and (num_agents or self.orchestrator.DEFAULT_AGENTS_PER_TASK) > 1
+        if any(node['depends_on'] for node in nodes) and not racing and not self.orchestrator.VERIFY_COMMAND:
+            raise ServiceError('Tasks with dependencies need a race policy or VERIFY_COMMAND: a task is done when '
+                               'one of its agents wins its race or passes verification')
+        os.environ['REPOSITORY_URL'] = repository_url
+        # The tasks start on the orchestrator's DAG_STARTER; the main loop records their agents
+        dag_id = self.orchestrator.create_task_dag(
+            repository_url, tasks, num_agents=num_agents, toolchain=toolchain, race=race, force=bool(force)
+        )
+        self.ensure_main_loop()
+        self.provisioned_repos.add(repository_url)
+        return {'agent_ids': [], 'dag_id': dag_id}
+
+    def op_delete_agent(self, agent_id=None):
+        self._agent(agent_id)
+        if not self.orchestrator.delete_agent(agent_id):
+            raise ServiceError(f'Failed to delete agent {agent_id}', 500)
+        return {'agent_id': agent_id}
+
+    def op_retry_agent(self, agent_id=None, message=None):
+        if not agent_id:
+            raise ServiceError('No agent_id provided')
+        _, agent_data = self._agent(agent_id)
+        sessions = self.orchestrator.aider_sessions
+        aider_session = sessions.get(agent_id)
+
+        # Reuse the warm session and its chat history when aider is still running
+        if aider_session and aider_session.is_alive():
+            retry_message = message or (
+                "The previous attempt did not finish successfully. "
+                f"Please review what went wrong and continue with the original task: {agent_data['task']}"
+            )
+            if not aider_session.send_message(retry_message):
+                raise ServiceError(f"Failed to send retry message to agent {agent_id}", 500)
+            self.orchestrator.TRACER.event(agent_id, 'retry', session_id=aider_session.session_id)
+            reused_session = True
+        else:
+            if aider_session:
+                aider_session.cleanup()
+                del sessions[agent_id]
+
+            # Reinitialize the agent
+            new_session = self.orchestrator.AiderSession(
+                agent_data['repo_path'],
+                agent_data['task'],
+                toolchain=agent_data.get('toolchain'),
+                agent_id=agent_id
+            )
+            if not new_session.start():
+                raise ServiceError(f"Failed to restart agent {agent_id}", 500)
+            sessions[agent_id] = new_session
+            reused_session = False
+
+        # The session has been writing to the tasks file since it started, so update it as saved now
+        with self.orchestrator.TASKS_LOCK:
+            tasks_data = self.orchestrator.load_tasks()
+            agent_data = tasks_data['agents'].get(agent_id)
+            if agent_data is None:
+                raise ServiceError(f'Agent {agent_id} not found', 404)
+            if not reused_session:
+                agent_data['process'] = new_session.process_info()
+            agent_data['status'] = 'in_progress'
+            agent_data['last_updated'] = datetime.datetime.now().isoformat()
+            self.orchestrator.save_tasks(tasks_data)
+        return {'agent_id': agent_id, 'reused_session': reused_session}
+
+    def op_send_message(self, agent_id=None, message=None):
+        if not agent_id or not message:
+            raise ServiceError("agent_id and message are required")
+        aider_session = self.orchestrator.aider_sessions.get(agent_id)
+        if not aider_session:
+            raise ServiceError(f"No active aider session for agent {agent_id}", 404)
+        if not aider_session.send_message(message):
+            raise ServiceError(f"Aider session for agent {agent_id} is not accepting messages", 409)
+        return {'agent_id': agent_id, 'message_count': len(aider_session.messages)}
+
+    def op_debug_agent(self, agent_id=None):
+        _, agent_data = self._agent(agent_id)
+        normalize_path = self.orchestrator.normalize_path
+        workspace_path = normalize_path(agent_data.get('workspace'))
+        repo_path = normalize_path(agent_data.get('repo_path'))
+
+        aider_session = self.orchestrator.aider_sessions.get(agent_id)
+        aider_workspace = normalize_path(aider_session.workspace_path) if aider_session else None
+
+        return {
+            'agent_id': agent_id,
+            'paths': {
+                'workspace': {
+                    'raw': agent_data.get('workspace'),
+                    'normalized': workspace_path,
+                    'exists': os.path.exists(workspace_path) if workspace_path else False
+                },
+                'repo_path': {
+                    'raw': agent_data.get('repo_path'),
+                    'normalized': repo_path,
+                    'exists': os.path.exists(repo_path) if repo_path else False
+                },
+                'aider_workspace': {
+                    'raw': aider_session.workspace_path if aider_session else None,
+                    'normalized': aider_workspace,
+                    'exists': os.path.exists(aider_workspace) if aider_workspace else False
+                }
+            },
+            'aider_session': {
+                'exists': aider_session is not None,
+                'output_buffer_length': len(aider_session.get_output()) if aider_session else 0,
+                'session_id': aider_session.session_id if aider_session else None
+            },
+            'agent_data': {
+                'status': agent_data.get('status'),
+                'created_at': agent_data.get('created_at'),
+                'last_updated': agent_data.get('last_updated'),
+                'aider_output_length': len(agent_data.get('aider_output', '')),
+                'task': agent_data.get('task')
+            }
+        }
+
+    def op_validate_paths(self, agent_id=None):
+        _, agent_data = self._agent(agent_id)
+        normalize_path = self.orchestrator.normalize_path
+        aider_session = self.orchestrator.aider_sessions.get(agent_id)
+
+        validation_results = {
+            'agent_id': agent_id,
+            'paths': {
+                'workspace': {
+                    'raw': agent_data.get('workspace'),
+                    'normalized': normalize_path(agent_data.get('workspace'))
+                },
+                'repo_path': {
+                    'raw': agent_data.get('repo_path'),
+                    'normalized': normalize_path(agent_data.get('repo_path'))
+                },
+                'aider_workspace': {
+                    'raw': aider_session.workspace_path if aider_session else None,
+                    'normalized': normalize_path(aider_session.workspace_path) if aider_session else None
+                }
+            },
+            'validation': {
+                'has_aider_session': aider_session is not None
+            }
+        }
+
+        if aider_session:
+            validation_results['validation']['path_match'] = self.orchestrator.validate_agent_paths(
+                agent_id,
+                aider_session.workspace_path
+            )
+            validation_results['validation']['output_length'] = len(aider_session.get_output())
+            validation_results['validation']['stored_output_length'] = len(agent_data.get('aider_output', ''))
+
+        return validation_results
+
+    def op_timeline(self, agent_id=None, format=None):
+        tracer = self.orchestrator.TRACER
+        timeline = tracer.to_otlp(agent_id) if format == 'otlp' else tracer.timeline(agent_id)
+        if timeline is None:
+            raise ServiceError(f'No trace recorded for agent {agent_id}', 404)
+        return timeline
+
+    def op_toolchains(self):
+        return self.orchestrator.toolchain_registry.to_dict()
+
+    def op_metrics(self):
+        return {'text': self.orchestrator.REGISTRY.render()}
+
+
+class LocalBackend:
+    """Runs the orchestrator inside the web process"""
+    remote = False
+
+    def __init__(self):
+        import orchestrator
+
+        self.service = OrchestratorService(orchestrator)
+        self.output_queue = orchestrator.output_queue
+        self._orchestrator = orchestrator
+
+    def start(self):
+        # Probe aider toolchains once so agent creation never has to
+        self._orchestrator.initialize_toolchains()
+        if self._orchestrator.reattach_sessions():
+            self.service.ensure_main_loop()
+
+    def call(self, method, **params):
+        return self.service.handle(method, params)
+
+
+class RemoteBackend:
+    """Forwards calls to an orchestrator daemon and mirrors its output updates locally"""
+    remote = True
+
+    def __init__(self, address, max_pending_updates=10000, token=None):
+        self.address = address
+        self.client = IpcClient(address, token=token)
+        self.output_queue = queue.Queue(maxsize=max_pending_updates)
+
+    def _on_update(self, topic, update):
+        try:
+            self.output_queue.put_nowait(update)
+        except queue.Full:
+            logger.warning(f"Dropping output update for agent {update.get('agent_id')}, broadcast is behind")
+
+    def start(self):
+        self.client.subscribe([OUTPUT_TOPIC], self._on_update)
+
+    def call(self, method, **params):
+        try:
+            return self.client.call(method, **params)
+        except IpcError as e:
+            raise ServiceError(str(e), e.status, **e.details)
+
+
+def create_backend(address=None):
+    """
+    RemoteBackend when ORCHESTRATOR_SOCKET (or address) is set, LocalBackend otherwise.
+    The address is a Unix socket path of a daemon or host:port of a daemon or coordinator.
+    """
+    address = address or os.environ.get('ORCHESTRATOR_SOCKET')
+    if address:
+        logger.info(f"Using orchestrator at {address}")
+        return RemoteBackend(address, token=os.environ.get('ORCHESTRATOR_TOKEN'))
+    return LocalBackend()
@@ -0,0 +1,143 @@
+/*
+ * Append-only terminal view for agent output.
+ *
+ * Lines arrive as segments already converted from ANSI on the server (utils/ansi.py): a
+ * segment is a string or a [text, classes] pair. Lines are kept in a bounded ring, the
+ * oldest dropped first, and only the lines in view are in the DOM. Deltas are applied to
+ * the ring immediately and painted at most once per animation frame.
+ */
+class TerminalView {
+    constructor(container, options = {}) {
+        this.maxLines = options.maxLines || 5000;
+        this.lineHeight = options.lineHeight || 20;
+        this.overscan = options.overscan || 20;
+
+        this.viewport = container;
+        this.viewport.classList.add('terminal');
+        this.viewport.textContent = '';
+        this.notice = document.createElement('div');
+        this.notice.className = 'terminal-notice';
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'terminal-spacer';
+        this.content = document.createElement('div');
+        this.content.className = 'terminal-lines';
+        this.spacer.appendChild(this.content);
+        this.viewport.appendChild(this.notice);
+        this.viewport.appendChild(this.spacer);
+
+        this.frame = null;
+        this.viewport.addEventListener('scroll', () => this.scheduleRender(), {passive: true});
+        this.reset(0);
+    }
+
+    reset(offset) {
+        this.lines = new Array(this.maxLines);
+        this.start = 0;      // ring index of the oldest line
+        this.count = 1;      // lines held, the last one is the unterminated line
+        this.lines[0] = [];
+        this.dropped = 0;
+        this.offset = offset;
+        this.end = offset;
+        this.followTail = true;
+        this.renderedFirst = -1;
+        this.renderedLast = -1;
+        this.dirty = true;
+        this.scheduleRender();
+    }
+
+    line(index) {
+        return this.lines[(this.start + index) % this.maxLines];
+    }
+
+    push(line) {
+        if (this.count === this.maxLines) {
+            this.lines[this.start] = line;
+            this.start = (this.start + 1) % this.maxLines;
+            this.dropped += 1;
+        } else {
+            this.lines[(this.start + this.count) % this.maxLines] = line;
+            this.count += 1;
+        }
+    }
+
+    /*
+     * Apply a delta ({offset, end, lines, cleared}). Returns false when it does not continue
+     * the output held here, the caller then fetches the missing range.
+     */
+    applyDelta(delta) {
+        if (delta.end <= this.end) return true;
+        if (delta.offset !== this.end) return false;
+
+        const last = this.line(this.count - 1);
+        if (delta.cleared) last.length = 0;
+        last.push(...delta.lines[0]);
+        for (let i = 1; i < delta.lines.length; i++) {
+            this.push(delta.lines[i].slice());
+        }
+        this.end = delta.end;
+        this.dirty = true;
+        this.scheduleRender();
+        return true;
+    }
+
+    scheduleRender() {
+        if (this.frame === null) {
+            // Only decide to follow the tail before the content grows
+            this.followTail = this.viewport.scrollHeight - this.viewport.scrollTop - this.viewport.clientHeight < this.lineHeight * 2;
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    render() {
+        const count = this.count;
+        this.spacer.style.height = `${count * this.lineHeight}px`;
+        this.notice.textContent = this.dropped ? `${this.dropped} earlier lines not shown` : '';
+        this.notice.style.display = this.dropped ? '' : 'none';
+        if (this.followTail) {
+            this.viewport.scrollTop = this.viewport.scrollHeight;
+        }
+
+        const top = Math.max(0, this.viewport.scrollTop - this.spacer.offsetTop);
+        const first = Math.max(0, Math.floor(top / this.lineHeight) - this.overscan);
+        const last = Math.min(count - 1, Math.ceil((top + this.viewport.clientHeight) / this.lineHeight) + this.overscan);
+        if (!this.dirty && first === this.renderedFirst && last === this.renderedLast) return;
+
+        const fragment = document.createDocumentFragment();
+        for (let index = first; index <= last; index++) {
+            fragment.appendChild(this.renderLine(this.line(index)));
+        }
+        this.content.style.transform = `translateY(${first * this.lineHeight}px)`;
+        this.content.replaceChildren(fragment);
+        this.renderedFirst = first;
+        this.renderedLast = last;
+        this.dirty = false;
+    }
+
+    renderLine(segments) {
+        const element = document.createElement('div');
+        element.className = 'terminal-line';
+        for (const segment of segments) {
+            if (typeof segment === 'string') {
+                element.appendChild(document.createTextNode(segment));
+            } else {
+                const span = document.createElement('span');
+                span.className = segment[1];
+                span.textContent = segment[0];
+                element.appendChild(span);
+            }
+        }
+        return element;
+    }
+
+    clear() {
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+            this.frame = null;
+        }
+        this.lines = new Array(this.maxLines);
+        this.content.replaceChildren();
+    }
+}
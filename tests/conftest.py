@@ -4,8 +4,43 @@ import tempfile
 import json
 import os
 import shutil
+import subprocess
 from unittest.mock import MagicMock
 
+
+def git(*args, cwd):
+    """Run git in cwd with a test identity and return its output, stripped."""
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def checkout(origin, path, branch):
+    """Clone origin to path, like an agent's workspace, on a new branch."""
+    git('clone', '-q', str(origin), str(path), cwd=origin.parent)
+    git('checkout', '-q', '-b', branch, cwd=path)
+    return path
+
+
+@pytest.fixture
+def upstream_repo(tmp_path):
+    """
+    Fixture that creates local repositories used like remotes: upstream_repo(path, files, branch)
+    commits files (a README by default) at path, relative to tmp_path, checks out branch if given
+    and returns the path.
+    """
+    def create(path="upstream", files=None, branch=None):
+        path = tmp_path / path
+        path.mkdir(parents=True)
+        git('init', '-q', cwd=path)
+        for name, content in (files or {'README': 'project\n'}).items():
+            (path / name).write_text(content)
+        git('add', '.', cwd=path)
+        git('commit', '-q', '-m', 'base', cwd=path)
+        if branch:
+            git('checkout', '-q', '-b', branch, cwd=path)
+        return path
+    return create
+
 @pytest.fixture
 def test_config():
     """Fixture that provides test configuration data."""
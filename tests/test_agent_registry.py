@@ -0,0 +1,63 @@
+import pytest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.agent_registry import AgentRegistry, CanonicalPathCache
+
+
+def test_registry_indexes_by_id_and_paths():
+    """Test lookups by workspace and repo path and that sync drops removed agents."""
+    registry = AgentRegistry()
+    registry.sync({
+        'a': {'workspace': '/w/a', 'repo_path': '/w/a/repo/project'},
+        'b': {'workspace': '/w/b', 'repo_path': None}
+    })
+    assert registry.find_by_path('/w/a/repo/project') == 'a'
+    assert registry.find_by_path('/w/b') == 'b'
+    assert registry.matches('a', '/w/a') and not registry.matches('a', '/w/b')
+
+    registry.register('b', '/w/b', '/w/b/repo/project')
+    assert registry.find_by_path('/w/b/repo/project') == 'b'
+    registry.sync({'b': {'workspace': '/w/b2', 'repo_path': None}})
+    assert 'a' not in registry and registry.find_by_path('/w/a') is None
+    assert registry.find_by_path('/w/b') is None and registry.find_by_path('/w/b2') == 'b'
+
+
+def test_path_cache_only_memoizes_absolute_paths(tmp_path, monkeypatch):
+    """Test that relative paths follow the working directory and the cache stays bounded."""
+    cache = CanonicalPathCache(maxsize=2)
+    for name in ['a', 'b', 'c', 'a']:
+        assert cache.canonical(str(tmp_path / name)) == str((tmp_path / name).resolve())
+    assert len(cache) == 2 and cache.hits == 0
+
+    monkeypatch.chdir(tmp_path)
+    assert cache.canonical('rel') == str((tmp_path / 'rel').resolve())
+    assert len(cache) == 2
+
+
+def test_session_association_does_not_read_tasks_file(tmp_path, monkeypatch):
+    """Test that a new session finds its agent through the index, not load_tasks()."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    repo_path = tmp_path / "agent_1" / "repo" / "project"
+    orchestrator.save_tasks({
+        'tasks': ['Fix the bug'],
+        'agents': {
+            f'agent-{i}': {'task': 'Fix the bug', 'workspace': str(tmp_path / f"agent_{i}"),
+                           'repo_path': str(tmp_path / f"agent_{i}" / "repo" / "project")}
+            for i in range(50)
+        },
+        'repository_url': ''
+    })
+
+    def fail():
+        pytest.fail("load_tasks() called while associating a session")
+    monkeypatch.setattr(orchestrator, "load_tasks", fail)
+
+    session = orchestrator.AiderSession(str(repo_path), "Fix the bug")
+    assert session.agent_id == 'agent-1'
+    assert orchestrator.validate_agent_paths('agent-1', str(repo_path))
+    assert not orchestrator.validate_agent_paths('agent-2', str(repo_path))
@@ -0,0 +1,86 @@
+import pytest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from service import OrchestratorService, ServiceError, last_output_line, page_agents
+
+
+def test_last_output_line_skips_blank_lines_and_escapes():
+    """Test that the preview is the last visible line without ANSI color codes."""
+    assert last_output_line("first\n\x1b[32mApplied edit to main.py\x1b[0m\n\n  \n") == "Applied edit to main.py"
+    assert last_output_line("x" * 500, max_chars=10) == "x" * 10
+    assert last_output_line("") == ""
+
+
+def test_page_agents_filters_sorts_and_counts():
+    """Test status filtering, stable ordering and counts over all agents."""
+    agents = {
+        f'agent-{i}': {'status': status, 'created_at': f'2024-01-01T00:00:0{i}'}
+        for i, status in reversed(list(enumerate(['error', 'pending', 'in_progress', 'stalled', 'in_progress'])))
+    }
+    page = page_agents(agents, status='error,stalled', offset=0, limit=10)
+    assert [agent_id for agent_id, _ in page['agents']] == ['agent-0', 'agent-3']
+    assert page['total'] == 2
+    assert page['counts'] == {'error': 1, 'pending': 1, 'in_progress': 2, 'stalled': 1}
+
+    page = page_agents(agents, offset=1, limit=2)
+    assert [agent_id for agent_id, _ in page['agents']] == ['agent-1', 'agent-2'] and page['total'] == 5
+
+
+def test_summary_omits_output_and_detail_includes_it(tmp_path, monkeypatch):
+    """Test that summaries carry only a preview and the detail op returns the full output."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(orchestrator, "aider_sessions", {})
+    output = "Working on it\n" * 1000 + "Done.\n"
+    orchestrator.save_tasks({
+        'tasks': ['Fix the bug'],
+        'agents': {
+            'agent-1': {'task': 'Fix the bug', 'status': 'in_progress', 'aider_output': output,
+                        'created_at': '2024-01-01T00:00:00'},
+            'agent-2': {'task': 'Fix the bug', 'status': 'pending', 'created_at': '2024-01-01T00:00:01',
+                        'error_details': {'error_count': 3}}
+        },
+        'repository_url': ''
+    })
+    service = OrchestratorService(orchestrator)
+
+    summary = service.handle('agent_summary', {'status': 'in_progress'})
+    assert summary['total'] == 1 and summary['counts'] == {'in_progress': 1, 'pending': 1}
+    agent = summary['agents'][0]
+    assert 'aider_output' not in agent
+    assert agent['last_line'] == 'Done.' and agent['output_chars'] == len(output)
+    # Error details are saved with the agent
+    assert service.handle('agent_summary', {'status': 'pending'})['agents'][0]['error_count'] == 3
+
+    detail = service.handle('agent_detail', {'agent_id': 'agent-1'})
+    assert detail['aider_output'] == output and detail['agent_id'] == 'agent-1'
+    with pytest.raises(ServiceError) as exc_info:
+        service.handle('agent_detail', {'agent_id': 'agent-9'})
+    assert exc_info.value.status == 404
+
+
+def test_agent_output_ranges(tmp_path, monkeypatch):
+    """Test offset/limit and tail ranges and that the generation follows the content."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(orchestrator, "aider_sessions", {})
+    orchestrator.save_tasks({
+        'tasks': ['Fix the bug'],
+        'agents': {'agent-1': {'task': 'Fix the bug', 'status': 'completed', 'aider_output': '0123456789'}},
+        'repository_url': ''
+    })
+    service = OrchestratorService(orchestrator)
+
+    result = service.handle('agent_output', {'agent_id': 'agent-1', 'offset': 2, 'limit': 3})
+    assert (result['data'], result['offset'], result['end'], result['total']) == ('234', 2, 5, 10)
+    assert service.handle('agent_output', {'agent_id': 'agent-1', 'tail': 4, 'offset': 1})['data'] == '6789'
+    past_end = service.handle('agent_output', {'agent_id': 'agent-1', 'offset': 50})
+    assert (past_end['data'], past_end['offset'], past_end['end']) == ('', 10, 10)
+
+    tasks_data = orchestrator.load_tasks()
+    tasks_data['agents']['agent-1']['aider_output'] = 'abcdefghij'
+    orchestrator.save_tasks(tasks_data)
+    assert service.handle('agent_output', {'agent_id': 'agent-1'})['generation'] != result['generation']
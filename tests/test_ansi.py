@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.ansi import AnsiConverter, TerminalStreams, convert_output, segments_text
+
+
+def test_converter_styles_and_lines():
+    """Test that SGR codes become classes, other escapes are dropped and lines are split."""
+    lines, cleared = AnsiConverter().feed("plain \x1b[1;31mred\x1b[0m done\x1b[2K\nnext \x1b[92mgreen")
+    assert lines == [['plain ', ['red', 'b f1'], ' done'], ['next ', ['green', 'f10']]]
+    assert not cleared
+    assert convert_output("a\n\x1b]0;title\x07b\n") == ([['a'], ['b'], []], 0)
+
+
+def test_converter_carries_state_across_chunks():
+    """Test that a split escape sequence and the current style survive chunk boundaries."""
+    converter = AnsiConverter()
+    assert converter.feed("one \x1b[3") == ([['one ']], False)
+    assert converter.feed("3mtwo\n") == ([[['two', 'f3']], []], False)
+    assert converter.feed("three") == ([[['three', 'f3']]], False)
+
+
+def test_unterminated_escape_is_not_held_back_forever():
+    """Test that a partial escape sequence longer than the limit is flushed as text."""
+    converter = AnsiConverter()
+    assert converter.feed("\x1b]0;" + "x" * 3000) == ([[]], False)
+    lines, _ = converter.feed("y" * 2000)
+    assert segments_text(lines[0]) == "]0;" + "x" * 3000 + "y" * 2000
+    assert converter._pending == ''
+    assert converter.feed("\x1b[31mred") == ([[['red', 'f1']]], False)
+
+
+def test_carriage_return_overwrites_line():
+    """Test that progress output rewritten with \\r keeps only the latest text."""
+    converter = AnsiConverter()
+    assert converter.feed("10%\r50%\r") == ([['50%']], True)
+    assert converter.feed("100%\r\n") == ([['100%'], []], True)
+    assert converter.feed("done") == ([['done']], False)
+
+
+def test_terminal_streams_restart_on_gap():
+    """Test that a delta that does not continue the stream starts with a fresh style."""
+    streams = TerminalStreams()
+    first = streams.convert('agent-1', 0, "\x1b[31mred\n")
+    assert (first['offset'], first['end']) == (0, 9)
+    assert streams.convert('agent-1', 9, "still red\n")['lines'][0] == [['still red', 'f1']]
+    assert streams.convert('agent-1', 500, "after gap\n")['lines'][0] == ['after gap']
+    assert segments_text(first['lines'][0]) == 'red'
@@ -0,0 +1,198 @@
+import pytest
+import sys
+import time
+import queue
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import coordinator as coordinator_module
+from coordinator import Coordinator, merge_worker_metrics
+from service import OUTPUT_TOPIC, RemoteBackend, ServiceError, page_agents
+from utils.ipc import IpcServer, format_address
+
+
+class StubWorker:
+    """Answers the worker side of the protocol on a localhost TCP port"""
+
+    def __init__(self, worker_id, slots, running=0, repos=()):
+        self.worker_id = worker_id
+        self.slots = slots
+        self.running = running
+        self.repos = set(repos)
+        self.agents = {}
+        self.server = IpcServer('127.0.0.1:0', self.handle)
+        self.server.start()
+
+    @property
+    def address(self):
+        return format_address(self.server.address)
+
+    def handle(self, method, params):
+        if method == 'create_agents':
+            agent_ids = [f"{self.worker_id}-{len(self.agents) + i}" for i in range(params['num_agents'])]
+            for agent_id in agent_ids:
+                self.agents[agent_id] = {'task': params['tasks'][0], 'status': 'pending'}
+            self.running += len(agent_ids)
+            self.repos.add(params['repository_url'])
+            return {'agent_ids': agent_ids}
+        if method == 'delete_agent':
+            if params['agent_id'] not in self.agents:
+                raise ServiceError(f"Agent {params['agent_id']} not found", 404)
+            del self.agents[params['agent_id']]
+            return {'agent_id': params['agent_id']}
+        if method == 'get_tasks':
+            return {'tasks': sorted({a['task'] for a in self.agents.values()}), 'agents': self.agents}
+        if method == 'agent_summary':
+            page = page_agents(self.agents, params['status'], params['offset'], params['limit'])
+            return dict(page, agents=[{'agent_id': agent_id, 'status': agent['status'],
+                                       'created_at': agent.get('created_at')} for agent_id, agent in page['agents']])
+        if method == 'metrics':
+            return {'text': '# HELP agents_running Running agents\n# TYPE agents_running gauge\n'
+                            f'agents_running {self.running}\n'}
+        raise ServiceError(f'Unknown method: {method}', 404)
+
+    def heartbeat(self, coordinator):
+        coordinator.handle('register_worker', {
+            'worker_id': self.worker_id, 'address': self.address, 'slots': self.slots,
+            'running': self.running, 'repos': sorted(self.repos), 'agent_ids': list(self.agents)
+        })
+
+
+@pytest.fixture
+def cluster():
+    coordinator = Coordinator('127.0.0.1:0')
+    coordinator.start()
+    workers = []
+
+    def add_worker(*args, **kwargs):
+        worker = StubWorker(*args, **kwargs)
+        worker.heartbeat(coordinator)
+        workers.append(worker)
+        return worker
+
+    yield coordinator, add_worker
+    coordinator.shutdown()
+    for worker in workers:
+        worker.server.shutdown()
+
+
+def test_placement_prefers_free_capacity_and_cached_repository(cluster):
+    """Test that agents go to the least loaded worker, with a bonus for a warm repo cache."""
+    coordinator, add_worker = cluster
+    busy = add_worker('busy', slots=4, running=3)
+    idle = add_worker('idle', slots=10, running=2)
+    warm = add_worker('warm', slots=4, running=1, repos=['https://github.com/test/repo'])
+
+    created = coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                                   'tasks': ['Fix the bug'], 'num_agents': 1})
+    assert created['agent_ids'] == ['warm-0']
+
+    created = coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/other',
+                                                   'tasks': ['Add docs'], 'num_agents': 3})
+    assert created['agent_ids'] == ['idle-0', 'idle-1', 'idle-2']
+    assert not busy.agents
+
+    # Fill the remaining slots (busy 1, idle 5, warm 2), then run out of capacity
+    created = coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                                   'tasks': ['More work'], 'num_agents': 8})
+    assert len(created['agent_ids']) == 8
+    assert (len(busy.agents), len(idle.agents), len(warm.agents)) == (1, 8, 3)
+    with pytest.raises(ServiceError) as excinfo:
+        coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                             'tasks': ['One more'], 'num_agents': 1})
+    assert excinfo.value.status == 503
+
+
+def test_racing_agents_are_placed_on_one_worker(cluster):
+    """Test that the agents of a raced task share a worker, so one worker judges the race."""
+    coordinator, add_worker = cluster
+    first = add_worker('first', slots=4)
+    second = add_worker('second', slots=4)
+    coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                         'tasks': ['Spread'], 'num_agents': 2})
+    assert (len(first.agents), len(second.agents)) == (1, 1)
+
+    created = coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                                   'tasks': ['Race'], 'num_agents': 3,
+                                                   'race': {'test_command': 'pytest -q'}})
+    assert len({agent_id.rsplit('-', 1)[0] for agent_id in created['agent_ids']}) == 1
+
+
+def test_calls_are_routed_to_the_owning_worker(cluster):
+    """Test that agent operations reach the worker that runs the agent."""
+    coordinator, add_worker = cluster
+    first = add_worker('first', slots=2, running=2)
+    second = add_worker('second', slots=2)
+    agent_id = coordinator.handle('create_agents', {'repository_url': 'https://github.com/test/repo',
+                                                    'tasks': ['Fix the bug'], 'num_agents': 1})['agent_ids'][0]
+    assert agent_id in second.agents
+
+    tasks = coordinator.handle('get_tasks', {})
+    assert tasks['agents'][agent_id]['worker_id'] == 'second'
+
+    assert coordinator.handle('delete_agent', {'agent_id': agent_id}) == {'agent_id': agent_id}
+    assert not second.agents and not first.agents
+    with pytest.raises(ServiceError) as excinfo:
+        coordinator.handle('delete_agent', {'agent_id': agent_id})
+    assert excinfo.value.status == 404
+
+    metrics = coordinator.handle('metrics', {})['text']
+    assert metrics.count('# TYPE agents_running gauge') == 1
+    assert 'agents_running{worker_id="first"} 2' in metrics
+
+
+def test_agent_summary_pages_across_workers(cluster):
+    """Test that summary pages are cut from the merged, ordered agents of all workers."""
+    coordinator, add_worker = cluster
+    first = add_worker('first', slots=4)
+    second = add_worker('second', slots=4)
+    for i in range(6):
+        worker = first if i % 2 else second
+        worker.agents[f'agent-{i}'] = {'status': 'error' if i == 3 else 'in_progress',
+                                       'created_at': f'2024-01-01T00:00:0{i}'}
+
+    page = coordinator.handle('agent_summary', {'offset': 2, 'limit': 3})
+    assert [s['agent_id'] for s in page['agents']] == ['agent-2', 'agent-3', 'agent-4']
+    assert [s['worker_id'] for s in page['agents']] == ['second', 'first', 'second']
+    assert page['total'] == 6 and page['counts'] == {'in_progress': 5, 'error': 1}
+
+    page = coordinator.handle('agent_summary', {'status': 'error', 'offset': 0, 'limit': 10})
+    assert [s['agent_id'] for s in page['agents']] == ['agent-3'] and page['total'] == 1
+
+
+def test_worker_output_is_fanned_in(cluster):
+    """Test that a web tier subscribed to the coordinator receives every worker's output."""
+    coordinator, add_worker = cluster
+    workers = [add_worker(f'w{i}', slots=1) for i in range(2)]
+    backend = RemoteBackend(format_address(coordinator.ipc.address))
+    backend.start()
+
+    received = {}
+    deadline = time.time() + 10
+    while len(received) < 2 and time.time() < deadline:
+        for worker in workers:
+            worker.server.publish(OUTPUT_TOPIC, {'agent_id': f'{worker.worker_id}-0', 'last_line': 'ok'})
+        try:
+            update = backend.output_queue.get(timeout=0.1)
+            received[update['worker_id']] = update['agent_id']
+        except queue.Empty:
+            continue
+    backend.client.close()
+    assert received == {'w0': 'w0-0', 'w1': 'w1-0'}
+
+
+def test_merge_worker_metrics_labels_samples():
+    """Test that worker metrics are grouped per family and labelled with the worker id."""
+    text = '# HELP x X\n# TYPE x counter\nx{kind="a"} 1\nx_total 2\n'
+    merged = merge_worker_metrics({'a': text, 'b': text})
+    assert merged.count('# HELP x X') == 1
+    assert 'x{worker_id="b",kind="a"} 1' in merged
+    assert 'x_total{worker_id="a"} 2' in merged
+
+
+def test_public_listen_address_requires_token(monkeypatch):
+    """Test that the coordinator refuses to serve a reachable TCP port without a token."""
+    monkeypatch.delenv('ORCHESTRATOR_TOKEN', raising=False)
+    assert coordinator_module.main(['--listen', '0.0.0.0:0']) == 2
@@ -0,0 +1,82 @@
+import pytest
+import sys
+import json
+import queue
+import subprocess
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from daemon import OrchestratorDaemon, parse_import_time
+from service import RemoteBackend, ServiceError
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """A daemon on a temporary socket backed by a temporary tasks file"""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(orchestrator, "output_queue", queue.Queue())
+    orchestrator.save_tasks({
+        'tasks': ['Fix the bug'],
+        'agents': {'agent-1': {'task': 'Fix the bug', 'status': 'pending', 'workspace': str(tmp_path / "agent_1")}},
+        'repository_url': 'https://github.com/test/repo'
+    })
+    server = OrchestratorDaemon(orchestrator, str(tmp_path / "orchestrator.sock"))
+    server.start()
+    yield server
+    server.shutdown()
+
+
+def test_remote_backend_lists_and_deletes_agents(daemon):
+    """Test control calls from a web worker backend to the daemon."""
+    backend = RemoteBackend(daemon.socket_path)
+    listed = backend.call('list_agents')
+    assert [a['agent_id'] for a in listed] == ['agent-1']
+    assert listed[0]['session_alive'] is False
+
+    assert backend.call('delete_agent', agent_id='agent-1') == {'agent_id': 'agent-1'}
+    assert backend.call('get_tasks')['agents'] == {}
+    with pytest.raises(ServiceError) as excinfo:
+        backend.call('delete_agent', agent_id='agent-1')
+    assert excinfo.value.status == 404
+
+
+def test_remote_backend_receives_output_updates(daemon):
+    """Test that orchestrator output updates reach subscribed web workers."""
+    backend = RemoteBackend(daemon.socket_path)
+    backend.start()
+    update = {'agent_id': 'agent-1', 'output_chars': 23, 'last_line': 'Applied edit to app.py'}
+    for _ in range(50):
+        orchestrator.output_queue.put(update)
+        try:
+            assert backend.output_queue.get(timeout=0.1) == update
+            break
+        except queue.Empty:
+            continue
+    else:
+        pytest.fail("No output update received from the daemon")
+    backend.client.close()
+
+
+def test_importing_orchestrator_skips_heavy_modules():
+    """Test that litellm and Flask are not imported with the orchestrator."""
+    code = "import sys, orchestrator; print(sorted(m for m in ('litellm', 'flask') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.replace("'", '"')) == []
+
+
+def test_parse_import_time():
+    """Test parsing of -X importtime output."""
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   json.decoder\n"
+        "import time:       300 |        420 | json\n"
+    )
+    entries = parse_import_time(stderr)
+    assert entries == [
+        {'module': 'json.decoder', 'depth': 1, 'self_us': 120, 'cumulative_us': 120},
+        {'module': 'json', 'depth': 0, 'self_us': 300, 'cumulative_us': 420},
+    ]
@@ -0,0 +1,54 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.dep_cache import DependencyCache, detect_manifests, dependency_env
+from conftest import git
+
+
+def make_checkout(root, requirements):
+    checkout = root / "project"
+    checkout.mkdir(parents=True)
+    git('init', '-q', cwd=checkout)
+    (checkout / "requirements.txt").write_text(requirements)
+    (checkout / "requirements-dev.txt").write_text("# test tools\n")
+    return checkout
+
+
+def test_detect_manifests(tmp_path):
+    """Test that requirement includes and pyproject dependencies are part of the Python manifests."""
+    checkout = make_checkout(tmp_path, "-e .\n-r requirements-dev.txt\n")
+    (checkout / "pyproject.toml").write_text('[project]\nname = "p"\ndependencies = ["requests"]\n')
+    (checkout / "package.json").write_text('{}')
+    manifests = detect_manifests(checkout)
+    assert [p.name for p in manifests['python']] == ['requirements.txt', 'requirements-dev.txt', 'pyproject.toml']
+    assert 'node' not in manifests
+    (checkout / "package-lock.json").write_text('{}')
+    assert [p.name for p in detect_manifests(checkout)['node']] == ['package.json', 'package-lock.json']
+
+
+def test_environment_is_built_once_and_linked(tmp_path):
+    """Test that agents with the same manifests share one read-only environment."""
+    cache = DependencyCache(tmp_path / "cache")
+    first = make_checkout(tmp_path / "agent1", "-e .\n-r requirements-dev.txt\n")
+    second = make_checkout(tmp_path / "agent2", "-e .\n-r requirements-dev.txt\n")
+
+    env, hit = cache.ensure('python', detect_manifests(first)['python'])
+    assert env is not None and not hit
+    assert cache.ensure('python', detect_manifests(second)['python']) == (env, True)
+    if os.geteuid() != 0:
+        assert not os.access(env, os.W_OK)
+
+    link = cache.link('python', env, second)
+    assert link.is_symlink() and link.resolve() == env.resolve()
+    assert git('status', '--porcelain', '--untracked-files=all', cwd=second).count('.venv') == 0
+    assert cache.link('python', env, second) is None
+
+    environ = dependency_env(second, {'PATH': '/usr/bin'})
+    assert environ['PATH'].split(os.pathsep)[0] == str(second / ".venv" / "bin")
+
+    (first / "requirements-dev.txt").write_text("# other test tools\n")
+    assert cache.key('python', detect_manifests(first)['python']) != env.name
@@ -0,0 +1,84 @@
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.detached import DetachedProcess, DETACHED_SUPPORTED
+from utils.pty_utils import OutputDecoder
+
+pytestmark = pytest.mark.skipif(not DETACHED_SUPPORTED, reason="detached processes need Linux")
+
+ECHO_CMD = 'while read line; do echo "got $line"; done'
+
+
+def read_until(process, text, timeout=5):
+    output = ''
+    deadline = time.time() + timeout
+    while text not in output and time.time() < deadline:
+        output += process.read_chunk(timeout=0.02) or ''
+    return output
+
+
+def test_detached_process_survives_reattach(tmp_path):
+    """Test that a new handle picks up the process and its log where the old one stopped."""
+    process = DetachedProcess.launch(ECHO_CMD, str(tmp_path / "session"))
+    process.stdin.write("first\n")
+    assert "got first" in read_until(process, "got first")
+    process.close()
+    assert process.poll() is None
+
+    attached = DetachedProcess.attach(process.to_dict())
+    assert attached is not None and attached.pid == process.pid
+    attached.stdin.write("second\n")
+    output = read_until(attached, "got second")
+    assert "got second" in output and "got first" not in output
+
+    attached.terminate()
+    assert attached.wait(timeout=5) is not None
+    assert DetachedProcess.attach(process.to_dict()) is None
+
+
+def test_reattach_sessions_restores_output(tmp_path, monkeypatch):
+    """Test that a restarted orchestrator rebuilds aider_sessions from persisted process info."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(orchestrator, "aider_sessions", {})
+    process = DetachedProcess.launch(ECHO_CMD, str(tmp_path / "session"))
+    process.stdin.write("before restart\n")
+    read_until(process, "got before restart")
+    process.close()
+    orchestrator.save_tasks({
+        'tasks': ['Fix the bug'],
+        'agents': {'agent-1': {'task': 'Fix the bug', 'status': 'in_progress', 'repo_path': str(tmp_path),
+                               'process': process.to_dict()}},
+        'repository_url': ''
+    })
+
+    assert orchestrator.reattach_sessions() == ['agent-1']
+    aider_session = orchestrator.aider_sessions['agent-1']
+    try:
+        assert aider_session.get_output() == "got before restart\n"
+        assert aider_session.send_message("after restart")
+        deadline = time.time() + 5
+        while "got after restart" not in aider_session.get_output() and time.time() < deadline:
+            time.sleep(0.02)
+        assert aider_session.get_output() == "got before restart\ngot after restart\n"
+    finally:
+        aider_session.cleanup()
+    assert not (tmp_path / "session").exists()
+    assert orchestrator.reattach_sessions() == []
+
+
+def test_crlf_is_normalized_across_chunks_and_reattach(tmp_path):
+    """Test that a CRLF split between reads, or at the reattach offset, still becomes one LF."""
+    decoder = OutputDecoder()
+    assert decoder.decode(b"one\r") + decoder.decode(b"\ntwo\rthree\r\n") == "one\ntwo\rthree\n"
+
+    session_dir = tmp_path / "session"
+    session_dir.mkdir()
+    (session_dir / "output.log").write_bytes(b"before\r\nsplit\r\nafter\r\n")
+    process = DetachedProcess(None, str(session_dir), None, offset=len(b"before\r\nsplit\r"))
+    assert process.restore_output() + process.read_chunk(timeout=0) == "before\nsplit\nafter\n"
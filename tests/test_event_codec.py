@@ -0,0 +1,40 @@
+import sys
+import datetime
+from pathlib import Path
+
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.event_codec import EventCodec, epoch_ms
+
+
+def test_handles_are_announced_once():
+    """Test that each agent gets one handle and only its first event announces it."""
+    codec = EventCodec()
+    first, announce = codec.encode({'agent_id': 'agent-a', 'status': 'in_progress'})
+    assert first == {'h': 1, 'status': 'in_progress'} and announce == [[1, 'agent-a']]
+    assert codec.encode({'agent_id': 'agent-a'}) == ({'h': 1}, None)
+    assert codec.encode({'agent_id': 'agent-b'})[1] == [[2, 'agent-b']]
+    assert codec.handles() == [[1, 'agent-a'], [2, 'agent-b']]
+
+
+def test_compact_payload_survives_msgpack_packets():
+    """Test that compact events encode as Socket.IO msgpack packets and are smaller than JSON."""
+    event = {
+        'agent_id': 'agent-00001', 'offset': 120, 'end': 160, 'lines': [[['Applied edit', 'b f2'], ' to main.py'], []],
+        'cleared': False, 'last_line': 'Applied edit to main.py', 'status_reason': None,
+        'timestamp': '2024-01-01T12:00:00.250000'
+    }
+    compact, _ = EventCodec().encode(event)
+    assert compact['ts'] == int(datetime.datetime(2024, 1, 1, 12, 0, 0, 250000).timestamp() * 1000)
+    assert 'status_reason' not in compact and compact['cleared'] is False
+
+    encoded = MsgPackPacket(packet.EVENT, data=['output_delta', compact], namespace='/agents').encode()
+    decoded = MsgPackPacket(encoded_packet=encoded)
+    assert decoded.data == ['output_delta', compact]
+    json_size = len(packet.Packet(packet.EVENT, data=['output_delta', event], namespace='/agents').encode().encode())
+    assert len(encoded) < json_size
+    assert epoch_ms('not a timestamp') is None
@@ -0,0 +1,158 @@
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.fingerprint import DuplicateDetector, normalized_changes, similarity
+from conftest import git
+
+SOLUTION = """def parse(text):
+    items = []
+    for line in text.splitlines():
+        if line.strip():
+            items.append(line.split('=', 1))
+    return dict(items)
+"""
+OTHER = """class Cache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+"""
+
+
+def make_agent(repo, files):
+    """An agent's checkout of a fresh repository with files committed on top of the base"""
+    base = git('rev-parse', 'HEAD', cwd=repo)
+    return repo, base, commit(repo, files)
+
+
+def commit(repo, files):
+    for path, content in files.items():
+        (repo / path).write_text(content)
+    git('add', '.', cwd=repo)
+    git('commit', '-q', '-m', 'work', cwd=repo)
+    return git('rev-parse', 'HEAD', cwd=repo)
+
+
+def test_normalized_changes_ignore_layout():
+    diff = ("diff --git a/p.py b/p.py\n--- a/p.py\n+++ b/p.py\n@@ -1,0 +2,2 @@\n"
+            "+    x  =  1\n+\n--- removed comment line\n")
+    assert normalized_changes(diff) == {'p.py': ['+ x = 1', '- -- removed comment line']}
+
+
+def test_similar_diffs_cluster_and_updates_are_incremental(upstream_repo):
+    """Test that the same change under another layout clusters, and new commits only hash changed files."""
+    detector = DuplicateDetector(threshold=0.8)
+    repo_a, base_a, head_a = make_agent(upstream_repo('a'), {'parser.py': SOLUTION, 'cache.py': OTHER})
+    repo_b, base_b, head_b = make_agent(upstream_repo('b'), {'parser.py': '\n' + SOLUTION.replace('    ', '  ')})
+    repo_c, base_c, head_c = make_agent(upstream_repo('c'), {'cache.py': OTHER.replace('entries', 'store')})
+    signature_a = detector.update('a', repo_a, base_a, head_a)
+    detector.update('b', repo_b, base_b, head_b)
+    detector.update('c', repo_c, base_c, head_c)
+    assert detector.files_hashed == 4
+    assert detector.clusters() == []
+
+    head_b = commit(repo_b, {'cache.py': OTHER})
+    assert similarity(signature_a, detector.update('b', repo_b, base_b, head_b)) == 1.0
+    assert detector.files_hashed == 4
+    assert detector.clusters() == [['a', 'b']] and detector.flagged == 2
+    detector.retain(['a', 'c'])
+    assert detector.clusters() == []
+
+
+def test_duplicates_are_flagged_and_paused(monkeypatch, upstream_repo):
+    """Test that the main loop pauses all but the oldest duplicate and resumes it if that agent fails."""
+    class Session:
+        def __init__(self):
+            self.paused = False
+
+        def pause(self):
+            self.paused = True
+            return True
+
+        def resume(self):
+            self.paused = False
+
+    agents = {}
+    for name, created_at in (('new', '2024-01-02'), ('old', '2024-01-01')):
+        repo, base, _ = make_agent(upstream_repo(name), {'parser.py': SOLUTION})
+        agents[name] = {'repo_path': str(repo), 'base_commit': base, 'status': 'in_progress', 'created_at': created_at}
+    sessions = {'new': Session(), 'old': Session()}
+    monkeypatch.setattr(orchestrator, 'aider_sessions', sessions)
+    monkeypatch.setattr(orchestrator, 'DUPLICATE_ACTION', 'pause')
+    monkeypatch.setattr(orchestrator, 'DUPLICATES', DuplicateDetector())
+
+    orchestrator.detect_duplicates({'agents': agents})
+    assert agents['old']['duplicates'] == ['new'] and agents['old']['status'] == 'in_progress'
+    assert agents['new']['status'] == 'paused' and agents['new']['duplicate_of'] == 'old'
+    assert sessions['new'].paused and not sessions['old'].paused
+
+    agents['old']['status'] = 'error'
+    orchestrator.detect_duplicates({'agents': agents})
+    assert agents['new']['status'] == 'in_progress' and not sessions['new'].paused
+    assert 'duplicate_of' not in agents['new']
+    orchestrator.detect_duplicates({'agents': agents})
+    assert agents['new']['status'] == 'in_progress'
+
+
+def test_only_agents_similar_to_the_keeper_are_paused(monkeypatch):
+    """Test that an agent linked to the keeper only through another agent keeps running."""
+    class Session:
+        def pause(self):
+            return True
+
+    detector = DuplicateDetector(threshold=0.8)
+    # a~b and b~c are 0.81 similar, a~c only 0.62
+    signatures = {'a': [0] * 64, 'b': [0] * 52 + [1] * 12, 'c': [0] * 40 + [1] * 24}
+    detector._agents = {agent_id: (('base', agent_id), signature) for agent_id, signature in signatures.items()}
+    detector.updated_at = time.monotonic()
+    agents = {agent_id: {'status': 'in_progress', 'created_at': f'2024-01-0{i + 1}'}
+              for i, agent_id in enumerate(signatures)}
+    monkeypatch.setattr(orchestrator, 'aider_sessions', {agent_id: Session() for agent_id in agents})
+    monkeypatch.setattr(orchestrator, 'DUPLICATE_ACTION', 'pause')
+    monkeypatch.setattr(orchestrator, 'DUPLICATES', detector)
+
+    orchestrator.detect_duplicates({'agents': agents})
+    assert agents['a']['duplicates'] == ['b', 'c']
+    assert agents['b']['status'] == 'paused' and agents['c']['status'] == 'in_progress'
+
+
+def test_heads_are_read_once_per_interval(monkeypatch, upstream_repo):
+    """Test that agent HEADs are only read again after DUPLICATE_INTERVAL."""
+    repo, base, _ = make_agent(upstream_repo('a'), {'parser.py': SOLUTION})
+    agents = {'a': {'repo_path': str(repo), 'base_commit': base, 'status': 'in_progress'}}
+    reads = []
+    monkeypatch.setattr(orchestrator, 'head_commit', lambda path: reads.append(path) or git('rev-parse', 'HEAD', cwd=path))
+    monkeypatch.setattr(orchestrator, 'DUPLICATES', DuplicateDetector())
+    monkeypatch.setattr(orchestrator, 'DUPLICATE_INTERVAL', 60)
+    orchestrator.detect_duplicates({'agents': agents})
+    orchestrator.detect_duplicates({'agents': agents})
+    assert len(reads) == 1
+
+    orchestrator.DUPLICATES.updated_at -= 60
+    orchestrator.detect_duplicates({'agents': agents})
+    assert len(reads) == 2
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="process groups are POSIX only")
+def test_pipe_sessions_lead_their_own_process_group(monkeypatch, tmp_path):
+    """Test that pausing a pipe session can stop the whole group, not just the shell."""
+    monkeypatch.setattr(orchestrator, 'check_aider_installation', lambda toolchain=None: True)
+    monkeypatch.setattr(orchestrator.toolchain_registry, 'get', lambda toolchain=None: SimpleNamespace(executable='aider'))
+    process = orchestrator.start_aider_session(tmp_path, cmd_override='sleep 30')
+    try:
+        assert os.getpgid(process.pid) == process.pid
+    finally:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
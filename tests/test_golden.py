@@ -0,0 +1,87 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import golden as golden_module
+from utils.golden import GoldenCheckouts, overlay_mounts, repository_name
+from conftest import git
+
+real_git = golden_module._git
+
+
+@pytest.fixture
+def upstream(upstream_repo):
+    """A local repository with one commit, cloned by URL like a remote"""
+    return upstream_repo("upstream/project.git", {'main.py': "print('hello')\n"})
+
+
+def test_repository_name():
+    assert repository_name('https://github.com/org/project.git') == 'project'
+    assert repository_name('git@github.com:org/project') == 'project'
+    assert repository_name('/srv/repos/project.git/') == 'project'
+
+
+def test_golden_checkout_is_reused_and_checkouts_are_independent(tmp_path, upstream):
+    """Test that one golden checkout serves many agents, each with its own editable working tree."""
+    golden_checkouts = GoldenCheckouts(tmp_path / "golden")
+    golden = golden_checkouts.prepare(str(upstream))
+    assert golden.name == 'project' and (golden / "main.py").exists()
+    assert golden_checkouts.prepare(str(upstream)) == golden
+
+    workspace = tmp_path / "agent_1_"
+    (workspace / "repo").mkdir(parents=True)
+    dest = workspace / "repo" / golden.name
+    method = golden_checkouts.materialize(golden, dest, workspace, mode='hardlink')
+    assert method == 'hardlink'
+
+    objects = [p for p in (dest / ".git" / "objects").rglob('*') if p.is_file()]
+    assert objects and all(p.stat().st_nlink > 1 for p in objects)
+    assert git('status', '--porcelain', cwd=dest) == ''
+    assert git('remote', 'get-url', 'origin', cwd=dest).strip() == str(upstream)
+
+    (dest / "main.py").write_text("print('changed')\n")
+    git('checkout', '-q', '-b', 'agent-1', cwd=dest)
+    assert (golden / "main.py").read_text() == "print('hello')\n"
+    assert 'main.py' in git('status', '--porcelain', cwd=dest)
+    assert git('status', '--porcelain', cwd=golden) == ''
+
+
+def test_remote_head_is_resolved_once_per_ttl(tmp_path, upstream, monkeypatch):
+    """Test that preparing checkouts for many agents asks the remote for its HEAD once."""
+    calls = []
+    monkeypatch.setattr(golden_module, '_git', lambda args, cwd=None: calls.append(args[0]) or real_git(args, cwd))
+    golden_checkouts = GoldenCheckouts(tmp_path / "golden", head_ttl=60)
+    first = golden_checkouts.prepare(str(upstream))
+    (upstream / "main.py").write_text("print('changed')\n")
+    git('commit', '-q', '-am', 'change', cwd=upstream)
+    assert all(golden_checkouts.prepare(str(upstream)) == first for _ in range(3))
+    assert calls.count('ls-remote') == 1
+
+    golden_checkouts.head_ttl = 0
+    assert golden_checkouts.prepare(str(upstream)) != first
+    assert calls.count('ls-remote') == 2
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux') or os.geteuid() != 0, reason="overlay mounts need root")
+def test_overlay_checkout_writes_only_changes(tmp_path, upstream):
+    """Test that an overlay checkout keeps changes in the workspace and unmounts on release."""
+    golden_checkouts = GoldenCheckouts(tmp_path / "golden")
+    golden = golden_checkouts.prepare(str(upstream))
+    workspace = tmp_path / "agent_2_"
+    (workspace / "repo").mkdir(parents=True)
+    dest = workspace / "repo" / golden.name
+    method = golden_checkouts.materialize(golden, dest, workspace, mode='overlay')
+    if method != 'overlay':
+        pytest.skip("overlayfs is not available")
+    try:
+        (dest / "main.py").write_text("print('changed')\n")
+        assert (workspace / ".overlay" / "upper" / "main.py").exists()
+        assert (golden / "main.py").read_text() == "print('hello')\n"
+    finally:
+        golden_checkouts.release(workspace)
+    assert overlay_mounts(str(workspace)) == []
@@ -0,0 +1,91 @@
+import pytest
+import sys
+import queue
+import threading
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.ipc import IpcClient, IpcError, IpcServer, listen_error
+
+
+class NotFound(Exception):
+    status = 404
+
+
+def handler(method, params):
+    if method == 'echo':
+        return params
+    if method == 'missing':
+        raise NotFound("no such agent")
+    raise RuntimeError("boom")
+
+
+@pytest.fixture
+def server(tmp_path):
+    ipc = IpcServer(str(tmp_path / "ipc.sock"), handler, subscriber_queue_size=2)
+    ipc.start()
+    yield ipc
+    ipc.shutdown()
+
+
+def test_request_response_and_errors(server):
+    """Test calls, error statuses and large payloads over one connection."""
+    client = IpcClient(server.address, timeout=5)
+    assert client.call('echo', text="x" * 1_000_000) == {'text': "x" * 1_000_000}
+    with pytest.raises(IpcError) as excinfo:
+        client.call('missing')
+    assert excinfo.value.status == 404
+    with pytest.raises(IpcError) as excinfo:
+        client.call('explode')
+    assert excinfo.value.status == 500
+    client.close()
+
+
+def test_publish_reaches_subscribers(server):
+    """Test that subscribers only receive topics they subscribed to."""
+    client = IpcClient(server.address, timeout=5)
+    received = queue.Queue()
+    client.subscribe(['output'], lambda topic, data: received.put((topic, data)))
+    for _ in range(100):
+        if server.subscriber_count:
+            break
+        threading.Event().wait(0.01)
+
+    server.publish('status', {'ignored': True})
+    server.publish('output', {'agent_id': 'a1'})
+    assert received.get(timeout=5) == ('output', {'agent_id': 'a1'})
+    client.close()
+
+
+def test_unreachable_server_is_unavailable(tmp_path):
+    """Test that a missing daemon surfaces as a 503 error."""
+    client = IpcClient(str(tmp_path / "missing.sock"), timeout=1)
+    with pytest.raises(IpcError) as excinfo:
+        client.call('echo')
+    assert excinfo.value.status == 503
+
+
+def test_tcp_transport_requires_token():
+    """Test TCP addresses, port 0 binding and token checks."""
+    ipc = IpcServer("127.0.0.1:0", handler, token="secret")
+    ipc.start()
+    try:
+        host, port = ipc.address
+        assert port != 0
+        assert IpcClient(f"{host}:{port}", timeout=5, token="secret").call('echo', n=1) == {'n': 1}
+        with pytest.raises(IpcError) as excinfo:
+            IpcClient(f"{host}:{port}", timeout=5, token="wrong").call('echo')
+        assert excinfo.value.status == 401
+    finally:
+        ipc.shutdown()
+
+
+def test_listening_beyond_loopback_needs_a_token():
+    """Test that only Unix sockets and loopback addresses may be served without a token."""
+    for address in ("/tmp/orchestrator.sock", "127.0.0.1:7700", "localhost:7700", "[::1]:7700"):
+        assert listen_error(address, None) is None
+    assert "ORCHESTRATOR_TOKEN" in listen_error("0.0.0.0:7700", None)
+    assert listen_error("coordinator-host:7700", None) is not None
+    assert listen_error("0.0.0.0:7700", "secret") is None
@@ -0,0 +1,81 @@
+import pytest
+import sys
+import json
+import logging
+import threading
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.logging_utils import SAMPLED, JsonFormatter, create_queue_handler, set_log_context, clear_log_context
+
+
+@pytest.fixture
+def queued_logger(tmp_path):
+    """A private logger writing JSON lines through a queue listener"""
+    log_file = tmp_path / "test.log"
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger(f"test_logging_utils.{id(log_file)}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    def build(**kwargs):
+        queue_handler, listener = create_queue_handler([file_handler], **kwargs)
+        logger.addHandler(queue_handler)
+        return listener
+
+    yield logger, log_file, build
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    file_handler.close()
+    clear_log_context()
+
+
+def read_entries(log_file):
+    return [json.loads(line) for line in log_file.read_text().splitlines()]
+
+
+def test_records_carry_thread_context_and_tracebacks(queued_logger):
+    """Test that per-thread agent context and exceptions survive the queue."""
+    logger, log_file, build = queued_logger
+    listener = build(sample_rate=0)
+
+    def reader():
+        set_log_context(agent_id="agent-1", session_id="abc")
+        logger.info("Started reading from stdout")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    thread.join()
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.error("Error processing output", exc_info=True)
+    listener.stop()
+
+    first, second = read_entries(log_file)
+    assert first['agent_id'] == "agent-1"
+    assert first['session_id'] == "abc"
+    assert first['message'] == "Started reading from stdout"
+    assert 'agent_id' not in second
+    assert "ValueError: boom" in second['exc_info']
+
+
+def test_sampling_limits_each_call_site(queued_logger):
+    """Test that a hot call site marked SAMPLED is rate limited while other records always pass."""
+    logger, log_file, build = queued_logger
+    listener = build(sample_rate=0.001, sample_burst=3)
+
+    for i in range(100):
+        logger.debug(f"Broadcasted update {i}", extra=SAMPLED)
+    for i in range(5):
+        logger.info(f"Created agent {i}")
+        logger.warning(f"Agent appears to be stalled {i}", extra=SAMPLED)
+    listener.stop()
+
+    entries = read_entries(log_file)
+    assert [e['message'] for e in entries if e['level'] == 'DEBUG'] == [f"Broadcasted update {i}" for i in range(3)]
+    assert len([e for e in entries if e['level'] == 'INFO']) == 5
+    assert len([e for e in entries if e['level'] == 'WARNING']) == 5
@@ -0,0 +1,59 @@
+import sys
+import threading
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.metrics import MetricsRegistry
+
+
+def test_counter_increments_from_many_threads_are_not_lost():
+    """Test that per-thread counter cells add up exactly."""
+    registry = MetricsRegistry()
+    counter = registry.counter("lines", "Lines read")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value() == 80000
+    rendered = registry.render()
+    assert "# TYPE lines_total counter" in rendered and "lines_total 80000" in rendered
+    # The cells of the finished threads were folded into the total
+    assert counter._shards._cells == []
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test histogram exposition with le buckets, sum and count."""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("save_seconds", "Save latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    rendered = registry.render()
+    assert 'save_seconds_bucket{le="0.1"} 2' in rendered
+    assert 'save_seconds_bucket{le="1.0"} 3' in rendered
+    assert 'save_seconds_bucket{le="+Inf"} 4' in rendered
+    assert "save_seconds_count 4" in rendered
+    assert "# TYPE save_seconds histogram" in rendered
+
+
+def test_labelled_and_callback_metrics():
+    """Test labelled children and metrics computed at scrape time."""
+    registry = MetricsRegistry()
+    transitions = registry.counter("transitions", "Status changes", ["from_status", "to_status"])
+    transitions.labels("pending", "error").inc(2)
+    registry.gauge("queue_depth", "Queue depth", function=lambda: 7)
+    registry.gauge("buffered", "Bytes buffered", ["agent_id"], function=lambda: {("a1",): 10})
+
+    rendered = registry.render()
+    assert 'transitions_total{from_status="pending",to_status="error"} 2' in rendered
+    assert "queue_depth 7" in rendered
+    assert 'buffered{agent_id="a1"} 10' in rendered
@@ -0,0 +1,96 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.racing import RaceJudge, RacePolicy, evaluate, head_commit
+from utils.verification import VerificationRunner
+from conftest import git
+
+
+def commit_file(repo, name):
+    (repo / name).write_text("done\n")
+    git('add', name, cwd=repo)
+    git('commit', '-q', '-m', f'add {name}', cwd=repo)
+    return git('rev-parse', 'HEAD', cwd=repo)
+
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        RacePolicy()
+    with pytest.raises(ValueError):
+        RacePolicy(test_command='true', on_win='ignore')
+    with pytest.raises(ValueError):
+        RacePolicy.from_dict({'test_command': 'true', 'min_score': 0.8})
+    policy = RacePolicy.from_dict({'test_command': 'true', 'min_score': None})
+    assert policy.to_dict()['on_win'] == 'cancel' and RacePolicy.from_dict(None) is None
+
+
+def test_evaluate_runs_command_on_the_commit(upstream_repo):
+    """Test that a commit is judged in a separate worktree, not in the agent's working tree."""
+    repo = upstream_repo("repo", branch='agent-1')
+    commit = commit_file(repo, "solution.txt")
+    assert head_commit(repo) == commit
+
+    policy = RacePolicy(test_command='test -f solution.txt && test ! -f scratch.txt')
+    (repo / "scratch.txt").write_text("uncommitted\n")
+    assert evaluate(repo, commit, policy)['passed']
+    failed = evaluate(repo, commit, RacePolicy(test_command='exit 3'))
+    assert not failed['passed'] and failed['returncode'] == 3
+    assert git('worktree', 'list', '--porcelain', cwd=repo).count('worktree ') == 1
+
+
+def test_judge_runs_test_commands_on_the_verifier_pool(upstream_repo):
+    """Test that a judge with a verifier stays within the verifier's worker bound."""
+    repo = upstream_repo("repo", branch='agent-1')
+    commit = commit_file(repo, "solution.txt")
+    verifier = VerificationRunner(max_workers=1)
+    judge = RaceJudge(verifier=verifier)
+    policy = RacePolicy(test_command='test -f solution.txt')
+    for agent_id in ('a', 'b'):
+        assert judge.submit(agent_id, repo, commit, policy, env={'PATH': f'/{agent_id}:/usr/bin:/bin'})
+
+    results = []
+    deadline = time.time() + 30
+    while len(results) < 2 and time.time() < deadline:
+        time.sleep(0.1)
+        results += judge.results()
+    assert sorted(agent_id for agent_id, _ in results) == ['a', 'b']
+    assert all(result['passed'] for _, result in results)
+    assert verifier.jobs_run == 2 and verifier._pool._max_workers == 1
+    assert judge._pool is None
+
+
+def test_first_passing_agent_wins_and_others_are_cancelled(upstream_repo):
+    """Test that the main loop's race judging records the winning branch and cancels the rest."""
+    agents = {}
+    for name in ('a', 'b'):
+        repo = upstream_repo(name, branch=f'agent-{name}')
+        agents[name] = {'repo_path': str(repo), 'branch': f'agent-{name}', 'base_commit': head_commit(repo),
+                        'race_id': 'race-1', 'status': 'in_progress'}
+    tasks_data = {'agents': agents, 'races': {'race-1': {
+        'task': 'add solution', 'policy': RacePolicy(test_command='test -f solution.txt').to_dict(),
+        'agent_ids': ['a', 'b'], 'winner': None, 'branch': None, 'commit': None
+    }}}
+
+    commit_file(Path(agents['b']['repo_path']), "notes.txt")
+    winning = commit_file(Path(agents['a']['repo_path']), "solution.txt")
+    orchestrator.judge_races(tasks_data)
+    deadline = time.time() + 30
+    while tasks_data['races']['race-1']['winner'] is None and time.time() < deadline:
+        time.sleep(0.1)
+        orchestrator.judge_races(tasks_data)
+
+    race = tasks_data['races']['race-1']
+    assert (race['winner'], race['branch'], race['commit']) == ('a', 'agent-a', winning)
+    assert agents['a']['status'] == 'completed' and agents['b']['status'] == 'cancelled'
+    assert not (agents['b'].get('evaluation') or {}).get('passed')
+    updates = []
+    while not orchestrator.output_queue.empty():
+        updates.append(orchestrator.output_queue.get())
+    assert {(u['agent_id'], u.get('status')) for u in updates} >= {('a', 'completed'), ('b', 'cancelled')}
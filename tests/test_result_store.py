@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.result_store import ResultStore, result_key
+from conftest import checkout, git
+
+URL = 'https://example.com/project.git'
+
+
+def test_result_key_normalization():
+    key = result_key(URL, 'abc', 'Fix  the\nparser ', 'mini@default')
+    assert key == result_key('https://example.com/project/', 'abc', 'Fix the parser', 'mini@default')
+    assert key != result_key(URL, 'abd', 'Fix the parser', 'mini@default')
+    assert key != result_key(URL, 'abc', 'Fix the parser', 'mini@v065')
+
+
+def test_recorded_result_is_reused_with_the_same_commits(tmp_path, monkeypatch, upstream_repo):
+    """Test that a verified agent's commits are stored and a resubmission gets the same commits."""
+    store = ResultStore(tmp_path / "results")
+    monkeypatch.setattr(orchestrator, 'TASK_RESULTS', store)
+    origin = upstream_repo("origin")
+    base = git('rev-parse', 'HEAD', cwd=origin)
+    first = checkout(origin, tmp_path / "first", 'agent-1')
+    (first / "parser.py").write_bytes(b"def parse():\r\n    return {}\n\x00")
+    git('add', '.', cwd=first)
+    git('commit', '-q', '-m', 'Add parser', cwd=first)
+    commit = git('rev-parse', 'HEAD', cwd=first)
+
+    agent = {'repo_path': str(first), 'base_commit': base, 'repository_url': URL, 'task': 'Add a parser',
+             'model': orchestrator.result_model(), 'branch': 'agent-1', 'status': 'in_progress',
+             'verification': {'commit': commit, 'status': 'passed', 'passed': True}}
+    orchestrator.record_results({'agents': {'a': agent}})
+    assert agent['result_commit'] == commit
+    assert git('for-each-ref', 'refs/results', cwd=first) == ''
+
+    second = checkout(origin, tmp_path / "second", 'agent-2')
+    reused = orchestrator.reuse_result(URL, base, ' Add  a parser', None, second)
+    assert reused['agent_id'] == 'a' and reused['outcome'] == 'verified'
+    assert git('rev-parse', 'HEAD', cwd=second) == commit
+    assert (second / "parser.py").read_bytes() == (first / "parser.py").read_bytes()
+    assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=second) == 'agent-2'
+    assert orchestrator.reuse_result(URL, base, 'Add a parser', 'v065', second) is None
+    assert orchestrator.result_model().startswith(orchestrator.AIDER_ARGS)
+
+
+def test_store_keeps_recently_used_results_within_bounds(tmp_path):
+    """Test that pruning drops old and least recently used results together with their bundles."""
+    store = ResultStore(tmp_path, max_results=2, max_age_days=30)
+    now = time.time()
+    for index, key in enumerate(('old', 'used', 'new', 'stale')):
+        for suffix in ('.json', '.bundle'):
+            (tmp_path / f"{key}{suffix}").write_text('{}')
+        os.utime(tmp_path / f"{key}.json", (now, now - index))
+    os.utime(tmp_path / "stale.json", (now, now - 31 * 86400))
+    os.utime(tmp_path / "old.json", (now, now - 100))
+
+    assert store.prune() == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['new.bundle', 'new.json', 'used.bundle', 'used.json']
@@ -0,0 +1,146 @@
+import copy
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.task_dag import new_dag, parse_tasks
+from conftest import checkout, git
+
+
+def test_parse_tasks_validation():
+    nodes = parse_tasks([{'id': 'ui', 'task': 'Build the UI', 'depends_on': ['core']},
+                         {'id': 'core', 'task': 'Build the core'}, 'Write docs'])
+    assert [node['id'] for node in nodes] == ['core', 'ui', 'task-3']
+    with pytest.raises(ValueError, match='cycle'):
+        parse_tasks([{'id': 'a', 'task': 'A', 'depends_on': 'b'}, {'id': 'b', 'task': 'B', 'depends_on': 'a'}])
+    with pytest.raises(ValueError, match='unknown'):
+        parse_tasks([{'id': 'a', 'task': 'A', 'depends_on': ['missing']}])
+    with pytest.raises(ValueError, match='Duplicate'):
+        parse_tasks([{'id': 'a', 'task': 'A'}, {'id': 'a', 'task': 'B'}])
+
+
+def test_dependent_task_starts_after_its_prerequisites(tmp_path, monkeypatch):
+    """Test that tasks run in dependency order from the prerequisites' commits, with timings."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    started = []
+
+    def fake_initialise(repository_url=None, task_description=None, start_from=None, **settings):
+        agent_id = f"agent-{len(started) + 1}"
+        started.append((task_description, start_from))
+        agent = {'task': task_description, 'status': 'in_progress', 'repo_path': f"/work/{agent_id}",
+                 'branch': f"branch-{agent_id}"}
+        orchestrator.save_created({'agents': {agent_id: agent}}, [agent_id])
+        return [agent_id]
+
+    monkeypatch.setattr(orchestrator, 'initialiseCodingAgent', fake_initialise)
+    dag_id = orchestrator.create_task_dag('https://example.com/repo.git', [
+        {'id': 'schema', 'task': 'Add the schema'},
+        {'id': 'api', 'task': 'Add the API'},
+        {'id': 'ui', 'task': 'Add the UI', 'depends_on': ['schema', 'api']},
+    ], race={'test_command': 'true'})
+    # The tasks without dependencies start on DAG_STARTER
+    for node_id in ('schema', 'api'):
+        orchestrator.dag_starts[(dag_id, node_id)].result(timeout=30)
+    assert [task for task, _ in started] == ['Add the schema', 'Add the API']
+
+    # Passes of the main loop, saved like it does while DAG_STARTER may be saving agents
+    tasks_data = orchestrator.load_tasks()
+    snapshot = copy.deepcopy(tasks_data)
+    orchestrator.schedule_dags(tasks_data, snapshot)
+    assert tasks_data['dags'][dag_id]['nodes']['api']['agent_ids'] == ['agent-2']
+    tasks_data['agents']['agent-1'].update(status='completed', evaluation={'passed': True, 'commit': 'a' * 40})
+    orchestrator.schedule_dags(tasks_data, snapshot)
+    orchestrator.save_changes(tasks_data, snapshot)
+    assert len(started) == 2
+    snapshot = copy.deepcopy(tasks_data)
+    tasks_data['agents']['agent-2'].update(verification={'passed': True, 'commit': 'b' * 40})
+    orchestrator.schedule_dags(tasks_data, snapshot)
+    orchestrator.save_changes(tasks_data, snapshot)
+    # The dependent task starts on DAG_STARTER and the next pass records it
+    orchestrator.dag_starts[(dag_id, 'ui')].result(timeout=30)
+    orchestrator.schedule_dags(tasks_data)
+
+    task, start_from = started[2]
+    assert task == 'Add the UI'
+    assert start_from == [{'repo_path': '/work/agent-1', 'branch': 'branch-agent-1', 'commit': 'a' * 40},
+                          {'repo_path': '/work/agent-2', 'branch': 'branch-agent-2', 'commit': 'b' * 40}]
+    assert tasks_data['agents']['agent-3']['dag_task'] == 'ui'
+    dag = tasks_data['dags'][dag_id]
+    assert dag['nodes']['ui']['state'] == 'running' and dag['nodes']['ui']['queue_wait_seconds'] >= 0
+
+    tasks_data['agents']['agent-3'].update(status='completed', result_commit='c' * 40)
+    orchestrator.schedule_dags(tasks_data)
+    dag = tasks_data['dags'][dag_id]
+    assert dag['finished_at'] and dag['critical_path'] == ['api', 'ui'] and dag['critical_path_seconds'] >= 0
+
+
+def test_failed_prerequisite_blocks_dependents():
+    dag = new_dag([{'id': 'a', 'task': 'A'}, {'id': 'b', 'task': 'B', 'depends_on': ['a']},
+                   {'id': 'c', 'task': 'C', 'depends_on': ['b']}])
+    dag['nodes']['a'].update(state='running', agent_ids=['x'])
+    orchestrator.schedule_dag({'agents': {'x': {'status': 'error'}}}, 'dag', dag)
+    assert [dag['nodes'][node]['state'] for node in 'abc'] == ['failed', 'blocked', 'blocked']
+    assert dag['finished_at'] and dag['critical_path'] == []
+
+    stalled = new_dag([{'id': 'a', 'task': 'A'}, {'id': 'b', 'task': 'B', 'depends_on': ['a']}])
+    stalled['nodes']['a'].update(state='running', agent_ids=['x', 'y'])
+    agents = {'x': {'status': 'stalled'}, 'y': {'status': 'paused'}}
+    orchestrator.schedule_dag({'agents': agents}, 'dag', stalled)
+    assert stalled['nodes']['a']['state'] == 'running'
+    agents['y']['status'] = 'cancelled'
+    orchestrator.schedule_dag({'agents': agents}, 'dag', stalled)
+    assert [stalled['nodes'][node]['state'] for node in 'ab'] == ['failed', 'blocked']
+
+
+def test_main_loop_save_keeps_what_changed_during_the_pass(tmp_path, monkeypatch):
+    """Test that the main loop saves only its own changes over what other threads saved meanwhile."""
+    monkeypatch.setattr(orchestrator, "CONFIG_FILE", tmp_path / "config.json")
+    before = orchestrator.load_tasks()
+    before['agents']['old'] = {'task': 'Old task', 'status': 'in_progress', 'aider_output': ''}
+    before['agents']['gone'] = {'task': 'Gone task', 'status': 'in_progress'}
+    orchestrator.save_tasks(before)
+    tasks_data = orchestrator.load_tasks()
+    snapshot = copy.deepcopy(tasks_data)
+    tasks_data['agents']['old']['aider_output'] = 'working'
+    tasks_data['agents']['gone']['status'] = 'error'
+
+    # Meanwhile an agent and a graph are created, one is deleted and another's status changes
+    created = orchestrator.load_tasks()
+    created['agents']['new'] = {'task': 'New task', 'status': 'pending'}
+    created['agents']['old']['status'] = 'completed'
+    del created['agents']['gone']
+    created['dags']['dag'] = new_dag(['New task'])
+    orchestrator.save_tasks(created)
+
+    orchestrator.merge_saved(tasks_data, snapshot)
+    orchestrator.save_changes(tasks_data, snapshot)
+    saved = orchestrator.load_tasks()
+    assert set(saved['agents']) == {'old', 'new'} and 'dag' in saved['dags']
+    assert saved['agents']['old']['status'] == 'completed' and saved['agents']['old']['aider_output'] == 'working'
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_start_from_merges_prerequisite_branches(tmp_path, upstream_repo):
+    """Test that a dependent checkout merges the winning commits of every prerequisite."""
+    origin = upstream_repo("origin")
+    prerequisites = []
+    for name in ('schema', 'api'):
+        repo = checkout(origin, tmp_path / name, f'agent-{name}')
+        (repo / f"{name}.py").write_text(f"{name} = True\n")
+        git('add', '.', cwd=repo)
+        git('commit', '-q', '-m', name, cwd=repo)
+        prerequisites.append({'repo_path': str(repo), 'branch': f'agent-{name}',
+                              'commit': git('rev-parse', 'HEAD', cwd=repo)})
+    checkout(origin, tmp_path / 'ui', 'agent-ui')
+
+    assert orchestrator.startFromCommits(prerequisites, cwd=tmp_path / 'ui')
+    for prerequisite in prerequisites:
+        git('merge-base', '--is-ancestor', prerequisite['commit'], 'HEAD', cwd=tmp_path / 'ui')
+    assert {'schema.py', 'api.py'} <= set(os.listdir(tmp_path / 'ui'))
+    assert not orchestrator.startFromCommits([dict(prerequisites[0], commit='0' * 40)], cwd=tmp_path / 'ui')
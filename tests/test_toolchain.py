@@ -0,0 +1,76 @@
+import pytest
+import sys
+import subprocess
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.toolchain import ToolchainRegistry, DEFAULT_TOOLCHAIN
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script as fake aider")
+
+
+def make_fake_aider(directory, version="aider 0.65.0"):
+    """Create an executable that answers --version like aider does."""
+    executable = Path(directory) / "aider"
+    executable.write_text(f"#!/bin/sh\necho '{version}'\n")
+    executable.chmod(0o755)
+    return executable
+
+
+def test_probe_runs_once_and_lookups_spawn_nothing(tmp_path, monkeypatch):
+    """Test that only the startup probe launches a subprocess."""
+    executable = make_fake_aider(tmp_path)
+    registry = ToolchainRegistry(cache_file=tmp_path / "cache.json")
+    registry.register(DEFAULT_TOOLCHAIN, str(executable))
+    registry.probe_all()
+
+    toolchain = registry.get()
+    assert toolchain.available
+    assert toolchain.version == "aider 0.65.0"
+    assert toolchain.probe_seconds is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("subprocess launched on the hot path")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    monkeypatch.setattr(subprocess, "Popen", fail)
+    for _ in range(100):
+        assert registry.is_available()
+
+
+def test_probe_result_cached_by_path_and_mtime(tmp_path, monkeypatch):
+    """Test that a new registry reuses the on-disk probe cache."""
+    executable = make_fake_aider(tmp_path)
+    cache_file = tmp_path / "cache.json"
+    first = ToolchainRegistry(cache_file=cache_file)
+    first.register(DEFAULT_TOOLCHAIN, str(executable))
+    first.probe_all()
+    assert not first.get().cached
+
+    monkeypatch.setattr(subprocess, "run", lambda *a, **k: pytest.fail("probe not cached"))
+    second = ToolchainRegistry(cache_file=cache_file)
+    second.register(DEFAULT_TOOLCHAIN, str(executable))
+    second.probe_all()
+    assert second.get().cached
+    assert second.get().version == "aider 0.65.0"
+
+
+def test_multiple_toolchains_from_virtualenvs(tmp_path):
+    """Test registering several aider versions, including a virtualenv directory."""
+    venv = tmp_path / "venv"
+    (venv / "bin").mkdir(parents=True)
+    make_fake_aider(venv / "bin", version="aider 0.70.0")
+    make_fake_aider(tmp_path, version="aider 0.65.0")
+
+    registry = ToolchainRegistry(cache_file=tmp_path / "cache.json")
+    registry.register(DEFAULT_TOOLCHAIN, str(tmp_path / "aider"))
+    registry.register("nightly", str(venv))
+    registry.register("missing", str(tmp_path / "nope"))
+    registry.probe_all()
+
+    assert registry.get("nightly").version == "aider 0.70.0"
+    assert registry.get().version == "aider 0.65.0"
+    assert not registry.is_available("missing")
+    assert set(registry.names()) == {DEFAULT_TOOLCHAIN, "nightly", "missing"}
@@ -0,0 +1,80 @@
+import pytest
+import sys
+import json
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.tracing import Tracer, OtlpFileExporter
+
+
+def test_timeline_nests_spans_and_events():
+    """Test that nested spans become a waterfall with depths and events."""
+    tracer = Tracer()
+    with tracer.span("agent-1", "aider.start"):
+        with tracer.span("agent-1", "aider.launch", toolchain="default"):
+            pass
+    tracer.event("agent-1", "first_byte", session_id="abc")
+
+    timeline = tracer.timeline("agent-1")
+    assert [row['name'] for row in timeline['spans']] == ["aider.start", "aider.launch"]
+    assert [row['depth'] for row in timeline['spans']] == [1, 2]
+    assert timeline['spans'][1]['attributes'] == {'toolchain': 'default'}
+    assert timeline['events'][0]['name'] == "first_byte"
+    assert timeline['total_ms'] >= timeline['spans'][0]['duration_ms']
+    assert tracer.timeline("unknown") is None
+
+
+def test_span_records_errors_and_untracked_agents():
+    """Test that exceptions mark spans failed and sessions without agents are not stored."""
+    tracer = Tracer()
+    with pytest.raises(RuntimeError):
+        with tracer.span("agent-1", "git.clone"):
+            raise RuntimeError("clone failed")
+    with tracer.span(None, "aider.launch"):
+        pass
+
+    row = tracer.timeline("agent-1")['spans'][0]
+    assert row['status'] == 'error'
+    assert row['status_message'] == 'clone failed'
+    assert tracer.timeline(None) is None
+
+
+def test_otlp_file_exporter_writes_json_lines(tmp_path):
+    """Test that finished spans are appended as OTLP/JSON export requests."""
+    export_file = tmp_path / "traces.jsonl"
+    tracer = Tracer(exporter=OtlpFileExporter(export_file))
+    tracer.record_span("agent-1", "toolchain.check", 1_000, 2_000, toolchain="default")
+    tracer.event("agent-1", "first_commit", commit="abc1234")
+    tracer.finish("agent-1")
+
+    lines = [json.loads(line) for line in export_file.read_text().splitlines()]
+    spans = [doc['resourceSpans'][0]['scopeSpans'][0]['spans'][0] for doc in lines]
+    assert [span['name'] for span in spans] == ["toolchain.check", "agent"]
+    assert spans[0]['startTimeUnixNano'] == "1000"
+    assert spans[0]['parentSpanId'] == spans[1]['spanId']
+    assert spans[1]['events'][0]['name'] == "first_commit"
+    assert tracer.timeline("agent-1") is None
+
+
+def test_first_commit_is_detected_across_pty_chunks(monkeypatch):
+    """Test that a commit line split over two read chunks is found on its line boundary."""
+    import orchestrator
+
+    class ChunkedProcess:
+        chunks = ["Applied edit to parser.py\nCom", "mit abc1234 Add parser\nRecommit later\n", None]
+
+        def read_chunk(self, timeout=0.1):
+            return self.chunks.pop(0)
+
+        def close(self):
+            pass
+
+    tracer = Tracer()
+    monkeypatch.setattr(orchestrator, 'TRACER', tracer)
+    session = orchestrator.AiderSession("/tmp", "task", use_pty=False, agent_id="agent-1", detached=False)
+    session.process = ChunkedProcess()
+    session._read_pty_output()
+    events = tracer.timeline("agent-1")['events']
+    assert [(event['name'], event['attributes']['commit']) for event in events] == [("first_commit", "abc1234")]
@@ -0,0 +1,86 @@
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import orchestrator
+from utils.verification import VerificationCache, VerificationRunner, run_verification, summarize_output
+from conftest import git
+
+
+CHECK_SCRIPT = {'check.sh': "echo '2 passed, 1 skipped in 0.01s'\n"}
+
+
+def test_summarize_output():
+    output = "collected 5 items\n\n=== 3 passed, 1 failed, 1 error, 2 warnings in 0.52s ===\n"
+    assert summarize_output(output) == {'passed': 3, 'failed': 1, 'errors': 1, 'warnings': 2}
+    assert summarize_output("no tests here") == {}
+
+
+def test_run_verification_outcomes(upstream_repo):
+    """Test that passing, failing and timed out commands give structured results and leave no worktree."""
+    repo = upstream_repo("repo", CHECK_SCRIPT)
+    commit = git('rev-parse', 'HEAD', cwd=repo)
+    passed = run_verification(repo, commit, 'sh check.sh')
+    assert passed['status'] == 'passed' and passed['summary'] == {'passed': 2, 'skipped': 1}
+    failed = run_verification(repo, commit, 'exit 4')
+    assert (failed['status'], failed['returncode'], failed['passed']) == ('failed', 4, False)
+
+    start = time.time()
+    timed_out = run_verification(repo, commit, 'sleep 30 & sleep 30', timeout=1)
+    assert timed_out['status'] == 'timeout' and time.time() - start < 10
+    assert run_verification(repo, '0' * 40, 'true')['status'] == 'error'
+    assert git('worktree', 'list', '--porcelain', cwd=repo).count('worktree ') == 1
+
+
+def test_results_are_cached_by_commit_and_command(tmp_path, upstream_repo):
+    """Test that a commit is verified once per command, also across restarts."""
+    repo = upstream_repo("repo", CHECK_SCRIPT)
+    commit = git('rev-parse', 'HEAD', cwd=repo)
+    cache_file = tmp_path / "verification.json"
+    runner = VerificationRunner(cache=VerificationCache(cache_file))
+    assert not runner.verify(repo, commit, 'sh check.sh').get('cached')
+    assert runner.verify(repo, commit, 'sh check.sh')['cached']
+    runner.verify(repo, commit, 'sleep 5', timeout=1)
+    assert runner.jobs_run == 2 and len(runner.cache) == 1
+
+    restarted = VerificationRunner(cache=VerificationCache(cache_file))
+    assert restarted.verify(repo, commit, 'sh check.sh')['status'] == 'passed' and restarted.jobs_run == 0
+
+
+def test_cache_key_covers_limits_and_environment(tmp_path, upstream_repo):
+    """Test that a cached result is only reused with the same timeout, limits and environment."""
+    repo = upstream_repo("repo", CHECK_SCRIPT)
+    commit = git('rev-parse', 'HEAD', cwd=repo)
+    cache = VerificationCache(tmp_path / "verification.json")
+    env = {'PATH': '/usr/bin:/bin'}
+    runner = VerificationRunner(cache=cache)
+    runner.verify(repo, commit, 'sh check.sh', env=env)
+    assert runner.verify(repo, commit, 'sh check.sh', env=dict(env, PWD='/elsewhere'))['cached']
+    assert not runner.verify(repo, commit, 'sh check.sh', env=dict(env, VIRTUAL_ENV='/venv')).get('cached')
+    assert not runner.verify(repo, commit, 'sh check.sh', env=env, timeout=30).get('cached')
+    limited = VerificationRunner(memory_mb=4096, cache=cache)
+    assert not limited.verify(repo, commit, 'sh check.sh', env=env).get('cached')
+    assert len(cache) == 4
+
+
+def test_main_loop_records_verification(tmp_path, monkeypatch, upstream_repo):
+    """Test that new agent commits are verified in the background and the result lands on the agent."""
+    repo = upstream_repo("repo", CHECK_SCRIPT)
+    base = git('rev-parse', 'HEAD', cwd=repo)
+    (repo / "check.sh").write_text("echo '1 failed in 0.01s'; exit 1\n")
+    git('commit', '-q', '-am', 'break', cwd=repo)
+    agents = {'v': {'repo_path': str(repo), 'base_commit': base, 'status': 'in_progress'}}
+    monkeypatch.setattr(orchestrator, 'VERIFY_COMMAND', 'sh check.sh')
+    monkeypatch.setattr(orchestrator, 'VERIFIER', VerificationRunner(cache=VerificationCache(None)))
+
+    orchestrator.verify_agents({'agents': agents})
+    deadline = time.time() + 30
+    while 'verification' not in agents['v'] and time.time() < deadline:
+        time.sleep(0.1)
+        orchestrator.verify_agents({'agents': agents})
+    assert agents['v']['verification']['status'] == 'failed'
+    assert agents['v']['status'] == 'in_progress'
+    assert agents['v']['status_reason'].startswith('Verification failed at')
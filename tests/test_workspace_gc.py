@@ -0,0 +1,71 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.workspace_gc import WorkspaceCollector, disk_usage
+
+
+def make_workspace(root, name, size):
+    workspace = root / name
+    (workspace / "repo" / ".git").mkdir(parents=True)
+    (workspace / "repo" / ".git" / "pack").write_bytes(b"x" * size)
+    (workspace / "repo" / "link").symlink_to("/")
+    return workspace
+
+
+def test_discard_renames_then_deletes_in_background(tmp_path):
+    """Test that a discarded workspace leaves its path at once and its bytes are reported as reclaimed."""
+    workspace = make_workspace(tmp_path, "agent_1_", 64 * 1024)
+    size = disk_usage(workspace)
+    assert size >= 64 * 1024
+
+    collector = WorkspaceCollector(tmp_path / "trash")
+    assert collector.discard(workspace)
+    assert not workspace.exists()
+    collector.join()
+    assert collector.trash_dir.parent == tmp_path / "trash" and list(collector.trash_dir.iterdir()) == []
+    assert collector.reclaimed_bytes == size and collector.reclaimed_workspaces == 1
+    assert not collector.discard(workspace)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="trash locks need flock")
+def test_leftover_trash_is_deleted_on_start(tmp_path):
+    """Test that the trash of a process that is gone is deleted on start, and a running one's is left alone."""
+    make_workspace(tmp_path / "trash" / "1234-0a1b2c3d", "agent_2_-0a1b2c3d", 4096)
+    (tmp_path / "trash" / "1234-0a1b2c3d.lock").touch()
+    running = WorkspaceCollector(tmp_path / "trash")
+    running.start()
+    running.join()
+    assert running.stats()['reclaimed_workspaces'] == 1
+
+    collector = WorkspaceCollector(tmp_path / "trash")
+    collector.start()
+    collector.join()
+    assert collector.stats()['reclaimed_workspaces'] == 0
+    assert sorted(path.name for path in (tmp_path / "trash").iterdir()) == sorted([
+        running.trash_dir.name, running.trash_dir.name + '.lock',
+        collector.trash_dir.name, collector.trash_dir.name + '.lock'])
+
+
+def test_quota_evicts_least_recently_updated_finished_agents():
+    """Test that only evictable agents are selected, oldest first, until the total fits the quota."""
+    collector = WorkspaceCollector("/nonexistent/trash", quota_bytes=250)
+    collector.sizes = {'/ws/a': 100, '/ws/b': 100, '/ws/c': 100, '/ws/d': 100}
+    agents = {
+        'a': {'workspace': '/ws/a', 'status': 'completed', 'last_updated': '2024-01-01T10:00:00'},
+        'b': {'workspace': '/ws/b', 'status': 'in_progress', 'last_updated': '2024-01-01T09:00:00'},
+        'c': {'workspace': '/ws/c', 'status': 'error', 'last_updated': '2024-01-01T08:00:00'},
+        'd': {'workspace': '/ws/d', 'status': 'completed', 'last_updated': '2024-01-01T11:00:00'},
+    }
+    collector._thread = object()  # no worker, sizes are set above
+    evictable = lambda agent_id, agent_data: agent_data['status'] in ('completed', 'error')
+    assert collector.select_evictions(agents, evictable) == ['c', 'a']
+    assert collector.tracked_bytes() == 400
+
+    collector.quota_bytes = 0
+    assert collector.select_evictions(agents, evictable) == []
@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+PATH_CACHE_SIZE = 4096
+
+
+class CanonicalPathCache:
+    """
+    Memoizes Path.resolve() for absolute paths, which costs an lstat per path component.
+    Relative paths depend on the working directory (initialiseCodingAgent changes it) and
+    are resolved every time. Entries are evicted least recently used first.
+    """
+
+    def __init__(self, maxsize=PATH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def canonical(self, path_str) -> str:
+        key = str(path_str)
+        if not os.path.isabs(key):
+            return str(Path(key).resolve()).replace('\\', '/')
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        canonical = str(Path(key).resolve()).replace('\\', '/')
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = canonical
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return canonical
+
+    def invalidate(self, prefix=None):
+        """Forget cached paths under prefix, or everything, e.g. after removing a workspace"""
+        with self._lock:
+            if prefix is None:
+                self._cache.clear()
+                return
+            prefix = str(prefix)
+            for key in [k for k, v in self._cache.items() if k.startswith(prefix) or v.startswith(prefix)]:
+                del self._cache[key]
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class AgentRegistry:
+    """
+    Thread-safe in-memory index of agents by id, workspace and repo path.
+
+    Mirrors the agents of the tasks file (save_tasks calls sync()), so associating a session
+    with its agent is a dictionary lookup instead of a load_tasks() and a scan over all agents.
+    Paths must already be canonical (normalize_path).
+    """
+
+    def __init__(self):
+        self._agents: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._by_workspace: Dict[str, str] = {}
+        self._by_repo_path: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _remove(self, agent_id):
+        workspace, repo_path = self._agents.pop(agent_id, (None, None))
+        if workspace and self._by_workspace.get(workspace) == agent_id:
+            del self._by_workspace[workspace]
+        if repo_path and self._by_repo_path.get(repo_path) == agent_id:
+            del self._by_repo_path[repo_path]
+
+    def _add(self, agent_id, workspace, repo_path):
+        self._agents[agent_id] = (workspace, repo_path)
+        if workspace:
+            self._by_workspace[workspace] = agent_id
+        if repo_path:
+            self._by_repo_path[repo_path] = agent_id
+
+    def register(self, agent_id, workspace=None, repo_path=None):
+        with self._lock:
+            if self._agents.get(agent_id) == (workspace, repo_path):
+                return
+            self._remove(agent_id)
+            self._add(agent_id, workspace, repo_path)
+
+    def unregister(self, agent_id):
+        with self._lock:
+            self._remove(agent_id)
+
+    def sync(self, agents: Dict[str, dict]):
+        """Make the index match an agents mapping from the tasks file"""
+        with self._lock:
+            for agent_id in [a for a in self._agents if a not in agents]:
+                self._remove(agent_id)
+            for agent_id, agent_data in agents.items():
+                paths = (agent_data.get('workspace'), agent_data.get('repo_path'))
+                if self._agents.get(agent_id) != paths:
+                    self._remove(agent_id)
+                    self._add(agent_id, *paths)
+            self.loaded = True
+
+    def get(self, agent_id) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """(workspace, repo_path) of an agent, None if unknown"""
+        return self._agents.get(agent_id)
+
+    def find_by_path(self, path) -> Optional[str]:
+        """Agent whose workspace or repo path is path"""
+        if not path:
+            return None
+        return self._by_workspace.get(path) or self._by_repo_path.get(path)
+
+    def matches(self, agent_id, path) -> bool:
+        paths = self._agents.get(agent_id)
+        return bool(path and paths and path in paths)
+
+    def agent_ids(self) -> Iterable[str]:
+        return list(self._agents)
+
+    def __contains__(self, agent_id):
+        return agent_id in self._agents
+
+    def __len__(self):
+        return len(self._agents)
@@ -0,0 +1,215 @@
+"""
+Converts terminal output with ANSI escape sequences into styled line segments.
+
+The dashboard terminal renders segments as spans with short CSS classes, so the browser
+does no escape parsing. A line is a list of segments; a segment is either a plain string
+or a [text, classes] pair, where classes is a space separated subset of:
+
+    b, d, i, u          bold, dim, italic, underline
+    f0-f15, g0-g15      foreground / background color (8-15 are the bright variants)
+
+Only SGR (color/style) sequences are interpreted; cursor movement, erase and OSC
+sequences are dropped. A bare carriage return restarts the line, which keeps progress
+bars on one line.
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# CSI (ESC [ params intermediates final), OSC (ESC ] ... BEL or ESC \) or a two byte escape
+ESCAPE_SEQUENCE = re.compile(r'\x1b(?:\[([0-9;?]*)[ -/]*([@-~])|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+# An escape sequence cut off at the end of a chunk
+INCOMPLETE_ESCAPE = re.compile(r'\x1b(?:\[[0-9;?]*[ -/]*|\][^\x07\x1b]*\x1b?)?$')
+# Longest partial escape sequence held back for the next chunk, beyond that it is text
+MAX_PENDING_CHARS = 4096
+PREVIEW_CHARS = 200
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[ -/]*[@-~]')
+
+ATTRIBUTES = {1: 'b', 2: 'd', 3: 'i', 4: 'u'}
+ATTRIBUTE_RESETS = {22: ('b', 'd'), 23: ('i',), 24: ('u',)}
+
+
+def last_output_line(output, max_chars=PREVIEW_CHARS):
+    """Last non-empty line of an agent's output without terminal escapes, for card previews"""
+    end = len(output)
+    while end:
+        start = output.rfind('\n', 0, end - 1) + 1
+        line = ANSI_ESCAPE.sub('', output[start:end]).strip()
+        if line:
+            return line[-max_chars:]
+        end = start
+    return ''
+
+
+class AnsiConverter:
+    """
+    Stateful converter for one output stream. Style and a trailing partial escape sequence
+    carry over between feed() calls, so output can be converted as it arrives.
+    """
+
+    def __init__(self):
+        self.attributes = set()
+        self.foreground: Optional[int] = None
+        self.background: Optional[int] = None
+        self._pending = ''
+        self._carriage_return = False
+
+    def _classes(self):
+        classes = [a for a in ('b', 'd', 'i', 'u') if a in self.attributes]
+        if self.foreground is not None:
+            classes.append(f'f{self.foreground}')
+        if self.background is not None:
+            classes.append(f'g{self.background}')
+        return ' '.join(classes)
+
+    def _apply_sgr(self, params):
+        codes = [int(p) if p.isdigit() else 0 for p in params.split(';')] if params else [0]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self.attributes.clear()
+                self.foreground = self.background = None
+            elif code in ATTRIBUTES:
+                self.attributes.add(ATTRIBUTES[code])
+            elif code in ATTRIBUTE_RESETS:
+                self.attributes.difference_update(ATTRIBUTE_RESETS[code])
+            elif 30 <= code <= 37:
+                self.foreground = code - 30
+            elif 90 <= code <= 97:
+                self.foreground = code - 82
+            elif code == 39:
+                self.foreground = None
+            elif 40 <= code <= 47:
+                self.background = code - 40
+            elif 100 <= code <= 107:
+                self.background = code - 92
+            elif code == 49:
+                self.background = None
+            elif code in (38, 48) and i + 1 < len(codes):
+                # 256 color (5;n) keeps the 16 basic colors, truecolor (2;r;g;b) is dropped
+                color = None
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    color = codes[i + 2] if codes[i + 2] < 16 else None
+                    i += 2
+                elif codes[i + 1] == 2:
+                    i += 4
+                if code == 38:
+                    self.foreground = color
+                else:
+                    self.background = color
+            i += 1
+
+    def feed(self, text) -> Tuple[List[list], bool]:
+        """
+        Convert a chunk into lines. The first line continues the current (unterminated) line
+        and the last line is the new unterminated line, so "a\\nb" yields two lines and
+        "a\\n" yields ["a"] and []. The second value is True when a carriage return cleared
+        the line being continued.
+        """
+        text = self._pending + text
+        incomplete = INCOMPLETE_ESCAPE.search(text)
+        if incomplete and len(text) - incomplete.start() > MAX_PENDING_CHARS:
+            # An OSC that never ends, flushed without its ESC so it is not held back again
+            text = text[:incomplete.start()] + text[incomplete.start() + 1:]
+            self._pending = ''
+        elif incomplete and incomplete.start() < len(text):
+            self._pending = text[incomplete.start():]
+            text = text[:incomplete.start()]
+        else:
+            self._pending = ''
+
+        lines = [[]]
+        cleared = False
+        position = 0
+        for match in ESCAPE_SEQUENCE.finditer(text):
+            cleared = self._add_text(lines, text[position:match.start()]) or cleared
+            if match.group(2) == 'm':
+                self._apply_sgr(match.group(1))
+            position = match.end()
+        cleared = self._add_text(lines, text[position:]) or cleared
+        return lines, cleared
+
+    def _add_text(self, lines, text) -> bool:
+        """Append text to lines, returns True if a carriage return cleared the first line"""
+        if not text:
+            return False
+        cleared = False
+        classes = self._classes()
+        for i, part in enumerate(text.replace('\r\n', '\n').split('\n')):
+            if i:
+                lines.append([])
+                self._carriage_return = False
+            for j, piece in enumerate(part.split('\r')):
+                if j:
+                    self._carriage_return = True
+                if not piece:
+                    continue
+                line = lines[-1]
+                if self._carriage_return:
+                    # Text after a carriage return overwrites the line
+                    self._carriage_return = False
+                    line.clear()
+                    cleared = cleared or len(lines) == 1
+                previous = line[-1] if line else None
+                # Merge with the previous segment when the style did not change
+                if isinstance(previous, str) and not classes:
+                    line[-1] = previous + piece
+                elif isinstance(previous, list) and previous[1] == classes:
+                    previous[0] += piece
+                else:
+                    line.append([piece, classes] if classes else piece)
+        return cleared
+
+
+def segments_text(line) -> str:
+    """Plain text of a converted line"""
+    return ''.join(segment if isinstance(segment, str) else segment[0] for segment in line)
+
+
+class TerminalStreams:
+    """
+    One converter per agent, fed with output deltas in order. A delta that does not start
+    where the previous one ended (a dropped update, or new output after a retry) restarts
+    the agent's converter; the client notices the same gap and refetches the range.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, Tuple[AnsiConverter, int]] = {}
+        self._lock = threading.Lock()
+
+    def convert(self, agent_id, offset, text) -> dict:
+        with self._lock:
+            converter, expected = self._streams.get(agent_id, (None, None))
+            if converter is None or expected != offset:
+                converter = AnsiConverter()
+            lines, cleared = converter.feed(text)
+            self._streams[agent_id] = (converter, offset + len(text))
+        return {
+            'agent_id': agent_id,
+            'offset': offset,
+            'end': offset + len(text),
+            'lines': lines,
+            'cleared': cleared
+        }
+
+    def discard(self, agent_id):
+        with self._lock:
+            self._streams.pop(agent_id, None)
+
+    def __len__(self):
+        return len(self._streams)
+
+
+def convert_output(text, skip_partial_line=False) -> Tuple[List[list], int]:
+    """
+    Convert a complete range of output in one go. With skip_partial_line, characters before
+    the first newline are skipped (a tail that starts mid-line); returns the lines and the
+    number of characters skipped.
+    """
+    skipped = 0
+    if skip_partial_line and text:
+        skipped = text.find('\n') + 1
+        text = text[skipped:]
+    lines, _ = AnsiConverter().feed(text)
+    return lines, skipped
@@ -0,0 +1,265 @@
+"""
+Dependency environments shared between agents, one per manifest hash.
+
+The first agent whose checkout has a given requirements.txt / pyproject.toml (Python) or
+package-lock.json (Node) builds the environment in the cache; later agents get a symlink to
+it (`.venv` or `node_modules` in the checkout). Finished environments are made read-only so
+an agent cannot modify what other agents use. Package downloads go through a persistent pip
+and npm cache under the same root, so new entries mostly install from disk.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import stat
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.environ.get(
+    'DEPENDENCY_CACHE_DIR',
+    Path.home() / '.cache' / '100x-orchestrator' / 'dependencies'
+))
+BUILD_TIMEOUT = 1800
+READY_MARKER = '.ready'
+# Optional dependency groups installed along with [project].dependencies
+PYPROJECT_EXTRAS = ('test', 'tests', 'testing', 'dev')
+# Link name in the checkout for each kind of environment
+LINK_NAMES = {'python': '.venv', 'node': 'node_modules'}
+REQUIREMENT_INCLUDE = re.compile(r'^\s*(?:-r|--requirement|-c|--constraint)\s*=?\s*(\S+)')
+EDITABLE = re.compile(r'^\s*(?:-e|--editable)\b|^\s*\.')
+
+
+def _bin_dir(venv: Path) -> Path:
+    return venv / ('Scripts' if sys.platform == 'win32' else 'bin')
+
+
+def _requirement_files(path: Path, seen=None) -> List[Path]:
+    """A requirements file and the files it includes with -r/-c, recursively"""
+    seen = seen if seen is not None else []
+    if path in seen or not path.is_file():
+        return seen
+    seen.append(path)
+    for line in path.read_text(errors='replace').splitlines():
+        match = REQUIREMENT_INCLUDE.match(line)
+        if match:
+            _requirement_files(path.parent / match.group(1), seen)
+    return seen
+
+
+def _pyproject_requirements(path: Path) -> List[str]:
+    """[project].dependencies and the test/dev optional dependencies of a pyproject.toml"""
+    if tomllib is None:
+        return []
+    try:
+        project = tomllib.loads(path.read_text()).get('project', {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read dependencies from {path}: {e}")
+        return []
+    requirements = list(project.get('dependencies', []))
+    for extra in PYPROJECT_EXTRAS:
+        requirements += project.get('optional-dependencies', {}).get(extra, [])
+    return requirements
+
+
+def _tool_version(command) -> str:
+    try:
+        return subprocess.run(command, capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def detect_manifests(repo_path) -> Dict[str, List[Path]]:
+    """Dependency manifests in a checkout by environment kind"""
+    repo_path = Path(repo_path)
+    manifests = {}
+    python = []
+    if (repo_path / 'requirements.txt').is_file():
+        python += _requirement_files(repo_path / 'requirements.txt')
+    if (repo_path / 'pyproject.toml').is_file() and _pyproject_requirements(repo_path / 'pyproject.toml'):
+        python.append(repo_path / 'pyproject.toml')
+    if python:
+        manifests['python'] = python
+    if (repo_path / 'package-lock.json').is_file() and (repo_path / 'package.json').is_file():
+        manifests['node'] = [repo_path / 'package.json', repo_path / 'package-lock.json']
+    return manifests
+
+
+def _make_read_only(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if not os.path.islink(path):
+                os.chmod(path, stat.S_IMODE(os.lstat(path).st_mode) & ~0o222)
+        os.chmod(dirpath, stat.S_IMODE(os.stat(dirpath).st_mode) & ~0o222)
+
+
+def _make_writable(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        os.chmod(dirpath, stat.S_IMODE(os.stat(dirpath).st_mode) | stat.S_IWUSR)
+
+
+class DependencyCache:
+    """
+    Environments under root/<kind>-<hash>, where the hash covers the manifests and the
+    interpreter or npm version. Builds of one entry are serialized across threads and, where
+    flock is available, across orchestrator processes sharing the cache.
+    """
+
+    def __init__(self, root=CACHE_DIR, python=None):
+        self.root = Path(root)
+        self.python = python or sys.executable
+        self.downloads = self.root / 'downloads'
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Entries whose build failed in this process, not retried until restart
+        self._failed = set()
+        self._versions: Dict[str, str] = {}
+
+    def _version(self, kind) -> str:
+        if kind not in self._versions:
+            if kind == 'python':
+                self._versions[kind] = _tool_version([self.python, '--version'])
+            else:
+                self._versions[kind] = _tool_version(['node', '--version']) + _tool_version(['npm', '--version'])
+        return self._versions[kind]
+
+    def key(self, kind, manifests: List[Path]) -> str:
+        digest = hashlib.sha256(f"{kind}\0{self._version(kind)}\0".encode())
+        base = manifests[0].parent
+        for manifest in manifests:
+            digest.update(str(manifest.relative_to(base) if manifest.is_relative_to(base) else manifest.name).encode())
+            digest.update(b'\0' + manifest.read_bytes() + b'\0')
+        return f"{kind}-{digest.hexdigest()[:20]}"
+
+    def _lock(self, key) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def ensure(self, kind, manifests: List[Path]) -> Tuple[Optional[Path], bool]:
+        """Environment for the manifests and whether it was already built, (None, False) on failure"""
+        key = self.key(kind, manifests)
+        env = self.root / key
+        if (env / READY_MARKER).exists():
+            return env, True
+        if key in self._failed:
+            return None, False
+        with self._lock(key):
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / f"{key}.lock", 'w') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if (env / READY_MARKER).exists():
+                    return env, True
+                if env.exists():
+                    # Left by an interrupted build
+                    _make_writable(env)
+                    shutil.rmtree(env)
+                try:
+                    if kind == 'python':
+                        self._build_python(env, manifests)
+                    else:
+                        self._build_node(env, manifests)
+                    (env / READY_MARKER).touch()
+                    _make_read_only(env)
+                    logger.info(f"Built {kind} environment {env}")
+                    return env, False
+                except (OSError, subprocess.SubprocessError) as e:
+                    output = getattr(e, 'stderr', None) or ''
+                    logger.error(f"Could not build {kind} environment {env}: {e} {output[-2000:]}", exc_info=True)
+                    self._failed.add(key)
+                    if env.exists():
+                        _make_writable(env)
+                        shutil.rmtree(env, ignore_errors=True)
+                    return None, False
+
+    def _run(self, command, cwd=None):
+        subprocess.run(command, cwd=cwd, check=True, capture_output=True, text=True, timeout=BUILD_TIMEOUT)
+
+    def _build_python(self, env: Path, manifests: List[Path]):
+        # Built in place: a virtualenv holds absolute paths to itself
+        self._run([self.python, '-m', 'venv', str(env)])
+        pip = [str(_bin_dir(env) / 'python'), '-m', 'pip', 'install', '--disable-pip-version-check',
+               '--cache-dir', str(self.downloads / 'pip')]
+        requirements = []
+        for manifest in manifests:
+            if manifest.name == 'pyproject.toml':
+                requirements += _pyproject_requirements(manifest)
+            elif manifest is manifests[0]:
+                # Files it includes are installed through it
+                filtered = env / 'requirements.txt'
+                filtered.write_text(self._filter_requirements(manifest))
+                self._run(pip + ['-r', str(filtered)], cwd=manifest.parent)
+        if requirements:
+            self._run(pip + requirements)
+
+    @staticmethod
+    def _filter_requirements(manifest: Path) -> str:
+        """
+        A requirements file without editable installs (the checkout differs per agent) and
+        with included files made absolute, for use outside the checkout
+        """
+        lines = []
+        for line in manifest.read_text(errors='replace').splitlines():
+            if EDITABLE.match(line):
+                continue
+            match = REQUIREMENT_INCLUDE.match(line)
+            if match:
+                line = line[:match.start(1)] + str((manifest.parent / match.group(1)).resolve()) + line[match.end(1):]
+            lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+    def _build_node(self, env: Path, manifests: List[Path]):
+        env.mkdir(parents=True)
+        for manifest in manifests:
+            shutil.copy2(manifest, env / manifest.name)
+        npm = shutil.which('npm') or 'npm'
+        self._run([npm, 'ci', '--no-audit', '--no-fund', '--cache', str(self.downloads / 'npm')], cwd=env)
+        # Not created when there is nothing to install
+        (env / 'node_modules').mkdir(exist_ok=True)
+
+    def link(self, kind, env: Path, repo_path) -> Optional[Path]:
+        """Link an environment into a checkout, unless the checkout already has its own"""
+        repo_path = Path(repo_path)
+        link = repo_path / LINK_NAMES[kind]
+        if os.path.lexists(link):
+            return None
+        target = env / 'node_modules' if kind == 'node' else env
+        os.symlink(target, link, target_is_directory=True)
+        # Keep the link out of `git status` and commits
+        exclude = repo_path / '.git' / 'info' / 'exclude'
+        if exclude.parent.is_dir():
+            with open(exclude, 'a') as f:
+                f.write(f"/{LINK_NAMES[kind]}\n")
+        return link
+
+
+def dependency_env(repo_path, env: dict) -> dict:
+    """Put the linked environments of a checkout first on PATH for commands the agent runs"""
+    repo_path = Path(repo_path)
+    paths = []
+    venv = repo_path / LINK_NAMES['python']
+    if venv.is_symlink() and _bin_dir(venv).is_dir():
+        env['VIRTUAL_ENV'] = str(venv)
+        paths.append(str(_bin_dir(venv)))
+    node_bin = repo_path / LINK_NAMES['node'] / '.bin'
+    if (repo_path / LINK_NAMES['node']).is_symlink() and node_bin.is_dir():
+        paths.append(str(node_bin))
+    if paths:
+        env['PATH'] = os.pathsep.join(paths + [env.get('PATH', '')])
+    return env
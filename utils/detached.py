@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import shlex
+import signal
+import subprocess
+import logging
+
+from utils.pty_utils import OutputDecoder
+
+logger = logging.getLogger(__name__)
+
+# Needs mkfifo and /proc/<pid>/stat to recognise a process after a restart
+DETACHED_SUPPORTED = sys.platform.startswith('linux')
+
+CHUNK_SIZE = 65536
+
+
+def process_start_time(pid):
+    """
+    Start time of a live process in clock ticks since boot, None if it does not exist or is a
+    zombie. Stored next to the PID so a reused PID is never mistaken for the original process.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except (OSError, TypeError):
+        return None
+    # The command name may contain spaces and parentheses, fields after it are fixed
+    fields = stat.rsplit(')', 1)[-1].split()
+    if fields[0] == 'Z':
+        return None
+    return int(fields[19])
+
+
+class FifoWriter:
+    """File-like writer for the stdin FIFO of a detached process"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.closed = False
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed fifo")
+        if self.fd is None:
+            # Never blocks: the child holds the FIFO open for reading, otherwise ENXIO
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        payload = data.encode('utf-8')
+        while payload:
+            try:
+                written = os.write(self.fd, payload)
+            except BlockingIOError:
+                time.sleep(0.01)
+                continue
+            payload = payload[written:]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Release this side of the FIFO; the child keeps its own handle and sees no EOF"""
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+        self.closed = True
+
+
+class DetachedProcess:
+    """
+    Runs a command in its own session, independent of the orchestrator's lifetime.
+
+    stdin is a named pipe and stdout/stderr are appended to a log file in session_dir, so the
+    process holds no file descriptors of the orchestrator and keeps running when it exits.
+    A restarted orchestrator calls attach() with the metadata from to_dict() and continues
+    reading the log from the persisted offset. Exposes the subset of the Popen interface
+    AiderSession uses, plus read_chunk() like PtyProcess.
+    """
+
+    def __init__(self, pid, session_dir, start_time, popen=None, offset=0):
+        self.pid = pid
+        self.session_dir = session_dir
+        self.start_time = start_time
+        self.offset = offset
+        self.returncode = None
+        self.stdin = FifoWriter(self.stdin_path)
+        self.stdout = None
+        self.stderr = None
+        self._popen = popen
+        self._output = None
+        self._decoder = OutputDecoder()
+
+    @property
+    def stdin_path(self):
+        return os.path.join(self.session_dir, 'stdin')
+
+    @property
+    def output_path(self):
+        return os.path.join(self.session_dir, 'output.log')
+
+    @property
+    def exit_path(self):
+        return os.path.join(self.session_dir, 'exit_code')
+
+    @classmethod
+    def launch(cls, cmd, session_dir, cwd=None, env=None):
+        if not DETACHED_SUPPORTED:
+            raise OSError("Detached agent processes are only supported on Linux")
+        os.makedirs(session_dir, exist_ok=True)
+        stdin_path = os.path.join(session_dir, 'stdin')
+        if not os.path.exists(stdin_path):
+            os.mkfifo(stdin_path, 0o600)
+        exit_path = os.path.join(session_dir, 'exit_code')
+
+        # Opened read-write so the child always holds a writer and never reads EOF
+        # when the orchestrator that was writing to it goes away
+        stdin_fd = os.open(stdin_path, os.O_RDWR)
+        try:
+            with open(os.path.join(session_dir, 'output.log'), 'ab') as output:
+                popen = subprocess.Popen(
+                    f'{cmd}; echo $? > {shlex.quote(exit_path)}',
+                    shell=True,
+                    cwd=cwd,
+                    env=env,
+                    stdin=stdin_fd,
+                    stdout=output,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                    close_fds=True
+                )
+        finally:
+            os.close(stdin_fd)
+        return cls(popen.pid, session_dir, process_start_time(popen.pid), popen=popen)
+
+    @classmethod
+    def attach(cls, info):
+        """Reattach to a process described by to_dict(), None if it is no longer running"""
+        pid = info.get('pid')
+        session_dir = info.get('session_dir')
+        if not pid or not session_dir or not os.path.exists(os.path.join(session_dir, 'output.log')):
+            return None
+        start_time = process_start_time(pid)
+        if start_time is None or start_time != info.get('start_time'):
+            return None
+        return cls(pid, session_dir, start_time, offset=int(info.get('output_offset', 0)))
+
+    def to_dict(self):
+        return {
+            'pid': self.pid,
+            'start_time': self.start_time,
+            'session_dir': self.session_dir,
+            'output_offset': self.offset
+        }
+
+    def poll(self):
+        if self.returncode is not None:
+            return self.returncode
+        if self._popen is not None:
+            if self._popen.poll() is None:
+                return None
+        elif process_start_time(self.pid) == self.start_time:
+            return None
+        try:
+            with open(self.exit_path) as f:
+                self.returncode = int(f.read().strip())
+        except (OSError, ValueError):
+            # Killed before the wrapper shell could record an exit status
+            self.returncode = self._popen.returncode if self._popen is not None else -1
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(f'pid {self.pid}', timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def _signal(self, signum):
+        # The wrapper shell leads its own process group, signal aider along with it
+        try:
+            os.killpg(self.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def terminate(self):
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def restore_output(self):
+        """
+        Log contents up to the current offset, used to restore the output buffer. Decoded like
+        read_chunk and by the same decoder, so reading on from the offset continues the text.
+        """
+        try:
+            with open(self.output_path, 'rb') as f:
+                return self._decoder.decode(f.read(self.offset))
+        except OSError:
+            return ''
+
+    def read_chunk(self, timeout=0.1):
+        """
+        Read log output appended since the last call.
+        Returns '' when nothing arrived within the timeout and None once the process has exited
+        and the log is drained.
+        """
+        if self._output is None:
+            self._output = open(self.output_path, 'rb')
+            self._output.seek(self.offset)
+        data = self._output.read(CHUNK_SIZE)
+        if not data:
+            exited = self.poll() is not None
+            # Read once more after exit, the last writes may land just before it
+            data = self._output.read(CHUNK_SIZE)
+            if not data:
+                if exited:
+                    return None
+                time.sleep(timeout)
+                return ''
+        self.offset += len(data)
+        return self._decoder.decode(data)
+
+    def close(self):
+        """Stop reading and writing; the process itself keeps running"""
+        self.stdin.close()
+        if self._output is not None:
+            self._output.close()
+            self._output = None
@@ -0,0 +1,66 @@
+"""
+Compact payloads for dashboard events when Socket.IO uses the msgpack serializer.
+
+Output events are emitted at line rate. In compact form an event refers to its agent by a
+small integer handle instead of the agent id, carries its timestamp as epoch milliseconds
+instead of an ISO string, and leaves out keys whose value is None. Clients learn handles
+from `agent_handles` events, a list of [handle, agent_id] pairs sent before the first event
+that uses a new handle and in full on request.
+"""
+import datetime
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def epoch_ms(timestamp) -> Optional[int]:
+    """Milliseconds since the epoch for an ISO timestamp (naive timestamps are local time)"""
+    if not timestamp:
+        return None
+    try:
+        return int(datetime.datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+
+class EventCodec:
+    """Assigns agent handles and rewrites event payloads into their compact form"""
+
+    def __init__(self):
+        self._handles: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, agent_id) -> Tuple[int, bool]:
+        """Handle of an agent and whether it was assigned by this call"""
+        handle = self._handles.get(agent_id)
+        if handle is not None:
+            return handle, False
+        with self._lock:
+            handle = self._handles.get(agent_id)
+            if handle is not None:
+                return handle, False
+            handle = self._handles[agent_id] = len(self._handles) + 1
+            return handle, True
+
+    def handles(self) -> List[list]:
+        return [[handle, agent_id] for agent_id, handle in list(self._handles.items())]
+
+    def encode(self, payload) -> Tuple[dict, Optional[List[list]]]:
+        """
+        Compact form of an event payload, plus the [handle, agent_id] pairs to announce
+        first when a new handle was assigned (None otherwise).
+        """
+        compact = {key: value for key, value in payload.items() if value is not None}
+        announce = None
+        agent_id = compact.pop('agent_id', None)
+        if agent_id is not None:
+            handle, new = self.handle(agent_id)
+            compact['h'] = handle
+            if new:
+                announce = [[handle, agent_id]]
+        timestamp = compact.pop('timestamp', None)
+        if timestamp is not None:
+            compact['ts'] = epoch_ms(timestamp)
+        return compact, announce
+
+    def __len__(self):
+        return len(self._handles)
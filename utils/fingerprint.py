@@ -0,0 +1,181 @@
+"""
+Similarity fingerprints of agent diffs, to find agents doing the same work.
+
+An agent's fingerprint is a MinHash signature of the token shingles of its diff against the
+commit it started from. Diff lines are normalized first (whitespace collapsed, blank lines
+and hunk positions dropped), so the same change made at a different place in a file or with
+different indentation still matches. The signature of a whole diff is the element-wise
+minimum of per-file signatures, and those are cached by (path, old blob, new blob): when a
+new commit lands only the files it changed are hashed again.
+"""
+import hashlib
+import logging
+import random
+import re
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+SHINGLE_TOKENS = 4
+DEFAULT_THRESHOLD = 0.8
+# Per-file signatures kept across agents and commits
+FILE_CACHE_SIZE = 5000
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+_rng = random.Random(0x100)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def _git(repo_path, *args) -> str:
+    return subprocess.run(['git', *args], cwd=repo_path, check=True, capture_output=True,
+                          text=True, errors='replace', timeout=120).stdout
+
+
+def changed_files(repo_path, base, commit) -> List[Tuple[str, str, str]]:
+    """(path, old blob, new blob) of the files that differ between two commits"""
+    entries = _git(repo_path, 'diff', '--raw', '-z', '--no-renames', '--no-abbrev', base, commit).split('\0')
+    files = []
+    for meta, path in zip(entries[0::2], entries[1::2]):
+        fields = meta.split()
+        if len(fields) >= 4:
+            files.append((path, fields[2], fields[3]))
+    return files
+
+
+def normalized_changes(diff: str) -> Dict[str, List[str]]:
+    """Added and removed lines of a unified diff by file, whitespace-normalized"""
+    changes: Dict[str, List[str]] = {}
+    lines = None
+    header = False
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            lines, header = None, True
+        elif line.startswith('@@'):
+            header = False
+        elif header:
+            if line.startswith('+++ ') or line.startswith('--- '):
+                path = line[4:]
+                if path != '/dev/null':
+                    lines = changes.setdefault(path[2:] if path[:2] in ('a/', 'b/') else path, [])
+        elif lines is not None and line[:1] in ('+', '-'):
+            text = ' '.join(line[1:].split())
+            if text:
+                lines.append(line[0] + ' ' + text)
+    return changes
+
+
+def shingles(lines: List[str], size=SHINGLE_TOKENS) -> set:
+    """Hashes of each run of `size` consecutive tokens of the changed lines"""
+    tokens = []
+    for line in lines:
+        tokens.append(line[0])
+        tokens.extend(TOKEN.findall(line[2:]))
+    if len(tokens) < size:
+        size = len(tokens)
+    return {
+        int.from_bytes(hashlib.blake2b(' '.join(tokens[i:i + size]).encode(), digest_size=8).digest(), 'big')
+        for i in range(len(tokens) - size + 1)
+    } if tokens else set()
+
+
+def minhash(hashes) -> Optional[List[int]]:
+    if not hashes:
+        return None
+    return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in PERMUTATIONS]
+
+
+def combine(signatures) -> Optional[List[int]]:
+    """Signature of the union of several shingle sets"""
+    signatures = [signature for signature in signatures if signature]
+    if not signatures:
+        return None
+    return [min(values) for values in zip(*signatures)]
+
+
+def similarity(first, second) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not first or not second:
+        return 0.0
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class DuplicateDetector:
+    """Fingerprints of agent diffs and the clusters of agents whose diffs are near-identical"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._files: Dict[tuple, Optional[List[int]]] = {}
+        self._agents: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.files_hashed = 0
+        # Agents in a cluster at the last clusters() call
+        self.flagged = 0
+        # time.monotonic() of the last pass that fingerprinted every agent, set by the caller
+        self.updated_at: Optional[float] = None
+
+    def update(self, agent_id, repo_path, base, commit) -> Optional[List[int]]:
+        """Fingerprint of an agent's diff from base to commit, hashing only files not seen before"""
+        current = self._agents.get(agent_id)
+        if current and current[0] == (base, commit):
+            return current[1]
+        files = changed_files(repo_path, base, commit)
+        with self._lock:
+            missing = {path for path, old, new in files if (path, old, new) not in self._files}
+        if missing:
+            changes = normalized_changes(_git(repo_path, 'diff', '-U0', '--no-renames', base, commit, '--', *sorted(missing)))
+            with self._lock:
+                for path, old, new in files:
+                    if path in missing:
+                        self._files[(path, old, new)] = minhash(shingles(changes.get(path, [])))
+                        self.files_hashed += 1
+                while len(self._files) > FILE_CACHE_SIZE:
+                    del self._files[next(iter(self._files))]
+        with self._lock:
+            signature = combine(self._files.get(key) for key in files)
+            self._agents[agent_id] = ((base, commit), signature)
+        return signature
+
+    def retain(self, agent_ids):
+        """Drop the fingerprints of agents not in agent_ids"""
+        for agent_id in set(self._agents) - set(agent_ids):
+            del self._agents[agent_id]
+
+    def agent_ids(self) -> List[str]:
+        """Agents with a fingerprint"""
+        return list(self._agents)
+
+    def similarity(self, first_id, second_id) -> float:
+        """Similarity of two agents' fingerprints, 0 if either has none"""
+        first, second = self._agents.get(first_id), self._agents.get(second_id)
+        return similarity(first[1], second[1]) if first and second else 0.0
+
+    def clusters(self, agent_ids=None) -> List[List[str]]:
+        """
+        Groups of two or more agents linked by fingerprints at least `threshold` similar. Links
+        are transitive, so two agents of a group are not necessarily that similar themselves.
+        """
+        signatures = [(agent_id, entry[1]) for agent_id, entry in self._agents.items()
+                      if entry[1] and (agent_ids is None or agent_id in agent_ids)]
+        parent = {agent_id: agent_id for agent_id, _ in signatures}
+
+        def root(agent_id):
+            while parent[agent_id] != agent_id:
+                parent[agent_id] = parent[parent[agent_id]]
+                agent_id = parent[agent_id]
+            return agent_id
+
+        for i, (first_id, first) in enumerate(signatures):
+            for second_id, second in signatures[i + 1:]:
+                if similarity(first, second) >= self.threshold:
+                    parent[root(second_id)] = root(first_id)
+        groups: Dict[str, List[str]] = {}
+        for agent_id, _ in signatures:
+            groups.setdefault(root(agent_id), []).append(agent_id)
+        clusters = [sorted(group) for group in groups.values() if len(group) > 1]
+        self.flagged = sum(len(cluster) for cluster in clusters)
+        return clusters
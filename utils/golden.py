@@ -0,0 +1,244 @@
+"""
+Agent checkouts created from a shared golden checkout instead of a clone per agent.
+
+One golden checkout is kept per (repository, HEAD commit). An agent's checkout is created
+from it by the first method that works:
+- reflink: every file is a copy-on-write clone (FICLONE, e.g. btrfs or XFS), no data is written
+- overlay: an overlayfs mount with the golden checkout as its read-only lower layer (Linux, root)
+- hardlink: `git clone --local`, which hard links the object store and checks out the files
+Reflinks and overlays leave the agent using disk only for what it changes. The remote HEAD is
+resolved at most once per head_ttl seconds, so creating many agents at once asks the remote once.
+"""
+import errno
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LINUX = sys.platform.startswith('linux')
+
+if LINUX:
+    import fcntl
+
+CLONE_MODES = ('clone', 'auto', 'reflink', 'overlay', 'hardlink')
+AUTO_METHODS = ('reflink', 'overlay', 'hardlink')
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+GIT_TIMEOUT = 600
+# Seconds a resolved remote HEAD is used before asking the remote again
+HEAD_TTL = 30
+# Number of golden checkouts kept per repository
+GOLDEN_KEEP = 2
+READY_MARKER = '.ready'
+OVERLAY_DIR = '.overlay'
+# Errors that mean the filesystem cannot reflink, as opposed to a failure on one file
+REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}
+
+
+def repository_name(repository_url: str) -> str:
+    """Directory name git clone would use for a repository URL"""
+    name = repository_url.rstrip('/').rstrip('\\')
+    name = name.replace('\\', '/').rsplit('/', 1)[-1].rsplit(':', 1)[-1]
+    if name.endswith('.git'):
+        name = name[:-4]
+    return name or 'repo'
+
+
+def _git(args, cwd=None) -> str:
+    return subprocess.run(['git'] + args, cwd=cwd, check=True, capture_output=True, text=True,
+                          timeout=GIT_TIMEOUT).stdout.strip()
+
+
+def _copy_tree(src, dst, copy_file):
+    os.mkdir(dst)
+    with os.scandir(src) as entries:
+        for entry in entries:
+            target = os.path.join(dst, entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir():
+                _copy_tree(entry.path, target, copy_file)
+            else:
+                copy_file(entry.path, target)
+    shutil.copystat(src, dst)
+
+
+def reflink_file(src, dst):
+    with open(src, 'rb') as source:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            fcntl.ioctl(fd, FICLONE, source.fileno())
+        finally:
+            os.close(fd)
+    shutil.copystat(src, dst)
+
+
+def overlay_mounts(prefix=None) -> List[Tuple[str, str]]:
+    """(mount point, options) of overlay mounts, those under prefix if given"""
+    mounts = []
+    try:
+        with open('/proc/self/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 4 or fields[2] != 'overlay':
+                    continue
+                # /proc/mounts escapes spaces and other separators as octal
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                if prefix is None or mount_point == prefix or mount_point.startswith(prefix.rstrip('/') + '/'):
+                    mounts.append((mount_point, fields[3]))
+    except OSError:
+        pass
+    return mounts
+
+
+class GoldenCheckouts:
+    """
+    Golden checkouts under root, laid out as <sha1(url)>/<commit>/<repository name>.
+
+    Golden checkouts are never modified after they are marked ready. Old ones are handed to
+    discard (e.g. WorkspaceCollector.discard) unless an overlay still uses them.
+    """
+
+    def __init__(self, root, discard: Optional[Callable] = None, keep=GOLDEN_KEEP, head_ttl=HEAD_TTL):
+        self.root = Path(root)
+        self.discard = discard or (lambda path: shutil.rmtree(path, ignore_errors=True))
+        self.keep = keep
+        self.head_ttl = head_ttl
+        # Remote HEAD commit and time.monotonic() it was resolved at, by repository URL
+        self._heads: Dict[str, Tuple[str, float]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Methods that failed for a reason other than the files involved, by device
+        self._unsupported = set()
+
+    def _lock(self, key) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def remote_head(self, repository_url: str) -> Optional[str]:
+        """HEAD commit of the remote, from ls-remote at most once per head_ttl seconds"""
+        with self._locks_lock:
+            commit, resolved_at = self._heads.get(repository_url, (None, 0.0))
+        if commit and time.monotonic() - resolved_at < self.head_ttl:
+            return commit
+        try:
+            commit = _git(['ls-remote', repository_url, 'HEAD']).split()[0]
+        except (subprocess.SubprocessError, OSError, IndexError) as e:
+            logger.error(f"Could not resolve HEAD of {repository_url}: {e}")
+            return None
+        with self._locks_lock:
+            self._heads[repository_url] = (commit, time.monotonic())
+        return commit
+
+    def prepare(self, repository_url: str) -> Optional[Path]:
+        """Golden checkout of the repository's current HEAD, cloned if not already present"""
+        key = hashlib.sha1(repository_url.encode()).hexdigest()[:16]
+        name = repository_name(repository_url)
+        repo_root = self.root / key
+        with self._lock(key):
+            # Resolved under the lock, so agents created together wait for one ls-remote
+            commit = self.remote_head(repository_url)
+            if commit is None:
+                return None
+            golden = repo_root / commit / name
+            if (repo_root / commit / READY_MARKER).exists():
+                return golden
+            staging = repo_root / f".staging-{uuid.uuid4().hex[:8]}"
+            try:
+                staging.mkdir(parents=True)
+                _git(['clone', '--quiet', repository_url, name], cwd=staging)
+                checkout = staging / name
+                commit = _git(['rev-parse', 'HEAD'], cwd=checkout)
+                # Copies get new inodes and ctimes, only mtime and size tell git a file changed
+                _git(['config', 'core.checkStat', 'minimal'], cwd=checkout)
+                _git(['config', 'core.trustCtime', 'false'], cwd=checkout)
+                _git(['update-index', '--refresh', '-q'], cwd=checkout)
+                (staging / READY_MARKER).write_text(repository_url)
+                golden = repo_root / commit / name
+                if (repo_root / commit / READY_MARKER).exists():
+                    self.discard(staging)
+                else:
+                    if (repo_root / commit).exists():
+                        self.discard(repo_root / commit)
+                    os.rename(staging, repo_root / commit)
+                    logger.info(f"Prepared golden checkout of {repository_url} at {commit}: {golden}")
+            except (subprocess.SubprocessError, OSError) as e:
+                logger.error(f"Could not prepare golden checkout of {repository_url}: {e}", exc_info=True)
+                self.discard(staging)
+                return None
+            self._prune(repo_root, keep=golden.parent)
+            return golden
+
+    def _prune(self, repo_root: Path, keep: Path):
+        in_use = ' '.join(options for _, options in overlay_mounts())
+        ready = sorted((p for p in repo_root.iterdir() if (p / READY_MARKER).exists() and p != keep),
+                       key=lambda p: (p / READY_MARKER).stat().st_mtime, reverse=True)
+        for old in ready[self.keep - 1:]:
+            if str(old) in in_use:
+                continue
+            logger.info(f"Discarding old golden checkout {old}")
+            self.discard(old)
+
+    def materialize(self, golden: Path, dest: Path, workspace: Path, mode='auto') -> Optional[str]:
+        """Create dest from a golden checkout; returns the method used, None if all failed"""
+        methods = AUTO_METHODS if mode == 'auto' else (mode, 'hardlink')
+        device = os.stat(workspace).st_dev
+        for method in dict.fromkeys(methods):
+            if (method, device) in self._unsupported:
+                continue
+            try:
+                if method == 'reflink':
+                    if not LINUX:
+                        raise OSError(errno.EOPNOTSUPP, 'reflinks need Linux')
+                    _copy_tree(golden, dest, reflink_file)
+                elif method == 'overlay':
+                    self._mount_overlay(golden, dest, workspace)
+                else:
+                    self._clone_local(golden, dest)
+                return method
+            except (OSError, subprocess.SubprocessError) as e:
+                if method == 'overlay' or getattr(e, 'errno', None) in REFLINK_UNSUPPORTED:
+                    self._unsupported.add((method, device))
+                logger.info(f"Could not create {dest} with {method}: {e}")
+                self.release(workspace)
+                shutil.rmtree(dest, ignore_errors=True)
+                shutil.rmtree(workspace / OVERLAY_DIR, ignore_errors=True)
+        return None
+
+    def _clone_local(self, golden: Path, dest: Path):
+        _git(['clone', '--quiet', '--local', str(golden), str(dest)])
+        repository_url = (golden.parent / READY_MARKER).read_text()
+        _git(['remote', 'set-url', 'origin', repository_url], cwd=dest)
+
+    def _mount_overlay(self, golden: Path, dest: Path, workspace: Path):
+        if not LINUX or os.geteuid() != 0:
+            raise OSError(errno.EPERM, 'overlay mounts need Linux and root')
+        upper, work = workspace / OVERLAY_DIR / 'upper', workspace / OVERLAY_DIR / 'work'
+        paths = (str(golden), str(upper), str(work))
+        if any(c in p for p in paths for c in ',:'):
+            raise OSError(errno.EINVAL, 'overlay paths cannot contain , or :')
+        for path in (upper, work, dest):
+            path.mkdir(parents=True, exist_ok=True)
+        options = f"lowerdir={paths[0]},upperdir={paths[1]},workdir={paths[2]}"
+        subprocess.run(['mount', '-t', 'overlay', 'overlay', '-o', options, str(dest)], check=True,
+                       capture_output=True, timeout=GIT_TIMEOUT)
+
+    def release(self, workspace):
+        """Unmount overlay checkouts in a workspace, before it is moved or deleted"""
+        for mount_point, _ in overlay_mounts(str(workspace)):
+            try:
+                subprocess.run(['umount', mount_point], check=True, capture_output=True, timeout=60)
+            except (subprocess.SubprocessError, OSError):
+                # Busy, e.g. a process still has its cwd there: detach it now, unmount when free
+                subprocess.run(['umount', '-l', mount_point], capture_output=True, timeout=60)
+            logger.info(f"Unmounted overlay checkout {mount_point}")
@@ -0,0 +1,353 @@
+import os
+import hmac
+import json
+import ipaddress
+import queue
+import socket
+import struct
+import logging
+import itertools
+import threading
+import socketserver
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('!I')
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+SUBSCRIBER_QUEUE_SIZE = 10000
+
+
+def parse_address(address):
+    """
+    "host:port" or a (host, port) tuple selects TCP, anything else is a Unix socket path.
+    """
+    if isinstance(address, (tuple, list)):
+        return address[0], int(address[1])
+    host, sep, port = str(address).rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return str(address)
+
+
+def format_address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+
+def is_loopback(address) -> bool:
+    """Whether an address is a Unix socket or a TCP address only this machine can reach"""
+    address = parse_address(address)
+    if not isinstance(address, tuple):
+        return True
+    host = address[0].strip('[]')
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # A host name may resolve to any interface
+        return False
+
+
+def listen_error(address, token) -> Optional[str]:
+    """
+    Why serving the control API on an address is refused, or None. It can create agents and run
+    race commands, so any address reachable from other machines needs a token.
+    """
+    if token or is_loopback(address):
+        return None
+    return (f"Refusing to listen on {format_address(parse_address(address))} without ORCHESTRATOR_TOKEN: "
+            f"set a shared token to accept connections from other machines")
+
+
+class IpcError(Exception):
+    """Error returned by the remote side of a call, or a broken connection (status 503)"""
+
+    def __init__(self, message, status=500, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details or {}
+
+
+def send_message(sock, message):
+    """Write one length-prefixed JSON frame"""
+    data = json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+    if len(data) > MAX_MESSAGE_SIZE:
+        raise IpcError(f"Message of {len(data)} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("Connection closed in the middle of a frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """Read one length-prefixed JSON frame, None on a clean end of stream"""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise IpcError(f"Frame of {length} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    body = _recv_exactly(sock, length)
+    if body is None:
+        raise ConnectionError("Connection closed before the frame body")
+    return json.loads(body)
+
+
+class _Subscriber:
+    __slots__ = ('topics', 'queue', 'dropped')
+
+    def __init__(self, topics, maxsize):
+        self.topics = set(topics)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, frame):
+        """Enqueue without blocking, evicting the oldest frame when full"""
+        while True:
+            try:
+                self.queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class IpcServer:
+    """
+    Request/response and pub/sub over a Unix socket or TCP (see parse_address).
+
+    A request frame is {"id", "method", "params"} and is answered with {"id", "result"} or
+    {"id", "error": {"message", "status", "details"}}. A connection that calls the built-in
+    "subscribe" method with {"topics": [...]} becomes a push channel of {"topic", "data"}
+    frames. Slow subscribers lose their oldest frames instead of slowing down publishers.
+    When a token is set, every request must carry it in a "token" field.
+    """
+
+    def __init__(self, address, handler: Callable[[str, dict], object], subscriber_queue_size=SUBSCRIBER_QUEUE_SIZE,
+                 token: Optional[str] = None):
+        self.address = parse_address(address)
+        self.token = token
+        self.handler = handler
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._server = None
+        self._ready = threading.Event()
+
+    def publish(self, topic, data):
+        with self._subscribers_lock:
+            subscribers = [s for s in self._subscribers if topic in s.topics]
+        frame = {'topic': topic, 'data': data}
+        for subscriber in subscribers:
+            subscriber.offer(frame)
+
+    @property
+    def subscriber_count(self):
+        with self._subscribers_lock:
+            return len(self._subscribers)
+
+    def _authorized(self, request):
+        return not self.token or hmac.compare_digest(str(request.get('token', '')), self.token)
+
+    def _dispatch(self, request):
+        if not self._authorized(request):
+            return {'id': request.get('id'), 'error': {'message': 'Invalid IPC token', 'status': 401, 'details': {}}}
+        try:
+            return {'id': request.get('id'), 'result': self.handler(request.get('method'), request.get('params') or {})}
+        except Exception as e:
+            status = getattr(e, 'status', 500)
+            if status >= 500:
+                logger.error(f"Error handling IPC call {request.get('method')}: {e}", exc_info=True)
+            return {
+                'id': request.get('id'),
+                'error': {'message': str(e), 'status': status, 'details': getattr(e, 'details', {})}
+            }
+
+    def _serve_subscriber(self, sock, request):
+        subscriber = _Subscriber(request.get('params', {}).get('topics', []), self.subscriber_queue_size)
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        try:
+            send_message(sock, {'id': request.get('id'), 'result': {'subscribed': sorted(subscriber.topics)}})
+            while True:
+                frame = subscriber.queue.get()
+                if frame is None:
+                    break
+                send_message(sock, frame)
+        except OSError:
+            pass
+        finally:
+            with self._subscribers_lock:
+                self._subscribers.discard(subscriber)
+            if subscriber.dropped:
+                logger.warning(f"IPC subscriber dropped {subscriber.dropped} frames")
+
+    def serve_forever(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    while True:
+                        request = recv_message(self.request)
+                        if request is None:
+                            return
+                        if request.get('method') == 'subscribe' and server._authorized(request):
+                            server._serve_subscriber(self.request, request)
+                            return
+                        send_message(self.request, server._dispatch(request))
+                except (OSError, ValueError, IpcError) as e:
+                    logger.debug(f"IPC connection closed: {e}")
+
+            def setup(self):
+                if isinstance(server.address, tuple):
+                    self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if isinstance(self.address, tuple):
+            self._server = _ThreadingTCPServer(self.address, Handler)
+            # Report the real port when bound to port 0
+            self.address = self._server.server_address[:2]
+        else:
+            socket_dir = os.path.dirname(self.address)
+            if socket_dir:
+                os.makedirs(socket_dir, exist_ok=True)
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self._server = socketserver.ThreadingUnixStreamServer(self.address, Handler)
+            os.chmod(self.address, 0o600)
+        self._server.daemon_threads = True
+        logger.info(f"IPC server listening on {format_address(self.address)}")
+        self._ready.set()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def start(self):
+        """Serve from a daemon thread and return once the socket is listening"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True, name='ipc-server')
+        thread.start()
+        self._ready.wait(5)
+        return thread
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+        with self._subscribers_lock:
+            for subscriber in self._subscribers:
+                subscriber.offer(None)
+
+
+class IpcClient:
+    """Client for IpcServer; calls reconnect once on a broken connection"""
+
+    def __init__(self, address, timeout: Optional[float] = 30, token: Optional[str] = None):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self.token = token
+        self._sock = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = threading.Event()
+
+    def _connect(self):
+        if isinstance(self.address, tuple):
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, method, params, request_id):
+        request = {'id': request_id, 'method': method, 'params': params}
+        if self.token:
+            request['token'] = self.token
+        return request
+
+    def call(self, method, **params):
+        request = self._request(method, params, next(self._ids))
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect()
+                    send_message(self._sock, request)
+                    response = recv_message(self._sock)
+                    if response is None:
+                        raise ConnectionError("Server closed the connection")
+                    break
+                except OSError as e:
+                    if self._sock is not None:
+                        self._sock.close()
+                        self._sock = None
+                    if attempt:
+                        raise IpcError(f"Orchestrator at {format_address(self.address)} is unavailable: {e}", status=503)
+        error = response.get('error')
+        if error:
+            raise IpcError(error.get('message'), error.get('status', 500), error.get('details'))
+        return response.get('result')
+
+    def subscribe(self, topics: Iterable[str], callback: Callable[[str, object], None], reconnect_delay=1.0):
+        """Deliver published frames to callback from a background thread, reconnecting as needed"""
+        topics = list(topics)
+
+        def run():
+            while not self._closed.is_set():
+                try:
+                    sock = self._connect()
+                    sock.settimeout(None)
+                    with sock:
+                        send_message(sock, self._request('subscribe', {'topics': topics}, 0))
+                        response = recv_message(sock) or {}
+                        if response.get('error'):
+                            raise IpcError(response['error'].get('message'), response['error'].get('status', 500))
+                        logger.info(f"Subscribed to {', '.join(topics)} on {format_address(self.address)}")
+                        while not self._closed.is_set():
+                            frame = recv_message(sock)
+                            if frame is None:
+                                break
+                            try:
+                                callback(frame['topic'], frame['data'])
+                            except Exception as e:
+                                logger.error(f"Error in IPC subscriber callback: {e}", exc_info=True)
+                except (OSError, ValueError, IpcError) as e:
+                    logger.warning(f"IPC subscription to {format_address(self.address)} lost: {e}")
+                self._closed.wait(reconnect_delay)
+
+        thread = threading.Thread(target=run, daemon=True, name='ipc-subscriber')
+        thread.start()
+        return thread
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
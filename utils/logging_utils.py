@@ -0,0 +1,186 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import logging.handlers
+from contextlib import contextmanager
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '10'))
+DEFAULT_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', '20'))
+
+# Pass as extra= at high-frequency call sites to rate limit them (see SamplingFilter)
+SAMPLED = {'sampled': True}
+
+_context = threading.local()
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def get_log_context():
+    return getattr(_context, 'fields', {})
+
+
+def set_log_context(**fields):
+    """Attach fields such as agent_id and session_id to every record logged from this thread"""
+    _context.fields = {**get_log_context(), **{k: v for k, v in fields.items() if v is not None}}
+
+
+def clear_log_context():
+    _context.fields = {}
+
+
+@contextmanager
+def log_context(**fields):
+    previous = get_log_context()
+    set_log_context(**fields)
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+class ContextFilter(logging.Filter):
+    """Copy the calling thread's log context onto the record before it leaves the thread"""
+
+    def filter(self, record):
+        fields = get_log_context()
+        if fields:
+            record.context = fields
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Token bucket per call site for records at or below max_level logged with extra=SAMPLED;
+    other records always pass. A call site may log `burst` records at once and `rate` per
+    second after that; the next record that gets through carries the number of records
+    dropped in between as `sampled_out`.
+    """
+
+    def __init__(self, rate=DEFAULT_SAMPLE_RATE, burst=DEFAULT_SAMPLE_BURST, max_level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno > self.max_level or not getattr(record, 'sampled', False):
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # [tokens, last refill, dropped since last pass]
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the record's context fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        entry.update(getattr(record, 'context', {}))
+        if getattr(record, 'sampled_out', 0):
+            entry['sampled_out'] = record.sampled_out
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback as exc_text instead of folding it into the
+    message, so the listener's formatters can still place it themselves.
+    """
+
+    def prepare(self, record):
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.message = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+def create_queue_handler(handlers, sample_rate=DEFAULT_SAMPLE_RATE, sample_burst=DEFAULT_SAMPLE_BURST):
+    """Return a (queue handler, started listener) pair that writes to handlers off-thread"""
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    if sample_rate > 0:
+        queue_handler.addFilter(SamplingFilter(sample_rate, sample_burst))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return queue_handler, listener
+
+
+def setup_logging(log_file, level=logging.INFO, max_bytes=5242880, backup_count=3,
+                  sample_rate=DEFAULT_SAMPLE_RATE, sample_burst=DEFAULT_SAMPLE_BURST):
+    """
+    Route the root logger through a queue: callers only enqueue records, a listener thread
+    writes JSON lines to a rotating log file and plain text to stderr. Like basicConfig,
+    later calls are no-ops once logging has been set up.
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(JsonFormatter())
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        _queue_handler, _listener = create_queue_handler(
+            [file_handler, stream_handler], sample_rate, sample_burst
+        )
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(_queue_handler)
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+            _listener.stop()
+            _listener = None
+            _queue_handler = None
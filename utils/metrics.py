@@ -0,0 +1,245 @@
+import bisect
+import threading
+import logging
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _ThreadShards:
+    """
+    Per-thread value cells. Each thread only ever writes its own cell, so updates need
+    no lock and allocate nothing after the first update from a thread; readers sum all cells.
+    The cells of threads that have exited are folded into a base total and dropped.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._cells = []
+        self._base = [0] * size
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self._size
+            with self._lock:
+                self._fold_exited()
+                self._cells.append((threading.current_thread(), cell))
+            self._local.cell = cell
+            return cell
+
+    def _fold_exited(self):
+        """Add the cells of exited threads to the base total; nothing writes them any more"""
+        live = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                live.append((thread, cell))
+            else:
+                for i, value in enumerate(cell):
+                    self._base[i] += value
+        self._cells = live
+
+    def totals(self):
+        with self._lock:
+            self._fold_exited()
+            totals = list(self._base)
+            cells = [cell for _, cell in self._cells]
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    type_name = 'untyped'
+    # Appended to the name in HELP and TYPE, as prometheus_client names counter families
+    family_suffix = ''
+    function_suffix = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._function = function
+        self._children: Dict[Tuple[str, ...], '_Metric'] = {}
+        self._children_lock = threading.Lock()
+
+    def set_function(self, function: Callable):
+        """
+        Compute the metric at scrape time. For unlabelled metrics the callback returns
+        a number; for labelled metrics it returns a dict mapping label value tuples to numbers.
+        """
+        self._function = function
+
+    def labels(self, *values):
+        """Return the child for a label combination; cache it on hot paths"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """Yield (suffix, labels, value) tuples"""
+        if self._function is not None:
+            yield from self._function_samples()
+        elif self.labelnames:
+            for key, child in list(self._children.items()):
+                labels = dict(zip(self.labelnames, key))
+                for suffix, extra, value in child._own_samples():
+                    yield suffix, {**labels, **extra}, value
+        else:
+            yield from self._own_samples()
+
+    def _function_samples(self):
+        try:
+            result = self._function()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {e}", exc_info=True)
+            return
+        if self.labelnames:
+            for key, value in result.items():
+                yield self.function_suffix, dict(zip(self.labelnames, key)), value
+        else:
+            yield self.function_suffix, {}, result
+
+    def _own_samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter with lock-free per-thread increments"""
+    type_name = 'counter'
+    family_suffix = '_total'
+    function_suffix = '_total'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames, function)
+        self._shards = _ThreadShards(1)
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount=1):
+        self._shards.cell()[0] += amount
+
+    def value(self):
+        return self._shards.totals()[0]
+
+    def _own_samples(self):
+        yield '_total', {}, self.value()
+
+
+class Gauge(_Metric):
+    """Gauge that is either set directly or computed by a callback at scrape time"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames, function)
+        self._value = 0
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value):
+        self._value = value
+
+    def _own_samples(self):
+        yield '', {}, self._value
+
+
+class Histogram(_Metric):
+    """Histogram with fixed buckets and lock-free per-thread observations"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # One cell per bucket, then +Inf, sum and count
+        self._shards = _ThreadShards(len(self.buckets) + 3)
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value):
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def _own_samples(self):
+        totals = self._shards.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            yield '_bucket', {'le': _format_value(bound)}, cumulative
+        yield '_sum', {}, totals[-2]
+        yield '_count', {}, totals[-1]
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return f"{value:.1f}"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            family = metric.name + metric.family_suffix
+            lines.append(f"# HELP {family} {metric.documentation}")
+            lines.append(f"# TYPE {family} {metric.type_name}")
+            for suffix, labels, value in metric._samples():
+                label_text = ''
+                if labels:
+                    label_text = '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+                lines.append(f"{metric.name}{suffix}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,197 @@
+import os
+import sys
+import signal
+import select
+import codecs
+import struct
+import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
+
+PTY_SUPPORTED = sys.platform.startswith('linux')
+
+if PTY_SUPPORTED:
+    import fcntl
+    import termios
+
+DEFAULT_ROWS = 50
+DEFAULT_COLS = 200
+CHUNK_SIZE = 65536
+
+
+def set_window_size(fd, rows, cols):
+    """Set the terminal window size of a pty file descriptor"""
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+
+def get_window_size(fd):
+    """Return the (rows, cols) terminal window size of a pty file descriptor"""
+    rows, cols, _, _ = struct.unpack('HHHH', fcntl.ioctl(fd, termios.TIOCGWINSZ, b'\0' * 8))
+    return rows, cols
+
+
+class OutputDecoder:
+    """
+    Incremental UTF-8 decoder for terminal output that turns CRLF into LF. A chunk ending in CR
+    is held back until the next one shows whether it is half of a CRLF; a bare CR is kept, it
+    restarts the line for progress bars.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._carriage_return = False
+
+    def decode(self, data, final=False):
+        text = self._decoder.decode(data, final)
+        if self._carriage_return:
+            text = '\r' + text
+            self._carriage_return = False
+        if text.endswith('\r') and not final:
+            text = text[:-1]
+            self._carriage_return = True
+        return text.replace('\r\n', '\n')
+
+
+class PtyWriter:
+    """
+    Minimal file-like writer for the master side of a pty, used as a process stdin.
+    The master fd is owned by the PtyProcess and read from it on every write, so nothing is
+    written to a descriptor number that was closed and reused since.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.closed = False
+
+    @property
+    def fd(self):
+        return self.owner.master_fd
+
+    def write(self, data):
+        if self.closed or self.fd is None:
+            raise ValueError("write to closed pty")
+        payload = data.encode('utf-8')
+        while payload:
+            fd = self.fd
+            if fd is None:
+                raise ValueError("write to closed pty")
+            try:
+                written = os.write(fd, payload)
+            except BlockingIOError:
+                select.select([], [fd], [], 1.0)
+                continue
+            payload = payload[written:]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Send end-of-file to the terminal, unless PtyProcess already closed the master fd"""
+        if not self.closed:
+            fd = self.fd
+            if fd is not None:
+                try:
+                    os.write(fd, b'\x04')
+                except OSError:
+                    pass
+            self.closed = True
+
+
+class PtyProcess:
+    """Runs a command attached to a pseudo-terminal with chunked non-blocking reads"""
+
+    def __init__(self, cmd, cwd=None, env=None, rows=DEFAULT_ROWS, cols=DEFAULT_COLS):
+        if not PTY_SUPPORTED:
+            raise OSError("Pseudo-terminal backend is only supported on Linux")
+
+        master_fd, slave_fd = os.openpty()
+        try:
+            set_window_size(slave_fd, rows, cols)
+            env = dict(env or os.environ)
+            env.setdefault('TERM', 'xterm-256color')
+            env['COLUMNS'] = str(cols)
+            env['LINES'] = str(rows)
+            self.process = subprocess.Popen(
+                cmd,
+                shell=isinstance(cmd, str),
+                cwd=cwd,
+                env=env,
+                stdin=slave_fd,
+                stdout=slave_fd,
+                stderr=slave_fd,
+                start_new_session=True,
+                close_fds=True
+            )
+        except Exception:
+            os.close(master_fd)
+            raise
+        finally:
+            os.close(slave_fd)
+
+        os.set_blocking(master_fd, False)
+        self.master_fd = master_fd
+        self.stdin = PtyWriter(self)
+        self.stdout = None
+        self.stderr = None
+        self._decoder = OutputDecoder()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def poll(self):
+        return self.process.poll()
+
+    def wait(self, timeout=None):
+        return self.process.wait(timeout=timeout)
+
+    def terminate(self):
+        self.process.terminate()
+
+    def kill(self):
+        self.process.kill()
+
+    def resize(self, rows, cols):
+        """Resize the terminal and notify the child process group"""
+        if self.master_fd is None:
+            return
+        set_window_size(self.master_fd, rows, cols)
+        try:
+            os.killpg(os.getpgid(self.process.pid), signal.SIGWINCH)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def read_chunk(self, timeout=0.1):
+        """
+        Read whatever output is available without waiting for a full line.
+        Returns '' when nothing arrived within the timeout and None on EOF.
+        """
+        if self.master_fd is None:
+            return None
+        readable, _, _ = select.select([self.master_fd], [], [], timeout)
+        if not readable:
+            return ''
+        try:
+            data = os.read(self.master_fd, CHUNK_SIZE)
+        except BlockingIOError:
+            return ''
+        except OSError:
+            # Linux raises EIO on the master once every slave handle is closed
+            data = b''
+        if not data:
+            return None
+        return self._decoder.decode(data)
+
+    def close(self):
+        if self.master_fd is not None:
+            try:
+                os.close(self.master_fd)
+            except OSError:
+                pass
+            self.master_fd = None
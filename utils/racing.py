@@ -0,0 +1,173 @@
+"""
+Best-of-N racing between the agents working on the same task.
+
+A race has a policy with its success criterion: a shell command that must pass on the agent's
+commit (run in a detached git worktree, so the agent's working tree is not disturbed). Each new
+commit an agent makes is evaluated in the background, on the verification pool when there is one;
+the first agent whose commit meets every criterion wins, and the other agents are cancelled
+or, with on_win='deprioritize', left running at the lowest CPU priority.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.verification import run_verification
+
+logger = logging.getLogger(__name__)
+
+ON_WIN_ACTIONS = ('cancel', 'deprioritize')
+DEFAULT_TEST_TIMEOUT = 600
+OUTPUT_TAIL_CHARS = 2000
+LOSER_NICE = 19
+
+
+class RacePolicy:
+    """Success criterion of a race and what happens to the other agents when one wins"""
+
+    def __init__(self, test_command: Optional[str] = None, on_win: str = 'cancel',
+                 timeout: int = DEFAULT_TEST_TIMEOUT):
+        if on_win not in ON_WIN_ACTIONS:
+            raise ValueError(f"on_win must be one of {', '.join(ON_WIN_ACTIONS)}")
+        if not test_command:
+            raise ValueError("A race needs a test_command")
+        self.test_command = test_command
+        self.on_win = on_win
+        self.timeout = int(timeout)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> Optional['RacePolicy']:
+        if not data:
+            return None
+        # Critiques are free text without a score, so a score threshold could never be met
+        if data.get('min_score') is not None:
+            raise ValueError("min_score is not supported, races are judged by test_command")
+        return cls(test_command=data.get('test_command'),
+                   on_win=data.get('on_win', 'cancel'), timeout=data.get('timeout', DEFAULT_TEST_TIMEOUT))
+
+    def to_dict(self) -> dict:
+        return {
+            'test_command': self.test_command,
+            'on_win': self.on_win,
+            'timeout': self.timeout
+        }
+
+
+def head_commit(repo_path) -> Optional[str]:
+    """Commit checked out in a repository, read from .git without starting git"""
+    git_dir = Path(repo_path) / '.git'
+    try:
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head or None
+        ref = head[5:]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text().strip() or None
+        packed = git_dir / 'packed-refs'
+        if packed.is_file():
+            for line in packed.read_text().splitlines():
+                if line.endswith(' ' + ref):
+                    return line.split(' ', 1)[0]
+    except OSError:
+        pass
+    return None
+
+
+def evaluate(repo_path, commit, policy: RacePolicy, env=None, verifier=None) -> dict:
+    """Check one commit against a race policy; the test command goes through verifier if given"""
+    start = time.perf_counter()
+    if verifier is not None:
+        verification = verifier.verify(repo_path, commit, policy.test_command, env=env, timeout=policy.timeout)
+    else:
+        verification = run_verification(repo_path, commit, policy.test_command, timeout=policy.timeout, env=env)
+    return race_result(commit, verification, start)
+
+
+def race_result(commit, verification: dict, start: float) -> dict:
+    """Evaluation of a commit from the verification of its test command, started at start"""
+    result = {'commit': commit, 'passed': False, 'reason': None, 'returncode': None, 'output': None}
+    result.update(passed=verification['passed'], returncode=verification.get('returncode'),
+                  output=(verification.get('output') or '')[-OUTPUT_TAIL_CHARS:],
+                  seconds=round(time.perf_counter() - start, 3))
+    if not verification['passed']:
+        result['reason'] = f"test command {verification['reason']}"
+    return result
+
+
+def deprioritize(pid) -> bool:
+    """Lower the CPU priority of a process and its descendants (Linux)"""
+    if not pid or not sys.platform.startswith('linux'):
+        return False
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    lowered = False
+    for current in pids:
+        try:
+            os.setpriority(os.PRIO_PROCESS, current, LOSER_NICE)
+            lowered = True
+        except OSError as e:
+            logger.debug(f"Could not lower priority of {current}: {e}")
+    return lowered
+
+
+class RaceJudge:
+    """
+    Runs evaluations in the background; the main loop collects finished ones. With a verifier
+    the test commands share its pool and its worker bound, otherwise the judge has a pool of its own.
+    """
+
+    def __init__(self, max_workers=2, verifier=None):
+        self.verifier = verifier
+        self._pool = None if verifier is not None else ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='race-judge')
+        self._pending: Dict[str, str] = {}
+        self._results: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def pending(self, agent_id) -> Optional[str]:
+        """Commit being evaluated for an agent, if any"""
+        return self._pending.get(agent_id)
+
+    def submit(self, agent_id, repo_path, commit, policy: RacePolicy, env=None):
+        with self._lock:
+            if agent_id in self._pending:
+                return False
+            self._pending[agent_id] = commit
+        if self.verifier is None:
+            self._pool.submit(self._evaluate, agent_id, repo_path, commit, policy, env)
+            return True
+        start = time.perf_counter()
+        future = self.verifier.schedule(repo_path, commit, policy.test_command, env=env, timeout=policy.timeout)
+        future.add_done_callback(lambda done: self._finish(agent_id, commit, lambda: race_result(
+            commit, done.result(), start)))
+        return True
+
+    def _evaluate(self, agent_id, repo_path, commit, policy, env):
+        self._finish(agent_id, commit, lambda: evaluate(repo_path, commit, policy, env))
+
+    def _finish(self, agent_id, commit, evaluation):
+        try:
+            result = evaluation()
+        except Exception as e:
+            logger.error(f"Error evaluating commit {commit} of agent {agent_id}: {e}", exc_info=True)
+            result = {'commit': commit, 'passed': False, 'reason': f'evaluation failed: {e}'}
+        with self._lock:
+            self._pending.pop(agent_id, None)
+            self._results.append((agent_id, result))
+
+    def results(self) -> List[tuple]:
+        """(agent_id, result) of evaluations finished since the last call, oldest first"""
+        with self._lock:
+            results, self._results = self._results, []
+        return results
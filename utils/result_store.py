@@ -0,0 +1,158 @@
+"""
+Results of finished tasks, reused when the same task is submitted again.
+
+A result is keyed by the repository URL, the commit the agent started from, the task text
+with whitespace normalized, and the model. It is a JSON file with the outcome and a git
+bundle of the agent's commits, both named by the key hash. A later agent with the same key
+gets the result by fetching the bundle into a fresh checkout and fast-forwarding its branch:
+the same commits, without running aider. Writes are atomic renames, so several orchestrator
+processes can share the store. Results unused for RESULT_STORE_MAX_AGE_DAYS are deleted, and
+beyond RESULT_STORE_MAX_RESULTS the least recently used ones go first.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = Path(os.environ.get(
+    'RESULT_STORE_DIR',
+    Path.home() / '.cache' / '100x-orchestrator' / 'results'
+))
+MAX_RESULTS = int(os.environ.get('RESULT_STORE_MAX_RESULTS', '500'))
+MAX_AGE_DAYS = float(os.environ.get('RESULT_STORE_MAX_AGE_DAYS', '30'))
+GIT_TIMEOUT = 120
+
+
+def normalize_task(task: str) -> str:
+    """Task text with runs of whitespace collapsed, so reformatted resubmissions match"""
+    return ' '.join((task or '').split())
+
+
+def normalize_url(url: str) -> str:
+    url = (url or '').strip().rstrip('/')
+    return url[:-4] if url.endswith('.git') else url
+
+
+def result_key(repository_url, base_commit, task, model) -> str:
+    fields = (normalize_url(repository_url), base_commit or '', normalize_task(task), model or '')
+    return hashlib.sha256('\0'.join(fields).encode()).hexdigest()
+
+
+def _git(repo_path, *args) -> subprocess.CompletedProcess:
+    return subprocess.run(['git', *args], cwd=repo_path, check=True, capture_output=True, timeout=GIT_TIMEOUT)
+
+
+class ResultStore:
+    """Task results by (repository URL, base commit, task, model), a JSON file and a bundle each"""
+
+    def __init__(self, root=STORE_DIR, max_results=MAX_RESULTS, max_age_days=MAX_AGE_DAYS):
+        self.root = Path(root)
+        self.max_results = max_results
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key, suffix='.json') -> Path:
+        return self.root / f"{key}{suffix}"
+
+    def get(self, repository_url, base_commit, task, model) -> Optional[dict]:
+        path = self._path(result_key(repository_url, base_commit, task, model))
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            # Modification time is last use, what prune() goes by
+            os.utime(path)
+        except FileNotFoundError:
+            result = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable task result {path}: {e}")
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def record(self, repository_url, base_commit, task, model, repo_path, commit, **details) -> Optional[dict]:
+        """Store the commits from base_commit to commit in repo_path as the result of the task"""
+        key = result_key(repository_url, base_commit, task, model)
+        path = self._path(key)
+        # Unique per writer, renamed into place
+        tmp = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        bundle = self._path(key, '.bundle')
+        ref = f"refs/results/{key}"
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            diffstat = _git(repo_path, 'diff', '--shortstat', base_commit, commit).stdout.decode().strip()
+            # A bundle needs a ref to carry the commits
+            _git(repo_path, 'update-ref', ref, commit)
+            try:
+                _git(repo_path, 'bundle', 'create', str(bundle) + tmp, ref, f"^{base_commit}")
+            finally:
+                _git(repo_path, 'update-ref', '-d', ref)
+            result = dict(details, repository_url=repository_url, base_commit=base_commit,
+                          task=normalize_task(task), model=model, commit=commit, ref=ref, diffstat=diffstat,
+                          recorded_at=datetime.datetime.now().isoformat())
+            with open(str(path) + tmp, 'w') as f:
+                json.dump(result, f)
+            os.replace(str(bundle) + tmp, bundle)
+            os.replace(str(path) + tmp, path)
+            self.prune()
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            logger.error(f"Could not store the result of commit {commit[:8]} in {repo_path}: {e} "
+                         f"{stderr.decode(errors='replace')}")
+            for leftover in (str(bundle) + tmp, str(path) + tmp):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+            return None
+        return result
+
+    def prune(self) -> int:
+        """Delete results unused for max_age_days and the least recently used beyond max_results"""
+        entries = []
+        for path in self.root.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.max_age_days * 86400
+        removed = 0
+        for index, (mtime, path) in enumerate(entries):
+            if index < self.max_results and mtime >= cutoff:
+                continue
+            # The result first, so a concurrent get() never finds one without its bundle
+            for leftover in (path, path.with_suffix('.bundle')):
+                try:
+                    leftover.unlink()
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} stored task results from {self.root}")
+        return removed
+
+    def apply(self, result: dict, repo_path) -> Optional[str]:
+        """Fast-forward the checked out branch to a stored result's commit, returning it"""
+        bundle = self._path(result_key(result['repository_url'], result['base_commit'], result['task'],
+                                       result['model']), '.bundle')
+        try:
+            _git(repo_path, 'fetch', '--quiet', str(bundle), result['ref'])
+            _git(repo_path, 'merge', '--ff-only', '--quiet', result['commit'])
+            return _git(repo_path, 'rev-parse', 'HEAD').stdout.decode().strip()
+        except (subprocess.SubprocessError, OSError) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            logger.error(f"Could not apply the stored result {result['commit'][:8]} to {repo_path}: {e} "
+                         f"{stderr.decode(errors='replace')}")
+            return None
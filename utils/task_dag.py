@@ -0,0 +1,149 @@
+"""
+Tasks with dependencies between them, scheduled as a DAG.
+
+A task graph is submitted as a list where each entry is a task string or a dict
+`{"id": "core", "task": "...", "depends_on": ["schema"]}`. A task becomes ready when every
+task it depends on has finished, and its agents start from the commits those tasks finished
+with. The graph is a plain dict, stored under `dags` in the tasks file like races are:
+nodes by id with their state and timestamps. Times are kept so the wait of each task for
+an agent and the critical path of the whole graph can be reported.
+"""
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+WAITING = 'waiting'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+# A task that cannot run because a task it depends on failed
+BLOCKED = 'blocked'
+FINAL_STATES = (COMPLETED, FAILED, BLOCKED)
+
+
+def has_dependencies(tasks) -> bool:
+    """Whether a submitted task list uses the graph form"""
+    return any(isinstance(task, dict) for task in tasks or [])
+
+
+def parse_tasks(tasks) -> List[dict]:
+    """Task entries as {'id', 'task', 'depends_on'}, in dependency order; ValueError if invalid"""
+    nodes = []
+    for index, entry in enumerate(tasks):
+        if isinstance(entry, str):
+            entry = {'task': entry}
+        if not isinstance(entry, dict) or not str(entry.get('task') or '').strip():
+            raise ValueError(f"Task {index + 1} has no task text")
+        depends_on = entry.get('depends_on') or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        nodes.append({'id': str(entry.get('id') or f"task-{index + 1}"), 'task': entry['task'],
+                      'depends_on': [str(dependency) for dependency in depends_on]})
+    ids = [node['id'] for node in nodes]
+    duplicated = sorted({node_id for node_id in ids if ids.count(node_id) > 1})
+    if duplicated:
+        raise ValueError(f"Duplicate task ids: {', '.join(duplicated)}")
+    for node in nodes:
+        unknown = [dependency for dependency in node['depends_on'] if dependency not in ids]
+        if unknown:
+            raise ValueError(f"Task '{node['id']}' depends on unknown tasks: {', '.join(unknown)}")
+    return topological_order(nodes)
+
+
+def topological_order(nodes: List[dict]) -> List[dict]:
+    by_id = {node['id']: node for node in nodes}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(node_id, path):
+        if node_id in done:
+            return
+        if node_id in visiting:
+            raise ValueError(f"Tasks depend on each other in a cycle: {' -> '.join(path + [node_id])}")
+        visiting.add(node_id)
+        for dependency in by_id[node_id]['depends_on']:
+            visit(dependency, path + [node_id])
+        visiting.discard(node_id)
+        done.add(node_id)
+        ordered.append(by_id[node_id])
+
+    for node in nodes:
+        visit(node['id'], [])
+    return ordered
+
+
+def new_dag(tasks, **settings) -> dict:
+    """A task graph ready to be scheduled; settings are passed on to the agents of every task"""
+    now = datetime.datetime.now().isoformat()
+    nodes = {}
+    for node in parse_tasks(tasks):
+        nodes[node['id']] = dict(node, state=WAITING, agent_ids=[], reason=None, queued_at=None, started_at=None,
+                                 queue_wait_seconds=None, finished_at=None, agent_id=None, repo_path=None,
+                                 branch=None, commit=None)
+    return {'created_at': now, 'finished_at': None, 'settings': settings, 'nodes': nodes,
+            'critical_path': None, 'critical_path_seconds': None}
+
+
+def ready_nodes(dag) -> List[str]:
+    """Waiting tasks whose dependencies have all completed, dependencies first"""
+    nodes = dag['nodes']
+    return [node_id for node_id, node in nodes.items() if node['state'] == WAITING
+            and all(nodes[dependency]['state'] == COMPLETED for dependency in node['depends_on'])]
+
+
+def block_dependents(dag) -> List[str]:
+    """Mark waiting tasks that depend, directly or not, on a failed task as blocked"""
+    nodes = dag['nodes']
+    blocked = []
+    changed = True
+    while changed:
+        changed = False
+        for node_id, node in nodes.items():
+            if node['state'] != WAITING:
+                continue
+            stopped = [dependency for dependency in node['depends_on'] if nodes[dependency]['state'] in (FAILED, BLOCKED)]
+            if stopped:
+                node.update(state=BLOCKED, reason=f"Depends on {', '.join(stopped)}, which did not complete",
+                            finished_at=datetime.datetime.now().isoformat())
+                blocked.append(node_id)
+                changed = True
+    return blocked
+
+
+def is_finished(dag) -> bool:
+    return all(node['state'] in FINAL_STATES for node in dag['nodes'].values())
+
+
+def _seconds(start, end) -> float:
+    return (datetime.datetime.fromisoformat(end) - datetime.datetime.fromisoformat(start)).total_seconds()
+
+
+def queue_wait(node) -> Optional[float]:
+    """Seconds between a task becoming ready and its agents starting"""
+    if not node.get('queued_at') or not node.get('started_at'):
+        return None
+    return _seconds(node['queued_at'], node['started_at'])
+
+
+def critical_path(dag) -> Tuple[List[str], Optional[float]]:
+    """
+    The chain of completed tasks that decided when the graph finished: from the last task to
+    finish, repeatedly the dependency that finished last. Seconds are from graph creation.
+    """
+    nodes = dag['nodes']
+    finished = [node_id for node_id, node in nodes.items() if node['state'] == COMPLETED and node['finished_at']]
+    if not finished:
+        return [], None
+    node_id = max(finished, key=lambda candidate: nodes[candidate]['finished_at'])
+    path = [node_id]
+    while nodes[node_id]['depends_on']:
+        node_id = max(nodes[node_id]['depends_on'], key=lambda dependency: nodes[dependency]['finished_at'] or '')
+        path.append(node_id)
+    path.reverse()
+    return path, _seconds(dag['created_at'], nodes[path[-1]]['finished_at'])
+
+
+def summary(dag) -> Dict[str, int]:
+    """Number of tasks by state"""
+    counts: Dict[str, int] = {}
+    for node in dag['nodes'].values():
+        counts[node['state']] = counts.get(node['state'], 0) + 1
+    return counts
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+import subprocess
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOLCHAIN = 'default'
+PROBE_TIMEOUT = 30
+CACHE_FILE = Path(os.environ.get(
+    'TOOLCHAIN_CACHE_FILE',
+    Path.home() / '.cache' / '100x-orchestrator' / 'toolchains.json'
+))
+
+
+class Toolchain:
+    """A registered aider executable and the result of its last probe"""
+
+    def __init__(self, name: str, executable: Optional[str]):
+        self.name = name
+        self.executable = executable
+        self.mtime = None
+        self.version = None
+        self.available = False
+        self.error = None
+        self.probed_at = None
+        self.probe_seconds = None
+        self.cached = False
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'executable': self.executable,
+            'mtime': self.mtime,
+            'version': self.version,
+            'available': self.available,
+            'error': self.error,
+            'probed_at': self.probed_at,
+            'probe_seconds': self.probe_seconds,
+            'cached': self.cached
+        }
+
+
+def resolve_executable(path: str) -> Optional[str]:
+    """Resolve an aider executable from a file path, a virtualenv directory or a command name"""
+    if not path:
+        return None
+    candidate = Path(path).expanduser()
+    if candidate.is_dir():
+        for relative in ('bin/aider', 'Scripts/aider.exe'):
+            if (candidate / relative).is_file():
+                return str((candidate / relative).resolve())
+        return None
+    if candidate.is_file():
+        return str(candidate.resolve())
+    return shutil.which(path)
+
+
+class ToolchainRegistry:
+    """
+    Probes registered aider toolchains once and serves cached results.
+    Probe results are cached by (executable path, mtime), both in memory and on disk,
+    so lookups on the agent creation path only need a stat() call.
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None):
+        self.cache_file = Path(cache_file) if cache_file else CACHE_FILE
+        self._toolchains: Dict[str, Toolchain] = {}
+        self._probe_cache: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._probed = False
+        self._load_cache()
+
+    def _cache_key(self, executable, mtime):
+        return f"{executable}:{mtime}"
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                self._probe_cache = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable toolchain cache {self.cache_file}: {e}")
+
+    def _save_cache(self):
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(self._probe_cache, f, indent=4)
+        except Exception as e:
+            logger.warning(f"Could not write toolchain cache {self.cache_file}: {e}")
+
+    def register(self, name: str, path: str) -> Toolchain:
+        """Register an aider executable or virtualenv under a name selectable per task"""
+        toolchain = Toolchain(name, resolve_executable(path))
+        if not toolchain.executable:
+            toolchain.error = f"aider executable not found for {path}"
+            logger.warning(f"Toolchain '{name}': {toolchain.error}")
+        with self._lock:
+            self._toolchains[name] = toolchain
+            self._probed = False
+        return toolchain
+
+    def register_from_env(self):
+        """
+        Register the default aider found on PATH plus any toolchains listed in
+        AIDER_TOOLCHAINS, e.g. AIDER_TOOLCHAINS="v065=/opt/aider-0.65,nightly=~/venvs/aider"
+        """
+        default_path = os.environ.get('AIDER_PATH')
+        if not default_path and sys.platform == "win32":
+            from utils.installation_utils import AiderInstallationManager
+            default_path = AiderInstallationManager.get_aider_path()
+        self.register(DEFAULT_TOOLCHAIN, default_path or 'aider')
+
+        for entry in os.environ.get('AIDER_TOOLCHAINS', '').split(','):
+            if '=' in entry:
+                name, path = entry.split('=', 1)
+                self.register(name.strip(), path.strip())
+
+    def probe(self, name: str) -> Toolchain:
+        """Run `aider --version` for a toolchain unless a cached result for its mtime exists"""
+        toolchain = self._toolchains[name]
+        if not toolchain.executable:
+            return toolchain
+
+        start = time.perf_counter()
+        try:
+            toolchain.mtime = os.stat(toolchain.executable).st_mtime
+        except OSError as e:
+            toolchain.available = False
+            toolchain.error = f"Cannot stat {toolchain.executable}: {e}"
+            return toolchain
+
+        key = self._cache_key(toolchain.executable, toolchain.mtime)
+        cached = self._probe_cache.get(key)
+        if cached:
+            toolchain.version = cached.get('version')
+            toolchain.available = cached.get('available', False)
+            toolchain.error = cached.get('error')
+            toolchain.cached = True
+        else:
+            try:
+                result = subprocess.run(
+                    [toolchain.executable, '--version'],
+                    capture_output=True,
+                    text=True,
+                    timeout=PROBE_TIMEOUT,
+                    env=dict(os.environ, PYTHONIOENCODING='utf-8')
+                )
+                toolchain.available = result.returncode == 0
+                toolchain.version = result.stdout.strip() or None
+                toolchain.error = None if toolchain.available else result.stderr.strip()
+            except (OSError, subprocess.TimeoutExpired) as e:
+                toolchain.available = False
+                toolchain.error = str(e)
+            toolchain.cached = False
+            self._probe_cache[key] = {
+                'version': toolchain.version,
+                'available': toolchain.available,
+                'error': toolchain.error
+            }
+            self._save_cache()
+
+        toolchain.probe_seconds = time.perf_counter() - start
+        toolchain.probed_at = time.time()
+        logger.info(
+            f"Toolchain '{name}' at {toolchain.executable}: "
+            f"{'available' if toolchain.available else 'unavailable'} "
+            f"({toolchain.version or toolchain.error}, {toolchain.probe_seconds:.3f}s"
+            f"{', cached' if toolchain.cached else ''})"
+        )
+        return toolchain
+
+    def probe_all(self):
+        """Probe every registered toolchain; meant to run once at startup"""
+        with self._lock:
+            if not self._toolchains:
+                self.register_from_env()
+            for name in list(self._toolchains):
+                self.probe(name)
+            self._probed = True
+
+    def ensure_probed(self):
+        if not self._probed:
+            self.probe_all()
+
+    def get(self, name: Optional[str] = None) -> Optional[Toolchain]:
+        """
+        Look up a probed toolchain. Only stats the executable: when its mtime changed
+        since the probe, the entry is re-probed in the background.
+        """
+        self.ensure_probed()
+        toolchain = self._toolchains.get(name or DEFAULT_TOOLCHAIN)
+        if not toolchain or not toolchain.executable:
+            return toolchain
+        try:
+            mtime = os.stat(toolchain.executable).st_mtime
+        except OSError:
+            toolchain.available = False
+            toolchain.error = f"{toolchain.executable} no longer exists"
+            return toolchain
+        if mtime != toolchain.mtime:
+            toolchain.mtime = mtime
+            threading.Thread(
+                target=self.probe, args=(toolchain.name,), daemon=True, name=f"probe-{toolchain.name}"
+            ).start()
+        return toolchain
+
+    def is_available(self, name: Optional[str] = None) -> bool:
+        toolchain = self.get(name)
+        return bool(toolchain and toolchain.available)
+
+    def names(self):
+        return list(self._toolchains)
+
+    def to_dict(self) -> Dict:
+        return {name: toolchain.to_dict() for name, toolchain in self._toolchains.items()}
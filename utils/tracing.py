@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = '100x-orchestrator'
+ROOT_SPAN_NAME = 'agent'
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """A timed stage of an agent's lifecycle"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_span_id', 'start_time_ns', 'end_time_ns',
+                 'attributes', 'events', 'status', 'status_message', '_tracer', '_agent_id')
+
+    def __init__(self, tracer, agent_id, name, trace_id, parent_span_id=None, start_time_ns=None, attributes=None):
+        self._tracer = tracer
+        self._agent_id = agent_id
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent_span_id
+        self.start_time_ns = start_time_ns or time.time_ns()
+        self.end_time_ns = None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = STATUS_UNSET
+        self.status_message = ''
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, time_ns=None, **attributes):
+        self.events.append({'name': name, 'time_ns': time_ns or time.time_ns(), 'attributes': attributes})
+
+    def set_error(self, message):
+        self.status = STATUS_ERROR
+        self.status_message = str(message)
+
+    def end(self, end_time_ns=None):
+        if self.end_time_ns is not None:
+            return
+        self.end_time_ns = end_time_ns or time.time_ns()
+        if self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+        self._tracer._on_end(self)
+
+    @property
+    def duration_ms(self):
+        end = self.end_time_ns or time.time_ns()
+        return (end - self.start_time_ns) / 1e6
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.end_time_ns or time.time_ns()),
+            'attributes': _otlp_attributes({'agent.id': self._agent_id, **self.attributes}),
+            'events': [
+                {
+                    'timeUnixNano': str(event['time_ns']),
+                    'name': event['name'],
+                    'attributes': _otlp_attributes(event['attributes'])
+                }
+                for event in self.events
+            ],
+            'status': {'code': self.status}
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp_document(spans: List[Span]) -> Dict:
+    """Wrap spans in an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': f'{SERVICE_NAME}.tracing'},
+                'spans': [span.to_otlp() for span in spans]
+            }]
+        }]
+    }
+
+
+class OtlpFileExporter:
+    """
+    Appends finished spans to a file as OTLP/JSON lines, one ExportTraceServiceRequest
+    per line, the format read by the OpenTelemetry collector's file receiver.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(str(path))
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        try:
+            line = json.dumps(otlp_document(spans), separators=(',', ':'))
+            with self._lock:
+                with open(self.path, 'a') as f:
+                    f.write(line + '\n')
+        except Exception as e:
+            logger.error(f"Error exporting spans to {self.path}: {e}", exc_info=True)
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'root', 'spans')
+
+    def __init__(self, trace_id, root):
+        self.trace_id = trace_id
+        self.root = root
+        self.spans = []
+
+
+class Tracer:
+    """
+    Keeps one trace per agent in memory. Each trace has an open root span that collects
+    lifecycle events (first byte, first commit); stages are recorded as child spans.
+    """
+
+    def __init__(self, max_traces=500, max_spans_per_trace=256, exporter: Optional[OtlpFileExporter] = None):
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.exporter = exporter
+        self._traces: 'OrderedDict[str, _Trace]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _trace(self, agent_id, start_time_ns=None) -> _Trace:
+        with self._lock:
+            trace = self._traces.get(agent_id)
+            if trace is None:
+                trace_id = uuid.uuid4().hex
+                root = Span(self, agent_id, ROOT_SPAN_NAME, trace_id, start_time_ns=start_time_ns)
+                trace = self._traces[agent_id] = _Trace(trace_id, root)
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            return trace
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start_span(self, agent_id, name, start_time_ns=None, **attributes) -> Span:
+        """Start a span under the current span of this thread, or under the agent's root span"""
+        start_time_ns = start_time_ns or time.time_ns()
+        if not agent_id:
+            # Sessions not yet associated with an agent get a span that is never stored
+            return Span(self, None, name, '', start_time_ns=start_time_ns, attributes=attributes)
+        trace = self._trace(agent_id, start_time_ns)
+        parent = next((s for s in reversed(self._stack()) if s._agent_id == agent_id), trace.root)
+        span = Span(self, agent_id, name, trace.trace_id, parent.span_id, start_time_ns, attributes)
+        with self._lock:
+            if len(trace.spans) < self.max_spans_per_trace:
+                trace.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, agent_id, name, **attributes):
+        """Time a block as a span; exceptions mark the span as failed and propagate"""
+        span = self.start_span(agent_id, name, **attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            stack.remove(span)
+            span.end()
+
+    def record_span(self, agent_id, name, start_time_ns, end_time_ns, **attributes) -> Span:
+        """Record a stage that was timed elsewhere, e.g. once for several agents"""
+        span = self.start_span(agent_id, name, start_time_ns=start_time_ns, **attributes)
+        span.end(end_time_ns)
+        return span
+
+    def event(self, agent_id, name, **attributes):
+        """Record a point-in-time lifecycle event on the agent's root span"""
+        if agent_id:
+            self._trace(agent_id).root.add_event(name, **attributes)
+
+    def _on_end(self, span):
+        if self.exporter is not None and span._agent_id:
+            self.exporter.export([span])
+
+    def finish(self, agent_id):
+        """End the agent's root span, export it and drop the trace"""
+        with self._lock:
+            trace = self._traces.pop(agent_id, None)
+        if trace is not None:
+            trace.root.end()
+
+    def spans(self, agent_id) -> List[Span]:
+        with self._lock:
+            trace = self._traces.get(agent_id)
+            return [trace.root] + list(trace.spans) if trace else []
+
+    def timeline(self, agent_id) -> Optional[Dict]:
+        """Waterfall view of an agent's trace with offsets relative to the first span"""
+        spans = self.spans(agent_id)
+        if not spans:
+            return None
+        root = spans[0]
+        origin = root.start_time_ns
+        depth = {root.span_id: 0}
+        rows = []
+        for span in sorted(spans[1:], key=lambda s: s.start_time_ns):
+            depth[span.span_id] = depth.get(span.parent_span_id, 0) + 1
+            rows.append({
+                'name': span.name,
+                'span_id': span.span_id,
+                'parent_span_id': span.parent_span_id,
+                'depth': depth[span.span_id],
+                'offset_ms': round((span.start_time_ns - origin) / 1e6, 3),
+                'duration_ms': round(span.duration_ms, 3),
+                'in_progress': span.end_time_ns is None,
+                'status': {STATUS_OK: 'ok', STATUS_ERROR: 'error'}.get(span.status, 'unset'),
+                'status_message': span.status_message or None,
+                'attributes': span.attributes
+            })
+        events = [
+            {
+                'name': event['name'],
+                'offset_ms': round((event['time_ns'] - origin) / 1e6, 3),
+                'attributes': event['attributes']
+            }
+            for event in root.events
+        ]
+        ends = [span.end_time_ns for span in spans[1:] if span.end_time_ns]
+        ends += [event['time_ns'] for event in root.events]
+        return {
+            'agent_id': agent_id,
+            'trace_id': root.trace_id,
+            'started_at_unix_ms': origin // 1_000_000,
+            'total_ms': round((max(ends, default=origin) - origin) / 1e6, 3),
+            'spans': rows,
+            'events': sorted(events, key=lambda e: e['offset_ms'])
+        }
+
+    def to_otlp(self, agent_id) -> Optional[Dict]:
+        spans = self.spans(agent_id)
+        return otlp_document(spans) if spans else None
+
+
+def _exporter_from_env():
+    path = os.environ.get('TRACE_EXPORT_FILE')
+    return OtlpFileExporter(path) if path else None
+
+
+TRACER = Tracer(exporter=_exporter_from_env())
@@ -0,0 +1,264 @@
+"""
+Verification of agent commits with a configured test or lint command.
+
+Each job runs the command in a detached git worktree of the commit, so it sees exactly what
+the agent committed and nothing it is still editing. Jobs run on a bounded pool, each in its
+own process group with a wall-clock timeout (the whole group is killed) and, on POSIX, shell
+ulimits for CPU time and memory. Output goes to a temporary file and only its tail is kept.
+Results are structured dicts cached by commit, command, limits and environment: a commit only
+needs verifying once per setup.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 600
+OUTPUT_TAIL_CHARS = 4000
+CACHE_SIZE = 1000
+CACHE_DIR = Path.home() / '.cache' / '100x-orchestrator'
+# Set per shell or per login, they do not change what a command does
+VOLATILE_ENV = ('_', 'OLDPWD', 'PWD', 'SHLVL')
+# Outcomes that depend only on the commit and how the command is run, and can be cached
+CACHEABLE = ('passed', 'failed')
+# "3 passed, 1 failed, 2 errors in 0.52s" style summaries (pytest, unittest-like runners)
+COUNT_PATTERN = re.compile(r'(\d+) (passed|failed|errors?|skipped|xfailed|xpassed|warnings?)\b')
+
+
+def summarize_output(output: str) -> Dict[str, int]:
+    """Test counts from the last summary line of a test runner's output, empty if none"""
+    for line in reversed(output.splitlines()):
+        counts = COUNT_PATTERN.findall(line)
+        if counts:
+            summary = {}
+            for count, kind in counts:
+                kind = {'error': 'errors', 'warning': 'warnings'}.get(kind, kind)
+                summary[kind] = summary.get(kind, 0) + int(count)
+            return summary
+    return {}
+
+
+def verification_summary(result: Optional[dict]) -> Optional[dict]:
+    """What the dashboard shows of a verification result"""
+    if not result:
+        return None
+    return {
+        'status': result.get('status'),
+        'commit': (result.get('commit') or '')[:8],
+        'summary': result.get('summary') or {},
+        'finished_at': result.get('finished_at')
+    }
+
+
+def default_cache_file(config_file) -> Path:
+    """VERIFY_CACHE_FILE, or a cache of its own for the orchestrator instance using config_file"""
+    if os.environ.get('VERIFY_CACHE_FILE'):
+        return Path(os.environ['VERIFY_CACHE_FILE'])
+    instance = hashlib.sha256(str(Path(config_file).resolve()).encode()).hexdigest()[:12]
+    return CACHE_DIR / f'verification-{instance}.json'
+
+
+def cache_key(commit, command, timeout, cpu_seconds=None, memory_mb=None, env=None) -> str:
+    """Everything a verification outcome depends on besides the commit's tree, hashed"""
+    env = os.environ if env is None else env
+    env_items = sorted((name, value) for name, value in env.items() if name not in VOLATILE_ENV)
+    env_hash = hashlib.sha256(json.dumps(env_items).encode()).hexdigest()
+    settings = json.dumps([command, timeout, cpu_seconds, memory_mb, env_hash])
+    return f"{commit}:{hashlib.sha256(settings.encode()).hexdigest()}"
+
+
+def _limited(command, cpu_seconds=None, memory_mb=None) -> str:
+    if os.name != 'posix':
+        return command
+    limits = []
+    if cpu_seconds:
+        limits.append(f"ulimit -t {int(cpu_seconds)}")
+    if memory_mb:
+        limits.append(f"ulimit -v {int(memory_mb) * 1024}")
+    return ' && '.join(limits + [f"({command})"]) if limits else command
+
+
+def _kill_group(process):
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_verification(repo_path, commit, command, timeout=DEFAULT_TIMEOUT, env=None,
+                     cpu_seconds=None, memory_mb=None) -> dict:
+    """Run command in a worktree of commit and describe the outcome"""
+    started_at = datetime.datetime.now().isoformat()
+    start = time.perf_counter()
+    result = {'commit': commit, 'command': command, 'status': 'error', 'passed': False, 'returncode': None,
+              'reason': None, 'summary': {}, 'output': '', 'started_at': started_at}
+    worktree = tempfile.mkdtemp(prefix='verify_')
+    try:
+        subprocess.run(['git', 'worktree', 'add', '--detach', '--force', worktree, commit], cwd=repo_path,
+                       check=True, capture_output=True, timeout=300)
+        with tempfile.TemporaryFile() as output_file:
+            process = subprocess.Popen(_limited(command, cpu_seconds, memory_mb), shell=True, cwd=worktree, env=env,
+                                       stdin=subprocess.DEVNULL, stdout=output_file, stderr=subprocess.STDOUT,
+                                       start_new_session=os.name == 'posix')
+            try:
+                result['returncode'] = process.wait(timeout=timeout)
+                result['status'] = 'passed' if result['returncode'] == 0 else 'failed'
+                if result['returncode'] != 0:
+                    result['reason'] = f"exited with {result['returncode']}"
+            except subprocess.TimeoutExpired:
+                _kill_group(process)
+                process.wait()
+                result['status'] = 'timeout'
+                result['reason'] = f"timed out after {timeout}s"
+            finally:
+                # Also stops anything the command left running in the background
+                _kill_group(process)
+            size = output_file.seek(0, os.SEEK_END)
+            output_file.seek(max(0, size - OUTPUT_TAIL_CHARS * 4))
+            output = output_file.read().decode('utf-8', errors='replace')[-OUTPUT_TAIL_CHARS:]
+        result['output'] = output
+        result['summary'] = summarize_output(output)
+    except subprocess.CalledProcessError as e:
+        result['reason'] = f"could not check out {commit}: {(e.stderr or b'').decode(errors='replace').strip()}"
+    except (subprocess.SubprocessError, OSError) as e:
+        result['reason'] = str(e)
+    finally:
+        subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=repo_path, capture_output=True)
+        shutil.rmtree(worktree, ignore_errors=True)
+    result['passed'] = result['status'] == 'passed'
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['finished_at'] = datetime.datetime.now().isoformat()
+    return result
+
+
+class VerificationCache:
+    """Results by cache_key(), least recently used first out, persisted as JSON"""
+
+    def __init__(self, path: Optional[Path] = None, maxsize=CACHE_SIZE):
+        self.path = Path(path) if path else None
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path and self.path.is_file():
+            try:
+                with open(self.path) as f:
+                    # Entries keyed by (commit, command) alone predate cache_key() and are dropped
+                    self._entries.update((key, value) for key, value in json.load(f).items() if '\0' not in key)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable verification cache {self.path}: {e}")
+
+    def get(self, key) -> Optional[dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result, cached=True)
+
+    def put(self, key, result: dict):
+        if result.get('status') not in CACHEABLE:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            entries = dict(self._entries)
+        if self.path:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix('.tmp')
+                with open(tmp, 'w') as f:
+                    json.dump(entries, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"Could not write verification cache {self.path}: {e}")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class VerificationRunner:
+    """
+    Bounded pool of verification jobs, at most one pending per key (an agent id). The main
+    loop submits commits and collects finished results with results().
+    """
+
+    def __init__(self, max_workers=2, timeout=DEFAULT_TIMEOUT, cpu_seconds=None, memory_mb=None,
+                 cache: Optional[VerificationCache] = None):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.cache = cache if cache is not None else VerificationCache(path=None)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='verify')
+        self._pending: Dict[str, str] = {}
+        self._results: List[tuple] = []
+        self._lock = threading.Lock()
+        self.jobs_run = 0
+
+    def verify(self, repo_path, commit, command, env=None, timeout=None) -> dict:
+        """Result for a commit from the cache, or from running the command now"""
+        timeout = timeout or self.timeout
+        key = cache_key(commit, command, timeout, self.cpu_seconds, self.memory_mb, env)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = run_verification(repo_path, commit, command, timeout=timeout, env=env,
+                                  cpu_seconds=self.cpu_seconds, memory_mb=self.memory_mb)
+        with self._lock:
+            self.jobs_run += 1
+        self.cache.put(key, result)
+        return result
+
+    def schedule(self, repo_path, commit, command, env=None, timeout=None) -> Future:
+        """verify() on the pool, for callers that collect their own results"""
+        return self._pool.submit(self.verify, repo_path, commit, command, env, timeout)
+
+    def pending(self, key) -> Optional[str]:
+        return self._pending.get(key)
+
+    def submit(self, key, repo_path, commit, command, env=None) -> bool:
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = commit
+        self._pool.submit(self._run, key, repo_path, commit, command, env)
+        return True
+
+    def _run(self, key, repo_path, commit, command, env):
+        try:
+            result = self.verify(repo_path, commit, command, env)
+        except Exception as e:
+            logger.error(f"Error verifying commit {commit} for {key}: {e}", exc_info=True)
+            result = {'commit': commit, 'command': command, 'status': 'error', 'passed': False,
+                      'reason': f'verification failed: {e}'}
+        with self._lock:
+            self._pending.pop(key, None)
+            self._results.append((key, result))
+
+    def results(self) -> List[tuple]:
+        """(key, result) of jobs finished since the last call, oldest first"""
+        with self._lock:
+            results, self._results = self._results, []
+        return results
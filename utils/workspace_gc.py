@@ -0,0 +1,262 @@
+"""
+Background reclamation of agent workspaces.
+
+Removing a checkout can take tens of seconds, so a discarded workspace is first renamed into
+a trash directory on the same filesystem (instant) and deleted later by a worker thread that
+runs at the lowest CPU priority. Each orchestrator process has its own subdirectory of the trash,
+locked while the process runs, so several can share a trash directory and only the trash of
+processes that are gone is collected as leftovers. The worker also measures live workspaces, so the orchestrator
+can keep their total under a disk quota by evicting the workspaces of finished agents, least
+recently updated first.
+"""
+import logging
+import os
+import queue
+import stat
+import shutil
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Nice value of the deletion worker (Linux applies it to the thread only)
+WORKER_NICE = 19
+
+
+def disk_usage(path) -> int:
+    """
+    Bytes allocated to a directory tree, without following symlinks. Files with other hard
+    links (shared with a golden checkout) and other filesystems (overlay mounts) are not counted.
+    """
+    total = 0
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_dev != device:
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif st.st_nlink > 1:
+                            continue
+                        total += st.st_blocks * 512 if hasattr(st, 'st_blocks') else st.st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _make_writable(function, path, exc_info):
+    """rmtree error handler for read-only files (git objects on Windows)"""
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        function(path)
+    except OSError:
+        pass
+
+
+def _lower_thread_priority():
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WORKER_NICE)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Could not lower workspace GC priority: {e}")
+
+
+class WorkspaceCollector:
+    """
+    Moves discarded workspaces to a subdirectory of trash_dir of its own and deletes them on
+    a daemon thread.
+
+    quota_bytes of 0 disables eviction. Sizes of tracked workspaces are measured by the worker
+    every measure_interval seconds, so select_evictions() never walks a tree itself.
+    """
+
+    def __init__(self, trash_dir, quota_bytes=0, measure_interval=300):
+        self.trash_root = Path(trash_dir)
+        # A pid can be reused by the time a leftover is found, the suffix tells instances apart
+        self.trash_dir = self.trash_root / f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._trash_lock = None
+        self.quota_bytes = quota_bytes
+        self.measure_interval = measure_interval
+        self.reclaimed_bytes = 0
+        self.reclaimed_workspaces = 0
+        self.evictions = 0
+        self.sizes: Dict[str, int] = {}
+        self._tracked: List[str] = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._measured_at = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            try:
+                self.trash_dir.mkdir(parents=True, exist_ok=True)
+                self._trash_lock = self._lock_trash(self.trash_dir, blocking=True)
+                # Leftovers of processes that are gone are deleted first
+                for lock in self.trash_root.glob('*.lock'):
+                    trash = lock.with_suffix('')
+                    if trash == self.trash_dir or not self._lock_trash(trash, blocking=False):
+                        continue
+                    self._queue.put(str(trash))
+                    lock.unlink()
+            except OSError as e:
+                logger.error(f"Could not set up workspace trash {self.trash_dir}: {e}", exc_info=True)
+            self._thread = threading.Thread(target=self._run, daemon=True, name='workspace-gc')
+            self._thread.start()
+
+    @staticmethod
+    def _lock_trash(trash, blocking):
+        """Open file with a lock on trash, None if another process holds it or locks are unsupported"""
+        if fcntl is None:
+            return None
+        lock_file = open(f"{trash}.lock", 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def discard(self, path, eviction=False) -> bool:
+        """Take a workspace out of use immediately and queue it for deletion"""
+        path = str(path)
+        if not os.path.lexists(path):
+            return False
+        # Started first so that the scan for leftovers does not pick this one up as well
+        self.start()
+        target = path
+        try:
+            self.trash_dir.mkdir(parents=True, exist_ok=True)
+            target = str(self.trash_dir / f"{Path(path).name}-{uuid.uuid4().hex[:8]}")
+            os.rename(path, target)
+        except OSError as e:
+            # Another filesystem: the worker deletes it in place
+            logger.warning(f"Could not move {path} to the workspace trash, deleting in place: {e}")
+            target = path
+        with self._lock:
+            self.sizes.pop(path, None)
+            if eviction:
+                self.evictions += 1
+        self._queue.put(target)
+        return True
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def track(self, workspaces: Iterable[str]):
+        """Workspaces whose size counts against the quota"""
+        self._tracked = [w for w in workspaces if w]
+
+    def tracked_bytes(self) -> int:
+        sizes = self.sizes
+        return sum(sizes.get(w, 0) for w in self._tracked)
+
+    def select_evictions(self, agents: Dict[str, dict], evictable) -> List[str]:
+        """
+        Agents whose workspaces to discard to get under the quota: those for which
+        evictable(agent_id, agent_data) is true, least recently updated first.
+        """
+        self.track(agent_data.get('workspace') for agent_data in agents.values())
+        self.start()
+        if not self.quota_bytes:
+            return []
+        sizes = self.sizes
+        total = self.tracked_bytes()
+        if total <= self.quota_bytes:
+            return []
+        candidates = sorted(
+            (agent_data.get('last_updated') or '', agent_id)
+            for agent_id, agent_data in agents.items()
+            if sizes.get(agent_data.get('workspace')) and evictable(agent_id, agent_data)
+        )
+        selected = []
+        for _, agent_id in candidates:
+            if total <= self.quota_bytes:
+                break
+            selected.append(agent_id)
+            total -= sizes[agents[agent_id]['workspace']]
+        if total > self.quota_bytes:
+            logger.warning(f"Workspaces use {total} bytes after evictions, over the quota of {self.quota_bytes}")
+        return selected
+
+    def measure(self):
+        sizes = {}
+        for workspace in list(self._tracked):
+            if os.path.isdir(workspace):
+                sizes[workspace] = disk_usage(workspace)
+        with self._lock:
+            self.sizes = sizes
+        self._measured_at = time.monotonic()
+
+    def _remove(self, path):
+        start = time.perf_counter()
+        size = disk_usage(path) if os.path.isdir(path) else 0
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, onerror=_make_writable)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        remaining = disk_usage(path) if os.path.lexists(path) else 0
+        with self._lock:
+            self.reclaimed_bytes += size - remaining
+            self.reclaimed_workspaces += 1
+        logger.info(f"Reclaimed {size - remaining} bytes from {path} in {time.perf_counter() - start:.2f}s")
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            timeout = max(0.0, self._measured_at + self.measure_interval - time.monotonic())
+            try:
+                path = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                path = None
+            try:
+                if path is None:
+                    self.measure()
+                else:
+                    self._remove(path)
+            except Exception as e:
+                logger.error(f"Workspace GC error for {path}: {e}", exc_info=True)
+            finally:
+                if path is not None:
+                    self._queue.task_done()
+
+    def join(self):
+        """Wait until every discarded workspace has been deleted"""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            'trash_dir': str(self.trash_dir),
+            'quota_bytes': self.quota_bytes,
+            'tracked_bytes': self.tracked_bytes(),
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'reclaimed_workspaces': self.reclaimed_workspaces,
+            'evictions': self.evictions,
+            'pending': self.pending
+        }